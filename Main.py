@@ -1,10 +1,8 @@
 from dotenv import load_dotenv
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from Utils.Agents import (
     extract_text_from_pdf, structure_medical_report,
-    Cardiologist, Psychologist, Pulmonologist, MultidisciplinaryTeam,
-    generate_report_pdf
+    MultidisciplinaryTeam, generate_report_pdf, run_specialists
 )
 
 load_dotenv()
@@ -19,18 +17,9 @@ print("Extracted PDF.")
 structured = structure_medical_report(raw)
 print("Structured.")
 
-agents = {
-    "Cardiologist": Cardiologist(structured),
-    "Psychologist": Psychologist(structured),
-    "Pulmonologist": Pulmonologist(structured)
-}
-
-responses = {}
-with ThreadPoolExecutor() as ex:
-    futures = {ex.submit(a.run): role for role, a in agents.items()}
-    for fut in as_completed(futures):
-        r = fut.result()
-        responses[futures[fut]] = r
+responses, timings = run_specialists(structured)
+for role, timing in timings.items():
+    print(f"{role}: {timing['status']} in {timing['seconds']}s")
 
 team = MultidisciplinaryTeam(
     responses["Cardiologist"], responses["Psychologist"], responses["Pulmonologist"]
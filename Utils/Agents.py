@@ -1,63 +1,283 @@
 
 import os
-import fitz  # PyMuPDF
+import json
+import hashlib
 import re
-from markdown import markdown
-from bs4 import BeautifulSoup
-from reportlab.platypus import Paragraph
-
-from openai import OpenAI
-from reportlab.platypus import (
-    SimpleDocTemplate, Paragraph, Spacer, PageBreak, Image,
-    Table, TableStyle, HRFlowable
-)
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.enums import TA_JUSTIFY, TA_CENTER, TA_LEFT
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from datetime import datetime
+import math
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+
 from dotenv import load_dotenv
+from Utils.Cache import LLMCache, DiskCache, file_digest, cache_key
+from Utils.Extraction import iter_pdf_pages, PdfTooLarge
+from Utils.RateLimit import RateLimiter
+from Utils.Transport import ConnectionStats, build_http_client
+from Utils.Resilience import ResilientCaller
+from Utils.Metrics import metrics
+from Utils.Tracing import tracer
+from Utils.Budget import budget, compact, running_lines
+from Utils.Sections import select_sections, detect_sections, render_sections, merge_sections
+# PDF rendering lives in Utils.PdfHandler; re-exported here (through __getattr__,
+# so ReportLab is only loaded once something asks for them) for existing imports
+_PDF_EXPORTS = (
+    "cover_page", "other_pages", "patient_summary_section", "parse_markdown_to_pdf",
+    "ReportRenderer", "renderer", "generate_report_pdf"
+)
 
 
 
 load_dotenv()
 
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.getenv("OPENAI_API_KEY")
+# Process-wide RPM/TPM budget and adaptive concurrency for all LLM calls
+rate_limiter = RateLimiter.from_env()
+
+# Keep-alive pool sized to the limiter's ceiling; connection_stats counts how many
+# requests opened a fresh connection versus reusing a pooled one.
+connection_stats = ConnectionStats()
+
+BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+
+# The OpenAI SDK is most of this module's import time, so `client` and
+# `http_client` are only created by the first call that needs them (or by
+# Utils.Warmup when a worker boots); until then __getattr__ below stands in.
+_client_lock = threading.Lock()
+
+def get_client():
+    global client, http_client
+    if "client" not in globals():
+        with _client_lock:
+            if "client" not in globals():
+                from openai import OpenAI
+                http_client = build_http_client(connection_stats, default_connections=rate_limiter.max_concurrency * 2)
+                # Retries are left to resilience and rate_limiter so that 429s are seen (and
+                # Retry-After honoured) by every thread sharing this client, not just the one that hit it.
+                client = OpenAI(
+                    base_url=BASE_URL,
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    max_retries=0,
+                    http_client=http_client,
+                    timeout=http_client.timeout
+                )
+    return client
+
+def __getattr__(name):
+    # Module attributes that resolve on first access: the LLM client and the PDF re-exports
+    if name in ("client", "http_client"):
+        get_client()
+        return globals()[name]
+    if name in _PDF_EXPORTS:
+        from Utils import PdfHandler
+        return getattr(PdfHandler, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Completion tokens reserved from the TPM budget before the real usage is known
+COMPLETION_TOKEN_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKEN_ESTIMATE", "1000"))
+
+MODEL = "meta-llama/llama-4-maverick"
+
+# Identical (model, temperature, prompt) triples are served from here instead of
+# going back to OpenRouter - n8n retries and re-runs of the same case hit it.
+llm_cache = LLMCache.from_env()
+
+# Retries with jittered backoff plus capped request hedging for every completion
+resilience = ResilientCaller.from_env(max_workers=rate_limiter.max_concurrency * 2)
+
+def complete_prompt(prompt, temperature, info=None):
+    """
+    Cached, rate-limited, retried and (when slow) hedged completion.
+    `info`, if given, receives cached/attempts/retries/hedges/seconds for this call.
+    """
+    info = info if info is not None else {}
+    # Local count of the whole prompt, compared with the provider's usage once it answers
+    estimated = budget.count(prompt)
+    info["prompt_tokens_estimated"] = estimated
+    cached = llm_cache.get(MODEL, temperature, prompt)
+    info["cached"] = cached is not None
+    tracer.annotate(llm_cached=cached is not None, prompt_tokens_estimated=estimated)
+    if cached is not None:
+        return cached
+
+    def attempt(abandoned):
+        # One request per attempt: resilience does all the retrying, 429s included
+        return rate_limiter.call(
+            lambda: _create_completion(prompt, temperature),
+            estimated_tokens=estimated + COMPLETION_TOKEN_ESTIMATE,
+            max_throttle_retries=0,
+            abandoned=abandoned
+        )
+
+    resp = resilience.call(attempt, estimated_tokens=estimated, info=info)
+    actual = getattr(getattr(resp, "usage", None), "prompt_tokens", None)
+    info["prompt_tokens_actual"] = actual
+    budget.observe(estimated, actual)
+    tracer.annotate(llm_attempts=info["attempts"], llm_retries=info["retries"], llm_hedges=info["hedges"],
+                    prompt_tokens_actual=actual)
+    text = resp.choices[0].message.content.strip()
+    llm_cache.set(MODEL, temperature, prompt, text)
+    return text
+
+def _llm_outcome(error):
+    return "rate_limited" if getattr(error, "status_code", None) == 429 else "error"
+
+def _trace_usage(span, usage):
+    if usage is not None:
+        span.set(prompt_tokens=getattr(usage, "prompt_tokens", None),
+                 completion_tokens=getattr(usage, "completion_tokens", None))
+
+def _create_completion(prompt, temperature):
+    # Every request that reaches the provider - retries and hedges included - is counted here
+    start = time.perf_counter()
+    with tracer.span("llm.chat_completion", kind="client", model=MODEL, temperature=temperature,
+                     prompt_chars=len(prompt)) as span:
+        try:
+            resp = get_client().chat.completions.create(
+                model=MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=temperature
+            )
+        except Exception as e:
+            metrics.record_llm_call(time.perf_counter() - start, outcome=_llm_outcome(e))
+            span.set(outcome=_llm_outcome(e))
+            raise
+        metrics.record_llm_call(time.perf_counter() - start, getattr(resp, "usage", None))
+        _trace_usage(span, getattr(resp, "usage", None))
+    return resp
+
+# Packing limits for BaseAgent.run_batch
+BATCH_TOKEN_BUDGET = int(os.getenv("BATCH_TOKEN_BUDGET", "12000"))
+BATCH_MAX_CASES = int(os.getenv("BATCH_MAX_CASES", "8"))
+
+def _usage_dict(usage):
+    if usage is None:
+        return None
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "completion_tokens": getattr(usage, "completion_tokens", None),
+        "total_tokens": getattr(usage, "total_tokens", None)
+    }
+
+def stream_prompt(prompt, temperature):
+    """
+    Stream a completion as events: {"type": "token", "text": ...} per delta, then
+    {"type": "done", "text": <full text>, "usage": {...}, "cached": bool,
+    "prompt_tokens_estimated": <local count>}. A cache hit is replayed as a single token event.
+    """
+    estimated = budget.count(prompt)
+    cached = llm_cache.get(MODEL, temperature, prompt)
+    if cached is not None:
+        yield {"type": "token", "text": cached}
+        yield {"type": "done", "text": cached, "usage": None, "cached": True, "prompt_tokens_estimated": estimated}
+        return
+
+    parts, usage = [], None
+    # The slot is held until the stream is drained so concurrency accounting stays honest
+    with rate_limiter.slot(estimated + COMPLETION_TOKEN_ESTIMATE) as slot, \
+            tracer.span("llm.chat_completion", kind="client", model=MODEL, temperature=temperature,
+                        prompt_chars=len(prompt), stream=True) as span:
+        start = time.perf_counter()
+        try:
+            stream = get_client().chat.completions.create(
+                model=MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=temperature,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                    slot["total_tokens"] = getattr(usage, "total_tokens", None)
+                for choice in chunk.choices or []:
+                    delta = choice.delta.content if choice.delta else None
+                    if delta:
+                        parts.append(delta)
+                        yield {"type": "token", "text": delta}
+        except Exception as e:
+            metrics.record_llm_call(time.perf_counter() - start, usage, outcome=_llm_outcome(e))
+            span.set(outcome=_llm_outcome(e))
+            raise
+        metrics.record_llm_call(time.perf_counter() - start, usage)
+        _trace_usage(span, usage)
+
+    budget.observe(estimated, getattr(usage, "prompt_tokens", None))
+    text = "".join(parts).strip()
+    llm_cache.set(MODEL, temperature, prompt, text)
+    yield {"type": "done", "text": text, "usage": _usage_dict(usage), "cached": False, "prompt_tokens_estimated": estimated}
+
+# Extracted text keyed on the PDF's SHA-256, so a re-uploaded or re-submitted
+# document is a lookup rather than a PyMuPDF parse. It is patient text in plain
+# files, so only kept when EXTRACT_CACHE_DIR is set (e.g. next to the uploads).
+text_cache = DiskCache(
+    os.getenv("EXTRACT_CACHE_DIR") or None,
+    ttl=float(os.getenv("EXTRACT_CACHE_TTL_SECONDS", str(24 * 3600))),
+    max_bytes=int(float(os.getenv("EXTRACT_CACHE_MAX_MB", "100")) * 1024 * 1024)
 )
 
-def cover_page(canvas, doc):
-    canvas.saveState()
-    width, height = A4
-    if os.path.exists("logo.png"):
-        canvas.drawImage("logo.png", width/2-80, height-250, width=160, height=160, preserveAspectRatio=True)
-    canvas.setFont("Helvetica-Bold", 24)
-    canvas.drawCentredString(width/2, height-280, "AI-Based Medical Diagnostic Report")
-    canvas.setFont("Helvetica", 15)
-    canvas.drawCentredString(width/2, height-320, "Generated by Medical Agent System")
-    canvas.setFont("Helvetica", 10)
-    canvas.drawCentredString(width/2, height-335, f"Report generated: {datetime.now().strftime('%d %b %Y, %I:%M %p')}")
-    canvas.setFont("Helvetica-Oblique", 10)
-    canvas.drawString(50, 40, "Confidential – For clinical use only")
-    canvas.drawRightString(width-50, 40, f"Page {doc.page}")
-    canvas.restoreState()
-
-def other_pages(canvas, doc):
-    canvas.saveState()
-    width, height = A4
-    canvas.setFont("Helvetica-Oblique", 9)
-    canvas.drawString(50, 40, "Medical Agent | Confidential")
-    canvas.drawRightString(width-50, 40, f"Page {doc.page}")
-    canvas.setStrokeColor(colors.grey)
-    canvas.setLineWidth(0.5)
-    canvas.line(50, 50, width-50, 50)
-    canvas.restoreState()
-
-def extract_text_from_pdf(file_path):
-    doc = fitz.open(file_path)
-    return "\n".join(page.get_text() for page in doc).strip()
+@metrics.timed("extract")
+@tracer.traced("extract")
+def extract_pages_from_pdf(file_path, use_cache=True, digest=None):
+    """The text of each page, in order; cached like extract_text_from_pdf"""
+    key = cache_key("pages", digest or file_digest(file_path)) if use_cache else None
+    if key:
+        cached = text_cache.get(key)
+        if cached is not None:
+            return json.loads(cached)
+
+    pages = list(iter_pdf_pages(file_path))
+
+    if key:
+        text_cache.set(key, json.dumps(pages, ensure_ascii=False))
+    return pages
+
+def stream_pdf_pages(file_path, digest=None):
+    """
+    Pages one at a time for incremental consumers. A cached page list is replayed;
+    otherwise pages come straight from iter_pdf_pages and are not cached, so memory
+    stays bounded by one page (or one in-flight range per worker).
+    """
+    cached = text_cache.get(cache_key("pages", digest or file_digest(file_path)))
+    if cached is not None:
+        yield from json.loads(cached)
+    else:
+        yield from iter_pdf_pages(file_path)
+
+@metrics.timed("extract")
+@tracer.traced("extract")
+def extract_text_from_pdf(file_path, use_cache=True, digest=None):
+    # `digest` lets callers that already know the file's SHA-256 (e.g. the upload store) skip re-hashing
+    digest = (digest or file_digest(file_path)) if use_cache else None
+    if digest:
+        cached = text_cache.get(digest)
+        if cached is not None:
+            return cached
+
+    text = "\n".join(iter_pdf_pages(file_path)).strip()
+
+    if digest:
+        text_cache.set(digest, text)
+    return text
+
+@metrics.timed("extract")
+@tracer.traced("extract")
+def extract_text_from_buffer(buffer, digest=None, use_cache=True):
+    """
+    extract_text_from_pdf for a PDF already in memory (bytes, or a memoryview over an
+    mmap'd spool file). Shares the text cache with the path-based version: pass the
+    SHA-256 `digest` of the bytes if it is already known.
+    """
+    digest = (digest or hashlib.sha256(buffer).hexdigest()) if use_cache else None
+    if digest:
+        cached = text_cache.get(digest)
+        if cached is not None:
+            return cached
+
+    text = "\n".join(iter_pdf_pages(stream=buffer)).strip()
+
+    if digest:
+        text_cache.set(digest, text)
+    return text
 
 # def structure_medical_report(raw_text):
 #     prompt = f"""
@@ -72,7 +292,117 @@ def extract_text_from_pdf(file_path):
 #         temperature=0.4
 #     )
 #     return resp.choices[0].message.content.strip()
-def structure_medical_report(raw_text):
+# Documents that already carry recognisable headings are structured by rules instead of the LLM
+STRUCTURE_RULES_ENABLED = os.getenv("STRUCTURE_RULES_ENABLED", "1").lower() not in ("0", "false", "no")
+STRUCTURE_RULES_MIN_COVERAGE = float(os.getenv("STRUCTURE_RULES_MIN_COVERAGE", "0.8"))
+STRUCTURE_RULES_MIN_SECTIONS = int(os.getenv("STRUCTURE_RULES_MIN_SECTIONS", "4"))
+
+# Raw text over the "structure" prompt budget (Utils.Budget) is structured in
+# page/paragraph chunks of about this many tokens, concurrently
+STRUCTURE_CHUNK_TOKENS = int(os.getenv("STRUCTURE_CHUNK_TOKENS", "3000"))
+_structure_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("STRUCTURE_WORKERS", "4")),
+    thread_name_prefix="structure"
+)
+
+def _split_paragraphs(text, token_budget):
+    """Pack paragraphs (then lines, for very long paragraphs) into pieces under token_budget"""
+    pieces, current, used = [], [], 0
+    for paragraph in re.split(r"\n\s*\n", text):
+        parts = [paragraph] if budget.count(paragraph) <= token_budget else paragraph.split("\n")
+        for part in parts:
+            # Counted part by part (+1 for the separator) rather than re-encoding the growing piece
+            cost = budget.count(part) + 1
+            if current and used + cost > token_budget:
+                pieces.append("\n\n".join(current))
+                current, used = [], 0
+            current.append(part)
+            used += cost
+    if current:
+        pieces.append("\n\n".join(current))
+    return [piece.strip() for piece in pieces if piece.strip()]
+
+def split_report_chunks(raw_text, pages=None, token_budget=None):
+    """
+    Chunks for map-reduce structuring. Every page is its own chunk (split further on
+    paragraph boundaries if it is over token_budget), so editing one page only
+    changes that page's chunks and every other chunk stays an LLM cache hit.
+    Without page boundaries the whole text is split on paragraphs.
+    """
+    token_budget = token_budget or STRUCTURE_CHUNK_TOKENS
+    chunks = []
+    for page in (pages if pages else [raw_text]):
+        page = page.strip()
+        if not page:
+            continue
+        if budget.count(page) <= token_budget:
+            chunks.append(page)
+        else:
+            chunks.extend(_split_paragraphs(page, token_budget))
+    return chunks
+
+def structure_medical_report_chunked(raw_text, pages=None, token_budget=None, meta=None):
+    """Structure each chunk concurrently and merge the sections into the canonical layout"""
+    chunks = split_report_chunks(raw_text, pages, token_budget)
+    calls = [{} for _ in chunks]
+    futures = [
+        _structure_pool.submit(contextvars.copy_context().run, _structure_with_llm, chunk, True, info)
+        for chunk, info in zip(chunks, calls)
+    ]
+    structured_chunks = [future.result() for future in futures]
+    if meta is not None:
+        actual = [info.get("prompt_tokens_actual") for info in calls]
+        meta.update(
+            chunks=len(chunks),
+            chunk_cache_hits=sum(1 for info in calls if info.get("cached")),
+            prompt_tokens_estimated=sum(info.get("prompt_tokens_estimated") or 0 for info in calls),
+            prompt_tokens_actual=sum(actual) if all(actual) else None
+        )
+    return render_sections(merge_sections(structured_chunks))
+
+@metrics.timed("structure")
+@tracer.traced("structure")
+def structure_medical_report(raw_text, return_meta=False, pages=None):
+    """
+    Returns the report in the canonical `## ` section format. With return_meta=True
+    returns (text, meta) where meta["path"] says whether "rules", the "llm" or the
+    chunked "llm-chunked" path did it. `pages` (see extract_pages_from_pdf) lets
+    long documents be chunked on page boundaries.
+    """
+    meta = {"path": "llm", "coverage": None, "sections_detected": 0}
+    if STRUCTURE_RULES_ENABLED:
+        detected = detect_sections(raw_text)
+        meta.update(coverage=detected["coverage"], sections_detected=len(detected["sections"]))
+        if (detected["coverage"] >= STRUCTURE_RULES_MIN_COVERAGE
+                and len(detected["sections"]) >= STRUCTURE_RULES_MIN_SECTIONS):
+            meta["path"] = "rules"
+            structured = render_sections(detected["sections"])
+            return (structured, meta) if return_meta else structured
+
+    # Text over budget is compacted (page numbers, running headers/footers); if it is
+    # still over it takes the chunked path rather than being cut
+    compacted, meta["budget"] = budget.fit_parts(
+        "structure", {"text": raw_text}, trim=False, raw=True, running=running_lines(pages)
+    )
+    if meta["budget"]["action"] == "over":
+        meta["path"] = "llm-chunked"
+        if pages is not None and budget.enabled:
+            pages = [compact(page, raw=True) for page in pages]
+        structured = structure_medical_report_chunked(compacted["text"], pages, meta=meta)
+    else:
+        info = {}
+        structured = _structure_with_llm(compacted["text"], info=info)
+        meta.update(prompt_tokens_estimated=info.get("prompt_tokens_estimated"),
+                    prompt_tokens_actual=info.get("prompt_tokens_actual"))
+    return (structured, meta) if return_meta else structured
+
+# Chunk prompts carry no chunk number, so the same page text always gives the same prompt
+EXCERPT_NOTE = """The text below is one excerpt of a longer report. Only fill sections the excerpt supports and write "Not documented." under every other heading.
+
+"""
+
+def _structure_with_llm(raw_text, excerpt=False, info=None):
+    note = EXCERPT_NOTE if excerpt else ""
     prompt = f"""
 You are a medical documentation specialist. Structure the following unstructured medical report into clearly defined sections with proper formatting.
 
@@ -120,37 +450,142 @@ Please format your response exactly as follows:
 ## OTHER NOTES
 [Any additional relevant information]
 
----
+{note}---
 
 Raw Medical Text:
 \"\"\"{raw_text}\"\"\"
 """
-    resp = client.chat.completions.create(
-        model="meta-llama/llama-4-maverick",
-        messages=[{"role":"user","content":prompt}],
-        temperature=0.4
-    )
-    return resp.choices[0].message.content.strip()
+    return complete_prompt(prompt, temperature=0.4, info=info)
+# Specialists only see the report sections they declare (see BaseAgent.sections)
+CONTEXT_PRUNING = os.getenv("CONTEXT_PRUNING", "1").lower() not in ("0", "false", "no")
+
 class BaseAgent:
+    instructions = None
+    # Canonical `## ` sections this specialist needs; None means the whole report
+    sections = None
     def __init__(self, report_text):
         self.report_text = report_text
-    def build_prompt(self): raise NotImplementedError
+        self.last_call = {}
+    def context_text(self):
+        if not CONTEXT_PRUNING or not self.sections:
+            return self.report_text
+        return select_sections(self.report_text, self.sections) or self.report_text
+    def budgeted_context(self):
+        """(context_text() fitted to the "specialist" prompt budget, the budget report)"""
+        return budget.fit("specialist", self.context_text())
+    def build_prompt(self, report_text=None):
+        if self.instructions is None:
+            raise NotImplementedError
+        report_text = self.budgeted_context()[0] if report_text is None else report_text
+        return f"""{self.instructions}
+---
+
+Medical Report:
+\"\"\"{report_text}\"\"\"
+"""
     def run(self):
-        prompt = self.build_prompt()
+        context, budget_report = self.budgeted_context()
+        prompt = self.build_prompt(context)
+        self.last_call = {
+            "prompt_tokens_full": budget.count(self.build_prompt(self.report_text)),
+            "prompt_tokens_pruned": budget.count(prompt),
+            "prompt_budget": budget_report["action"]
+        }
         try:
-            resp = client.chat.completions.create(
-                model="meta-llama/llama-4-maverick",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.5
-            )
-            return resp.choices[0].message.content.strip()
+            role = type(self).__name__.lower()
+            with metrics.track(role), tracer.span(role):
+                return complete_prompt(prompt, temperature=0.5, info=self.last_call)
         except Exception as e:
             print("[ERROR]", e)
             return None
+    def stream(self):
+        return stream_prompt(self.build_prompt(), temperature=0.5)
+
+    @classmethod
+    def build_batch_prompt(cls, reports):
+        cases = "\n\n".join(
+            f"=== CASE {number} START ===\n{report}\n=== CASE {number} END ==="
+            for number, report in enumerate(reports, 1)
+        )
+        return f"""{cls.instructions}
+---
+
+You will receive {len(reports)} separate medical reports, each between "=== CASE <n> START ===" and "=== CASE <n> END ===" markers.
+Assess every case independently, using exactly the format above for each one.
+Begin each assessment with its own line "=== ASSESSMENT <n> ===" carrying the case number, and write nothing before the first marker.
+
+Medical Reports:
+{cases}
+"""
+
+    @staticmethod
+    def split_batch_response(text, count):
+        """Map case number -> assessment text for every well-formed section of a batch reply"""
+        parts = re.split(r"^\s*=== ASSESSMENT (\d+) ===\s*$", text or "", flags=re.MULTILINE)
+        results = {}
+        for number, body in zip(parts[1::2], parts[2::2]):
+            number, body = int(number), body.strip()
+            if 1 <= number <= count and body and number not in results:
+                results[number] = body
+        return results
+
+    @classmethod
+    def pack_batches(cls, reports, token_budget, max_cases):
+        """Group report indexes greedily so each packed prompt stays under token_budget"""
+        overhead = budget.count(cls.build_batch_prompt([]))
+        batches, current, used = [], [], overhead
+        for index, report in enumerate(reports):
+            cost = budget.count(report) + 20
+            if current and (used + cost > token_budget or len(current) >= max_cases):
+                batches.append(current)
+                current, used = [], overhead
+            current.append(index)
+            used += cost
+        if current:
+            batches.append(current)
+        return batches
+
+    @classmethod
+    def run_batch(cls, reports, token_budget=None, max_cases=None):
+        """
+        Assess many structured reports with as few LLM calls as possible.
+        Reports are packed into shared prompts (the instruction block is sent once per
+        batch), the reply is split back per case, and any case that is missing or
+        unparseable is re-run on its own. Returns assessments in input order.
+        """
+        token_budget = token_budget or BATCH_TOKEN_BUDGET
+        max_cases = max_cases or BATCH_MAX_CASES
+        results = [None] * len(reports)
+        calls, fallbacks = 0, 0
+
+        contexts = [cls(report).context_text() for report in reports]
+        for batch in cls.pack_batches(contexts, token_budget, max_cases):
+            parsed = {}
+            if len(batch) > 1:
+                calls += 1
+                try:
+                    reply = complete_prompt(cls.build_batch_prompt([contexts[i] for i in batch]), temperature=0.5)
+                    parsed = cls.split_batch_response(reply, len(batch))
+                except Exception as e:
+                    print("[ERROR] batch call failed:", e)
+            for number, index in enumerate(batch, 1):
+                if number in parsed:
+                    results[index] = parsed[number]
+                else:
+                    calls += 1
+                    fallbacks += 1 if len(batch) > 1 else 0
+                    results[index] = cls(reports[index]).run()
+
+        print(f"[BATCH] {cls.__name__}: {len(reports)} reports in {calls} calls ({fallbacks} single-case fallbacks)")
+        return results
 
 class Cardiologist(BaseAgent):
-    def build_prompt(self):
-        return f"""
+    sections = (
+        "PATIENT INFORMATION", "CHIEF COMPLAINT", "HISTORY OF PRESENT ILLNESS", "PAST MEDICAL HISTORY",
+        "MEDICATIONS", "FAMILY HISTORY", "PHYSICAL EXAMINATION", "DIAGNOSTIC TESTS/RESULTS",
+        "ASSESSMENT/IMPRESSION"
+    )
+    instructions = """
 You are a senior Cardiologist with expertise in cardiovascular medicine. Analyze the following structured medical report and provide your professional assessment.
 
 Please format your response exactly as follows:
@@ -177,16 +612,14 @@ Please format your response exactly as follows:
 
 **Additional Notes:**
 [Any additional cardiovascular considerations or differential diagnoses]
-
----
-
-Medical Report:
-\"\"\"{self.report_text}\"\"\"
 """
 
 class Psychologist(BaseAgent):
-    def build_prompt(self):
-        return f"""
+    sections = (
+        "PATIENT INFORMATION", "CHIEF COMPLAINT", "HISTORY OF PRESENT ILLNESS", "PAST MEDICAL HISTORY",
+        "MEDICATIONS", "SOCIAL HISTORY", "FAMILY HISTORY", "REVIEW OF SYSTEMS", "ASSESSMENT/IMPRESSION"
+    )
+    instructions = """
 You are a licensed Clinical Psychologist with expertise in mental health assessment. Analyze the following structured medical report and provide your professional psychological evaluation.
 
 Please format your response exactly as follows:
@@ -214,16 +647,15 @@ Please format your response exactly as follows:
 
 **Additional Notes:**
 [Any additional psychological considerations, risk factors, or differential diagnoses]
-
----
-
-Medical Report:
-\"\"\"{self.report_text}\"\"\"
 """
 
 class Pulmonologist(BaseAgent):
-    def build_prompt(self):
-        return f"""
+    sections = (
+        "PATIENT INFORMATION", "CHIEF COMPLAINT", "HISTORY OF PRESENT ILLNESS", "PAST MEDICAL HISTORY",
+        "MEDICATIONS", "ALLERGIES", "SOCIAL HISTORY", "REVIEW OF SYSTEMS", "PHYSICAL EXAMINATION",
+        "DIAGNOSTIC TESTS/RESULTS", "ASSESSMENT/IMPRESSION"
+    )
+    instructions = """
 You are a board-certified Pulmonologist with expertise in respiratory medicine. Analyze the following structured medical report and provide your professional pulmonary assessment.
 
 Please format your response exactly as follows:
@@ -252,18 +684,126 @@ Please format your response exactly as follows:
 
 **Additional Notes:**
 [Any additional pulmonary considerations, occupational factors, or differential diagnoses]
+"""
 
----
+SPECIALISTS = {
+    "Cardiologist": Cardiologist,
+    "Psychologist": Psychologist,
+    "Pulmonologist": Pulmonologist
+}
+
+# Per-agent deadline in seconds. AGENT_TIMEOUT_SECONDS is the default for every
+# specialist, <ROLE>_TIMEOUT_SECONDS (e.g. CARDIOLOGIST_TIMEOUT_SECONDS) overrides it.
+DEFAULT_AGENT_TIMEOUT = float(os.getenv("AGENT_TIMEOUT_SECONDS", "60"))
+
+# Shared pool so a specialist that blows its deadline does not hold up the caller:
+# the thread finishes in the background while the request moves on.
+_specialist_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SPECIALIST_WORKERS", "6")),
+    thread_name_prefix="specialist"
+)
 
-Medical Report:
-\"\"\"{self.report_text}\"\"\"
-"""
+def parse_agent_timeouts(timeouts):
+    """
+    Check a request's agent_timeouts: an object mapping specialist role (any case)
+    to a positive number of seconds. Returns it keyed by lower-case role; raises
+    ValueError naming the first bad entry.
+    """
+    if not timeouts:
+        return {}
+    if not isinstance(timeouts, dict):
+        raise ValueError("agent_timeouts must be an object of agent name to seconds")
+    known = {role.lower() for role in SPECIALISTS}
+    parsed = {}
+    for role, seconds in timeouts.items():
+        if not isinstance(role, str) or role.lower() not in known:
+            raise ValueError(f"agent_timeouts: unknown agent {role!r} (expected one of {', '.join(sorted(known))})")
+        if isinstance(seconds, bool) or not isinstance(seconds, (int, float)) or not math.isfinite(seconds) or seconds <= 0:
+            raise ValueError(f"agent_timeouts: {role!r} must be a positive number of seconds, got {seconds!r}")
+        parsed[role.lower()] = float(seconds)
+    return parsed
+
+def agent_deadline(role, timeouts=None):
+    timeouts = {k.lower(): v for k, v in (timeouts or {}).items()}
+    if role.lower() in timeouts:
+        return float(timeouts[role.lower()])
+    return float(os.getenv(f"{role.upper()}_TIMEOUT_SECONDS", DEFAULT_AGENT_TIMEOUT))
+
+def _timed_run(agent):
+    start = time.perf_counter()
+    result = agent.run()
+    return result, time.perf_counter() - start, agent.last_call
+
+def run_specialists(structured, timeouts=None, skipped=None):
+    """
+    Run the specialists concurrently on the structured report.
+    timeouts optionally maps role name (any case) to a deadline in seconds;
+    skipped maps roles that should not run to the reason why.
+    Returns (responses, timings); a specialist that is skipped, misses its
+    deadline or fails gets a None response and a timing entry with that status.
+    """
+    skipped = skipped or {}
+    started = time.perf_counter()
+    futures = {
+        # copy_context carries the request's trace span into the pool thread
+        role: _specialist_pool.submit(contextvars.copy_context().run, _timed_run, agent_class(structured))
+        for role, agent_class in SPECIALISTS.items()
+        if role not in skipped
+    }
+
+    responses, timings = {}, {}
+    for role, reason in skipped.items():
+        responses[role] = None
+        timings[role] = {"seconds": 0.0, "deadline": None, "status": "skipped", "reason": reason}
+    for role, future in futures.items():
+        deadline = agent_deadline(role, timeouts)
+        remaining = max(0.0, deadline - (time.perf_counter() - started))
+        try:
+            result, elapsed, call = future.result(timeout=remaining)
+            responses[role] = result
+            timings[role] = {
+                "seconds": round(elapsed, 3),
+                "deadline": deadline,
+                "status": "ok" if result is not None else "error",
+                "cached": call.get("cached", False),
+                "retries": call.get("retries", 0),
+                "hedges": call.get("hedges", 0),
+                "prompt_tokens_full": call.get("prompt_tokens_full"),
+                "prompt_tokens_pruned": call.get("prompt_tokens_pruned"),
+                "prompt_tokens_estimated": call.get("prompt_tokens_estimated"),
+                "prompt_tokens_actual": call.get("prompt_tokens_actual"),
+                "prompt_budget": call.get("prompt_budget")
+            }
+        except FuturesTimeout:
+            future.cancel()
+            print(f"[TIMEOUT] {role} exceeded its {deadline}s deadline")
+            responses[role] = None
+            timings[role] = {"seconds": round(time.perf_counter() - started, 3), "deadline": deadline, "status": "timeout"}
+        except Exception as e:
+            print(f"[ERROR] {role} failed:", e)
+            responses[role] = None
+            timings[role] = {"seconds": round(time.perf_counter() - started, 3), "deadline": deadline, "status": "error"}
+
+    return responses, timings
+
+MISSING_ASSESSMENT = "No assessment available - the specialist did not return a result for this case."
 
 class MultidisciplinaryTeam:
-    def __init__(self, cardio, psycho, pulmo):
-        self.reports = {"Cardiologist": cardio, "Psychologist": psycho, "Pulmonologist": pulmo}
-    def run(self):
-        prompt = f"""
+    def __init__(self, cardio, psycho, pulmo, skipped=None):
+        # skipped: role -> reason for specialists the router decided not to consult
+        self.skipped = skipped or {}
+        self.reports = {}
+        for role, report in (("Cardiologist", cardio), ("Psychologist", psycho), ("Pulmonologist", pulmo)):
+            if not report and role in self.skipped:
+                report = f"Not consulted for this case - {self.skipped[role]}."
+            self.reports[role] = report or MISSING_ASSESSMENT
+        self.last_call = {}
+    def budgeted_reports(self):
+        """The three assessments sharing the "summary" prompt budget, and the budget report"""
+        return budget.fit_parts("summary", self.reports)
+    def build_prompt(self, reports=None):
+        reports = self.budgeted_reports()[0] if reports is None else reports
+        return f"""
 You are a senior attending physician leading a multidisciplinary medical team. Review the specialist assessments below and provide a comprehensive, unified medical opinion.
 
 Please format your response exactly as follows:
@@ -324,440 +864,19 @@ Please format your response exactly as follows:
 SPECIALIST REPORTS:
 
 ### CARDIOLOGY ASSESSMENT
-{self.reports['Cardiologist']}
+{reports['Cardiologist']}
 
 ### PSYCHOLOGICAL ASSESSMENT  
-{self.reports['Psychologist']}
+{reports['Psychologist']}
 
 ### PULMONOLOGY ASSESSMENT
-{self.reports['Pulmonologist']}
+{reports['Pulmonologist']}
 """
-        resp = client.chat.completions.create(
-            model="meta-llama/llama-4-maverick",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.5
-        )
-        return resp.choices[0].message.content.strip()
-
-def patient_summary_section(structured_text):
-    info, symptoms, diagnosis, urgency = "Not available", "Not listed", "–", "–"
-    
-    # Parse the markdown structured text
-    lines = structured_text.split("\n")
-    current_section = ""
-    
-    for line in lines:
-        line = line.strip()
-        
-        # Identify sections
-        if line.startswith("## PATIENT INFORMATION"):
-            current_section = "patient"
-            continue
-        elif line.startswith("## CHIEF COMPLAINT"):
-            current_section = "symptoms"
-            continue
-        elif line.startswith("## ASSESSMENT/IMPRESSION") or line.startswith("## DIAGNOSIS"):
-            current_section = "diagnosis"
-            continue
-        elif line.startswith("##"):
-            current_section = ""
-            continue
-            
-        # Extract content based on current section
-        if current_section == "patient" and line and not line.startswith("#"):
-            if info == "Not available":
-                info = line
-            else:
-                info += " " + line
-        elif current_section == "symptoms" and line and not line.startswith("#"):
-            if symptoms == "Not listed":
-                symptoms = line
-            else:
-                symptoms += " " + line
-        elif current_section == "diagnosis" and line and not line.startswith("#"):
-            if diagnosis == "–":
-                diagnosis = line
-            else:
-                diagnosis += " " + line
-    
-    # Limit text length for table display but keep it readable
-    info = info[:200] + "..." if len(info) > 200 else info
-    symptoms = symptoms[:150] + "..." if len(symptoms) > 150 else symptoms
-    diagnosis = diagnosis[:150] + "..." if len(diagnosis) > 150 else diagnosis
-    
-    return [
-        ["Patient Information", info],
-        ["Chief Complaint", symptoms],
-        ["Primary Assessment", diagnosis],
-        ["Report Status", "Complete"]
-    ]
-
-# def parse_markdown_to_pdf(text, styles):
-#     """Convert markdown-formatted text to PDF elements with proper styling"""
-#     elements = []
-#     lines = text.split('\n')
-    
-#     i = 0
-#     while i < len(lines):
-#         line = lines[i].strip()
-        
-#         if not line:
-#             elements.append(Spacer(1, 0.1*inch))
-#             i += 1
-#             continue
-            
-#         # Handle main headers (# )
-#         if line.startswith('# '):
-#             header_text = line[2:].strip()
-#             elements.append(Paragraph(header_text, styles["MainHeader"]))
-#             elements.append(Spacer(1, 0.2*inch))
-            
-#         # Handle sub headers (## )
-#         elif line.startswith('## '):
-#             header_text = line[3:].strip()
-#             elements.append(Paragraph(header_text, styles["SubHeader"]))
-#             elements.append(Spacer(1, 0.15*inch))
-            
-#         # Handle sub-sub headers (### )
-#         elif line.startswith('### '):
-#             header_text = line[4:].strip()
-#             elements.append(Paragraph(header_text, styles["SubSubHeader"]))
-#             elements.append(Spacer(1, 0.1*inch))
-            
-#         # Handle bullet points (• )
-#         elif line.startswith('• '):
-#             bullet_text = line[2:].strip()
-#             # Process bold text in bullets
-#             bullet_text = re.sub(r'\*\*(.*?)\*\*', r'<b>\1</b>', bullet_text)
-#             elements.append(Paragraph(f"• {bullet_text}", styles["BulletBody"]))
-            
-#         # Handle bold text lines (**text**)
-#         elif '**' in line:
-#             # Extract bold sections and convert to HTML
-#             formatted_line = re.sub(r'\*\*(.*?)\*\*', r'<b>\1</b>', line)
-#             elements.append(Paragraph(formatted_line, styles["Body"]))
-            
-#         # Handle horizontal rules (---)
-#         elif line.startswith('---'):
-#             elements.append(HRFlowable(width="80%", thickness=1, color=colors.grey))
-#             elements.append(Spacer(1, 0.1*inch))
-            
-#         # Regular text
-#         else:
-#             if line.strip():
-#                 elements.append(Paragraph(line, styles["Body"]))
-        
-#         i += 1
-    
-#     return elements
-
-
-
-def parse_markdown_to_pdf(markdown_text, styles):
-    """
-    Enhanced markdown to PDF converter that preserves formatting
-    """
-    # Convert Markdown to HTML
-    html_content = markdown(markdown_text, extensions=['tables', 'nl2br'])
-    
-    # Parse HTML using BeautifulSoup
-    soup = BeautifulSoup(html_content, 'html.parser')
-    
-    elements = []
-
-    def process_element(elem):
-        """Recursively process HTML elements"""
-        if isinstance(elem, str):
-            # Text node
-            text = elem.strip()
-            if text:
-                return text
-            return ""
-        
-        if elem.name == 'h1':
-            elements.append(Spacer(1, 0.1 * inch))
-            elements.append(Paragraph(clean_text_for_pdf(elem), styles['MainHeader']))
-            elements.append(Spacer(1, 0.1 * inch))
-        
-        elif elem.name == 'h2':
-            elements.append(Spacer(1, 0.08 * inch))
-            elements.append(Paragraph(clean_text_for_pdf(elem), styles['SubHeader']))
-            elements.append(Spacer(1, 0.06 * inch))
-        
-        elif elem.name == 'h3':
-            elements.append(Spacer(1, 0.06 * inch))
-            elements.append(Paragraph(clean_text_for_pdf(elem), styles['SubSubHeader']))
-            elements.append(Spacer(1, 0.04 * inch))
-        
-        elif elem.name == 'p':
-            text_content = clean_text_for_pdf(elem)
-            if text_content.strip():
-                elements.append(Paragraph(text_content, styles['Body']))
-                elements.append(Spacer(1, 0.06 * inch))
-        
-        elif elem.name in ['ul', 'ol']:
-            elements.append(Spacer(1, 0.04 * inch))
-            for li in elem.find_all('li', recursive=False):
-                bullet = "•" if elem.name == 'ul' else f"{len(elements)}."
-                list_text = clean_text_for_pdf(li)
-                elements.append(Paragraph(f'{bullet} {list_text}', styles['BulletBody']))
-            elements.append(Spacer(1, 0.04 * inch))
-        
-        elif elem.name == 'blockquote':
-            text_content = clean_text_for_pdf(elem)
-            elements.append(Paragraph(f"<i>{text_content}</i>", styles['Body']))
-            elements.append(Spacer(1, 0.06 * inch))
-        
-        elif elem.name == 'table':
-            # Handle tables (basic implementation)
-            table_data = []
-            for row in elem.find_all('tr'):
-                row_data = []
-                for cell in row.find_all(['td', 'th']):
-                    cell_text = clean_text_for_pdf(cell)
-                    row_data.append(Paragraph(cell_text, styles['Body']))
-                table_data.append(row_data)
-            
-            if table_data:
-                from reportlab.platypus import Table, TableStyle
-                table = Table(table_data)
-                table.setStyle(TableStyle([
-                    ('BOX', (0, 0), (-1, -1), 1, colors.black),
-                    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                    ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ]))
-                elements.append(table)
-                elements.append(Spacer(1, 0.1 * inch))
-        
-        elif elem.name in ['br']:
-            elements.append(Spacer(1, 0.02 * inch))
-    
-    # Process all top-level elements
-    for elem in soup.contents:
-        if hasattr(elem, 'name'):
-            process_element(elem)
-    
-    return elements
-
-def clean_text_for_pdf(element):
-    """
-    Extract text from HTML element while preserving ReportLab formatting
-    """
-    if isinstance(element, str):
-        return element.strip()
-    
-    text = ""
-    for child in element.children:
-        if isinstance(child, str):
-            text += child
-        elif child.name == 'strong' or child.name == 'b':
-            text += f"<b>{clean_text_for_pdf(child)}</b>"
-        elif child.name == 'em' or child.name == 'i':
-            text += f"<i>{clean_text_for_pdf(child)}</i>"
-        elif child.name == 'u':
-            text += f"<u>{clean_text_for_pdf(child)}</u>"
-        elif child.name == 'code':
-            text += f"<font name='Courier'>{clean_text_for_pdf(child)}</font>"
-        elif child.name == 'br':
-            text += "<br/>"
-        else:
-            # For other tags, just extract text
-            text += clean_text_for_pdf(child)
-    
-    return text.strip()
-
-
-def generate_report_pdf(output_path, structured, diag_map, final):
-    doc = SimpleDocTemplate(
-        output_path, pagesize=A4, leftMargin=50, rightMargin=50, topMargin=72, bottomMargin=72
-    )
-    
-    styles = getSampleStyleSheet()
-    
-    # Custom Styles - Adding all required styles
-    styles.add(ParagraphStyle(
-        "MainHeader", 
-        fontSize=18, 
-        leading=22, 
-        alignment=TA_CENTER, 
-        spaceAfter=16, 
-        spaceBefore=8,
-        textColor=colors.HexColor("#2e5a87"),
-        fontName='Helvetica-Bold'
-    ))
-    
-    styles.add(ParagraphStyle(
-        "SubHeader", 
-        fontSize=14, 
-        leading=18, 
-        alignment=TA_LEFT, 
-        spaceAfter=8, 
-        spaceBefore=12,
-        textColor=colors.HexColor("#286245"),
-        fontName='Helvetica-Bold'
-    ))
-    
-    styles.add(ParagraphStyle(
-        "SubSubHeader", 
-        fontSize=12, 
-        leading=16, 
-        alignment=TA_LEFT, 
-        spaceAfter=6, 
-        spaceBefore=8,
-        textColor=colors.HexColor("#444444"),
-        fontName='Helvetica-Bold'
-    ))
-    
-    styles.add(ParagraphStyle(
-        "Body", 
-        fontSize=11, 
-        leading=14, 
-        alignment=TA_JUSTIFY,
-        spaceAfter=4,
-        fontName='Helvetica'
-    ))
-    
-    styles.add(ParagraphStyle(
-        "BulletBody", 
-        fontSize=11, 
-        leading=14, 
-        alignment=TA_LEFT,
-        spaceAfter=3,
-        leftIndent=20,
-        fontName='Helvetica'
-    ))
-    
-    styles.add(ParagraphStyle(
-        "Header", 
-        fontSize=18, 
-        leading=22, 
-        alignment=TA_CENTER, 
-        spaceAfter=16, 
-        textColor=colors.HexColor("#2e5a87"),
-        fontName='Helvetica-Bold'
-    ))
-    
-    styles.add(ParagraphStyle(
-        "TOCEntry", 
-        fontSize=12, 
-        leading=16, 
-        alignment=TA_LEFT, 
-        spaceAfter=6, 
-        leftIndent=20, 
-        fontName='Helvetica'
-    ))
-
-    Story = []
-
-    # --- DEBUG LOG ---
-    print("===== PDF Generation Start =====")
-    print(f"Structured Report Length: {len(structured) if structured else 0}")
-    print(f"Diagnoses Received: {list(diag_map.keys()) if diag_map else []}")
-    print(f"Final Summary Length: {len(final) if final else 0}")
-    print(f"Output Path: {output_path}")
-    print("================================")
-
-    # --- Cover Page ---
-    Story.append(PageBreak())  # Placeholder cover, real design in cover_page()
-
-    # --- Table of Contents ---
-    Story.append(Paragraph("Table of Contents", styles["Header"]))
-    Story.append(Spacer(1, 0.2 * inch))
-    toc_entries = [
-        "1. Patient Summary",
-        "2. Structured Medical Report", 
-        "3. Cardiologist Assessment",
-        "4. Psychologist Assessment",
-        "5. Pulmonologist Assessment",
-        "6. Final Multidisciplinary Summary"
-    ]
-    for entry in toc_entries:
-        Story.append(Paragraph(entry, styles["TOCEntry"]))
-    Story.append(PageBreak())
-
-    # --- Patient Summary Table ---
-    Story.append(Paragraph("Patient Summary", styles["Header"]))
-    try:
-        summary_data = patient_summary_section(structured) if structured else [["Summary", "No structured data available"]]
-    except Exception as e:
-        print("[ERROR] patient_summary_section failed:", str(e))
-        summary_data = [["Summary", "Could not parse structured data."]]
-    
-    table_data = []
-    for row in summary_data:
-        table_data.append([
-            Paragraph(f"<b>{row[0]}</b>", styles["Body"]),
-            Paragraph(str(row[1]), styles["Body"])
-        ])
-    
-    summary_table = Table(table_data, colWidths=[140, 380])
-    summary_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#eaeaea')),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('LINEABOVE', (0, 0), (-1, 0), 1, colors.HexColor('#2e5a87')),
-        ('BOX', (0, 0), (-1, -1), 1, colors.grey),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 8),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-    ]))
-    Story.append(summary_table)
-    Story.append(PageBreak())
-
-    # --- Structured Medical Report ---
-    if structured:
-        Story.append(Paragraph("Structured Medical Report", styles["Header"]))
-        Story.append(HRFlowable(width="100%", thickness=2, color=colors.HexColor("#2e5a87")))
-        Story.append(Spacer(1, 0.2 * inch))
-        try:
-            structured_elements = parse_markdown_to_pdf(structured, styles)
-            Story.extend(structured_elements)
-        except Exception as e:
-            print("[ERROR] parse_markdown_to_pdf for structured failed:", str(e))
-            Story.append(Paragraph(str(structured), styles["Body"]))
-        Story.append(PageBreak())
-
-    # --- Specialist Diagnoses ---
-    if diag_map:
-        for role, txt in diag_map.items():
-            if txt:  # Only process if content exists
-                color_map = {
-                    "Cardiologist": "#f5c444",
-                    "Psychologist": "#89c3eb",
-                    "Pulmonologist": "#d1e189"
-                }
-                back_color = color_map.get(role, "#ededed")
-                Story.append(Paragraph(role, ParagraphStyle("SpecHeader", parent=styles["Header"], backColor=colors.HexColor(back_color))))
-                Story.append(HRFlowable(width="50%", thickness=1, color=colors.HexColor(back_color)))
-                Story.append(Spacer(1, 0.15 * inch))
-                try:
-                    specialist_elements = parse_markdown_to_pdf(txt, styles)
-                    Story.extend(specialist_elements)
-                except Exception as e:
-                    print(f"[ERROR] parse_markdown_to_pdf for {role} failed:", str(e))
-                    Story.append(Paragraph(str(txt), styles["Body"]))
-                Story.append(PageBreak())
-
-    # --- Final Multidisciplinary Summary ---
-    if final:
-        Story.append(Paragraph("Final Multidisciplinary Summary", styles["Header"]))
-        Story.append(HRFlowable(width="40%", thickness=1, color=colors.HexColor("#286245")))
-        Story.append(Spacer(1, 0.2 * inch))
-        try:
-            final_elements = parse_markdown_to_pdf(final, styles)
-            Story.extend(final_elements)
-        except Exception as e:
-            print("[ERROR] parse_markdown_to_pdf for final summary failed:", str(e))
-            Story.append(Paragraph(str(final), styles["Body"]))
-
-    # --- Build the PDF ---
-    try:
-        doc.build(Story, onFirstPage=cover_page, onLaterPages=other_pages)
-        print("[SUCCESS] PDF Generated at:", output_path)
-        return True
-    except Exception as e:
-        print("[FATAL ERROR] Failed to build PDF:", str(e))
-        return False
\ No newline at end of file
+    @metrics.timed("summary")
+    @tracer.traced("summary")
+    def run(self):
+        reports, budget_report = self.budgeted_reports()
+        self.last_call = {"prompt_budget": budget_report["action"]}
+        return complete_prompt(self.build_prompt(reports), temperature=0.5, info=self.last_call)
+    def stream(self):
+        return stream_prompt(self.build_prompt(), temperature=0.5)
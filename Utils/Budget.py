@@ -0,0 +1,254 @@
+import os
+import re
+import threading
+from collections import Counter
+from Utils.Metrics import metrics
+
+# Page numbers PyMuPDF leaves on a line of their own: "Page 3", "Page 3 of 10"
+_PAGE_MARKER = re.compile(r"^page\s+\d+(?:\s+of\s+\d+)?$", re.IGNORECASE)
+_SECTION_START = re.compile(r"^(?=##\s)", re.MULTILINE)
+# How many lines at the top and bottom of a page may be a running header/footer
+RUNNING_LINES_DEPTH = 2
+MARKER_TOKENS = 16
+
+
+def _load_tiktoken(encoding):
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(encoding)
+    except Exception as e:
+        # Not installed, or the encoding file can't be fetched (offline build)
+        print(f"[WARNING] tiktoken encoding {encoding!r} unavailable ({e}); token counts are estimates (~4 characters per token)")
+        return None
+
+
+def _normalise_line(line):
+    return re.sub(r"[ \t\u00a0]+", " ", line).strip()
+
+
+def running_lines(pages, depth=RUNNING_LINES_DEPTH):
+    """
+    Running headers/footers of extracted PDF pages: lines among the first or last
+    `depth` non-empty lines of a page that are the same on every page
+    """
+    if not pages or len(pages) < 2:
+        return set()
+    common = None
+    for page in pages:
+        lines = [line for line in (_normalise_line(line) for line in (page or "").split("\n")) if line]
+        edges = set(lines[:depth] + lines[-depth:])
+        common = edges if common is None else common & edges
+    return common or set()
+
+
+def compact(text, raw=False, running=()):
+    """
+    Whitespace clean-up of text headed for a prompt: runs of spaces collapsed and
+    at most one blank line in a row. With raw=True (text extracted from a PDF,
+    nothing else) "Page N [of M]" lines are dropped and each of the `running`
+    header/footer lines (see running_lines) is kept only once. Other lines are
+    kept as they are.
+    """
+    lines = [_normalise_line(line) for line in (text or "").replace("\r\n", "\n").replace("\r", "\n").split("\n")]
+    running = set(running) if raw else set()
+    seen, kept = set(), []
+    for line in lines:
+        if raw and _PAGE_MARKER.match(line):
+            continue
+        if line in running:
+            if line in seen:
+                continue
+            seen.add(line)
+        if not line and (not kept or not kept[-1]):
+            continue
+        kept.append(line)
+    return "\n".join(kept).strip()
+
+
+def _shares(sizes, limit):
+    """
+    Split `limit` tokens over parts of the given sizes: parts under an equal share
+    keep everything and what they don't use is shared among the rest. Ties break on
+    name, so the same input always gets the same split.
+    """
+    shares, remaining = {}, limit
+    pending = sorted(sizes, key=lambda name: (sizes[name], str(name)))
+    while pending:
+        share = remaining // len(pending)
+        if sizes[pending[0]] > share:
+            shares.update((name, share) for name in pending)
+            break
+        name = pending.pop(0)
+        shares[name] = sizes[name]
+        remaining -= sizes[name]
+    return shares
+
+
+class PromptBudget:
+    """
+    Counts prompt tokens locally (exactly with tiktoken, otherwise an estimate of
+    ~4 characters per token) and keeps the case content interpolated into each
+    stage's prompt under that stage's limit. Content that fits is left alone.
+    Content over the limit is compacted first; if it is still over, each part (report section / specialist assessment) is cut to a fair share
+    of the limit at line boundaries with a marker, or, where the caller has a
+    chunked path (structuring), it is told to take it. Also tracks how the local
+    estimates compare with the provider's reported prompt_tokens.
+    """
+
+    def __init__(self, limits, tokenizer="auto", encoding="o200k_base", enabled=True):
+        self.limits = dict(limits)
+        self.enabled = enabled
+        # tiktoken and its encoding file are loaded by the first count(), not at import
+        self._encoding_name = encoding if tokenizer in ("auto", "tiktoken") else None
+        self._encoding = None
+        self._encoding_loaded = self._encoding_name is None
+        self._encoding_lock = threading.Lock()
+        self.actions = Counter()
+        self.tokens_saved = 0
+        self.estimated_total = 0
+        self.actual_total = 0
+        self.abs_error_total = 0
+        self.observed = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            limits={
+                # Above this the raw text is structured in chunks (STRUCTURE_CHUNK_THRESHOLD_TOKENS is the older name)
+                "structure": int(os.getenv("PROMPT_BUDGET_STRUCTURE", os.getenv("STRUCTURE_CHUNK_THRESHOLD_TOKENS", "6000"))),
+                "specialist": int(os.getenv("PROMPT_BUDGET_SPECIALIST", "8000")),
+                "summary": int(os.getenv("PROMPT_BUDGET_SUMMARY", "12000"))
+            },
+            tokenizer=os.getenv("PROMPT_TOKENIZER", "auto").lower(),
+            encoding=os.getenv("PROMPT_TOKENIZER_ENCODING", "o200k_base"),
+            enabled=os.getenv("PROMPT_BUDGET_ENABLED", "1").lower() not in ("0", "false", "no")
+        )
+
+    def _tokenizer(self):
+        if not self._encoding_loaded:
+            with self._encoding_lock:
+                if not self._encoding_loaded:
+                    self._encoding = _load_tiktoken(self._encoding_name)
+                    self._encoding_loaded = True
+        return self._encoding
+
+    @property
+    def tokenizer(self):
+        return f"tiktoken:{self._encoding_name}" if self._tokenizer() is not None else "heuristic"
+
+    @property
+    def exact(self):
+        """Whether count() is a real tokenizer count rather than a characters/4 estimate"""
+        return self._tokenizer() is not None
+
+    def count(self, text):
+        """Prompt tokens in text: exact with tiktoken, otherwise estimated"""
+        if not text:
+            return 0
+        if self._tokenizer() is not None:
+            return len(self._encoding.encode_ordinary(text))
+        return len(text) // 4 + 1
+
+    def _record(self, stage, action, saved=0):
+        with self._lock:
+            self.actions[(stage, action)] += 1
+            self.tokens_saved += saved
+        metrics.inc("medigen_prompt_budget_total", stage=stage, action=action)
+
+    def _truncate(self, text, limit):
+        """The longest prefix of whole lines within `limit` tokens, plus a marker saying what was cut"""
+        total = self.count(text)
+        if total <= limit:
+            return text
+        # Room for the marker itself
+        limit = max(0, limit - MARKER_TOKENS)
+        kept, used = [], 0
+        for line in text.split("\n"):
+            cost = self.count(line) + 1
+            if used + cost > limit:
+                if not kept:
+                    # A single line over the limit is cut by characters
+                    kept.append(line[:max(0, limit) * 4])
+                break
+            kept.append(line)
+            used += cost
+        trimmed = total - self.count("\n".join(kept))
+        return "\n".join(kept).rstrip() + f"\n[... {trimmed} tokens trimmed to fit the prompt budget ...]"
+
+    def fit_parts(self, stage, parts, trim=True, raw=False, running=()):
+        """
+        parts: name -> text. Returns (parts, report); report has the stage, limit,
+        tokens before/after and the action taken: "none" (parts that fit are
+        returned untouched), "compacted", "trimmed", or "over" when trim=False and
+        the compacted parts still don't fit. raw and running are passed on to
+        compact() and only apply to text extracted from a PDF.
+        """
+        limit = self.limits.get(stage)
+        before = sum(self.count(text) for text in parts.values())
+        report = {"stage": stage, "limit": limit, "tokens_before": before, "tokens_after": before, "action": "none"}
+        if not self.enabled or limit is None:
+            # Disabled: nothing is rewritten, but callers with a chunked path still hear about it
+            if not trim and limit is not None and before > limit:
+                report["action"] = "over"
+            return dict(parts), report
+
+        if before <= limit:
+            self._record(stage, "none")
+            return dict(parts), report
+
+        fitted = {name: compact(text, raw, running) for name, text in parts.items()}
+        sizes = {name: self.count(text) for name, text in fitted.items()}
+        after = sum(sizes.values())
+        action = "compacted" if after < before else "none"
+        if after > limit:
+            if trim:
+                shares = _shares(sizes, limit)
+                fitted = {name: self._truncate(text, shares[name]) for name, text in fitted.items()}
+                after = sum(self.count(text) for text in fitted.values())
+                action = "trimmed"
+            else:
+                action = "over"
+        report.update(tokens_after=after, action=action)
+        self._record(stage, action, max(0, before - after))
+        return fitted, report
+
+    def fit(self, stage, text, trim=True):
+        """fit_parts for one text, shared out over its `## ` sections"""
+        if not self.enabled:
+            return text, self.fit_parts(stage, {0: text}, trim)[1]
+        sections = {index: section for index, section in enumerate(_SECTION_START.split(text or "")) if section}
+        fitted, report = self.fit_parts(stage, sections, trim)
+        if report["action"] == "none":
+            return text, report
+        return "\n\n".join(fitted[index].strip() for index in sorted(fitted) if fitted[index].strip()), report
+
+    def observe(self, estimated, actual):
+        """Compare a prompt's local estimate with the provider's usage.prompt_tokens"""
+        if not actual:
+            return
+        with self._lock:
+            self.estimated_total += estimated
+            self.actual_total += actual
+            self.abs_error_total += abs(estimated - actual)
+            self.observed += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "tokenizer": self.tokenizer,
+                # False: every count here is a characters/4 estimate (tiktoken isn't available)
+                "exact_counts": self.exact,
+                "limits": dict(self.limits),
+                "actions": {f"{stage}:{action}": count for (stage, action), count in sorted(self.actions.items())},
+                "tokens_saved": self.tokens_saved,
+                "calls_compared": self.observed,
+                # actual / estimated over all compared calls; 1.0 means the local count is exact
+                "actual_to_estimated": round(self.actual_total / self.estimated_total, 3) if self.estimated_total else None,
+                "mean_abs_error_tokens": round(self.abs_error_total / self.observed, 1) if self.observed else None
+            }
+
+
+# Shared by every LLM call in this process
+budget = PromptBudget.from_env()
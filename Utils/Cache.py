@@ -0,0 +1,284 @@
+import os
+import json
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+def file_digest(file_path, chunk_size=1024 * 1024):
+    """SHA-256 hex digest of a file's contents, read in chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(*parts):
+    """Stable SHA-256 hex digest of the given JSON-serialisable parts"""
+    payload = json.dumps(parts, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """
+    Content-addressed text store: one file per key under a sharded directory.
+    Entries older than ttl seconds are treated as missing, and once the directory
+    grows past max_bytes the least recently read entries are removed. Values are
+    stored as plain text; directory=None disables the store (every get misses).
+    """
+
+    def __init__(self, directory, ttl=None, max_bytes=None, suffix=".txt"):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = None
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return bool(self.directory)
+
+    def _count(self, miss=False, evicted=False):
+        with self._lock:
+            if miss:
+                self.misses += 1
+            else:
+                self.hits += 1
+            if evicted:
+                self.evictions += 1
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + self.suffix)
+
+    def get(self, key):
+        if not self.directory:
+            self._count(miss=True)
+            return None
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+            if self.ttl and time.time() - stat.st_mtime > self.ttl:
+                self._count(miss=True, evicted=self._remove(path))
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                value = f.read()
+            # atime records the last read for LRU eviction, mtime keeps the write time for TTL
+            os.utime(path, (time.time(), stat.st_mtime))
+            self._count()
+            return value
+        except FileNotFoundError:
+            self._count(miss=True)
+            return None
+        except OSError as e:
+            print("[CACHE] disk read failed:", e)
+            self._count(miss=True)
+            return None
+
+    def set(self, key, value):
+        if not self.directory:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(value)
+            # Overwriting a key only grows the cache by the difference
+            added = os.path.getsize(tmp_path)
+            try:
+                added -= os.path.getsize(path)
+            except OSError:
+                pass
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print("[CACHE] disk write failed:", e)
+            return
+        if self.max_bytes:
+            with self._lock:
+                if self._size is None:
+                    self._size = self._scan_size()
+                else:
+                    self._size += added
+                over_budget = self._size > self.max_bytes
+            if over_budget:
+                self.evict()
+
+    def _remove(self, path):
+        """True if the file was removed; callers count the eviction under the lock"""
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(self.suffix):
+                    path = os.path.join(root, name)
+                    try:
+                        yield path, os.stat(path)
+                    except OSError:
+                        continue
+
+    def _scan_size(self):
+        return sum(stat.st_size for _, stat in self._entries())
+
+    def evict(self):
+        """Drop expired entries, then least recently read ones until 90% of max_bytes"""
+        if not self.directory:
+            return
+        with self._lock:
+            now = time.time()
+            live = []
+            for path, stat in self._entries():
+                if self.ttl and now - stat.st_mtime > self.ttl:
+                    if self._remove(path):
+                        self.evictions += 1
+                else:
+                    live.append((stat.st_atime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in live)
+            if self.max_bytes and total > self.max_bytes:
+                target = self.max_bytes * 0.9
+                for _, size, path in sorted(live):
+                    if total <= target:
+                        break
+                    if self._remove(path):
+                        self.evictions += 1
+                    total -= size
+            self._size = total
+
+    def clear(self):
+        if not self.directory:
+            return
+        with self._lock:
+            for path, _ in list(self._entries()):
+                if self._remove(path):
+                    self.evictions += 1
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "directory": self.directory,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+
+class LLMCache:
+    """
+    Two-tier cache for LLM completions keyed on (model, temperature, prompt):
+    a bounded in-memory LRU in front of an optional DiskCache. The disk tier
+    keeps model output (which quotes the reports) in plain text, so it is only
+    used when a directory is given.
+    """
+
+    def __init__(self, max_entries=256, directory=None, ttl=None, max_bytes=None, enabled=True):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.disk = DiskCache(directory, ttl=ttl, max_bytes=max_bytes, suffix=".json") if (enabled and directory) else None
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    @classmethod
+    def from_env(cls):
+        # Disk tier is opt-in: unset keeps completions in memory only
+        directory = os.getenv("LLM_CACHE_DIR", "")
+        return cls(
+            max_entries=int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256")),
+            directory=directory or None,
+            ttl=float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+            max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", "200")) * 1024 * 1024),
+            enabled=os.getenv("LLM_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+        )
+
+    @staticmethod
+    def key(model, temperature, prompt):
+        return cache_key(model, temperature, prompt)
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, model, temperature, prompt):
+        if not self.enabled:
+            return None
+        key = self.key(model, temperature, prompt)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+
+        if self.disk is not None:
+            raw = self.disk.get(key)
+            if raw is not None:
+                try:
+                    value = json.loads(raw)["response"]
+                except (ValueError, KeyError):
+                    value = None
+                if value is not None:
+                    self._remember(key, value)
+                    with self._lock:
+                        self.disk_hits += 1
+                    return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, model, temperature, prompt, response):
+        if not self.enabled or not response:
+            return
+        key = self.key(model, temperature, prompt)
+        self._remember(key, response)
+        with self._lock:
+            self.stores += 1
+        if self.disk is not None:
+            self.disk.set(key, json.dumps({
+                "model": model,
+                "temperature": temperature,
+                "response": response,
+                "created": time.time()
+            }, ensure_ascii=False))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "memory_entries": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "disk_enabled": self.disk is not None,
+                "disk_evictions": self.disk.evictions if self.disk is not None else 0
+            }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
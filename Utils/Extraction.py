@@ -0,0 +1,96 @@
+import os
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Guards against runaway bundles; 0 disables a limit
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "1000"))
+PDF_MAX_TEXT_BYTES = int(float(os.getenv("PDF_MAX_TEXT_MB", "50")) * 1024 * 1024)
+# Documents with at least this many pages are extracted by a process pool, in page ranges
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+PDF_PARALLEL_PAGES_PER_TASK = int(os.getenv("PDF_PARALLEL_PAGES_PER_TASK", "16"))
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+
+_pool = None
+
+
+class PdfTooLarge(ValueError):
+    """The document exceeds PDF_MAX_PAGES or its text exceeds PDF_MAX_TEXT_MB"""
+
+
+def _fitz():
+    # PyMuPDF is imported on the first extraction, not when the app (or /health) loads
+    import fitz
+    return fitz
+
+
+def _extract_page_range(file_path, start, stop):
+    with _fitz().open(file_path) as doc:
+        return [doc[number].get_text() for number in range(start, stop)]
+
+
+def _get_pool():
+    # spawn rather than fork: the parent process is running HTTP and executor threads
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=PDF_EXTRACT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+def _parallel_pages(file_path, page_count):
+    """Page ranges extracted by the pool, at most two per worker in flight, yielded in order"""
+    ranges = deque(
+        (start, min(start + PDF_PARALLEL_PAGES_PER_TASK, page_count))
+        for start in range(0, page_count, PDF_PARALLEL_PAGES_PER_TASK)
+    )
+    pool, in_flight = _get_pool(), deque()
+    try:
+        while ranges or in_flight:
+            while ranges and len(in_flight) < PDF_EXTRACT_WORKERS * 2:
+                in_flight.append(pool.submit(_extract_page_range, file_path, *ranges.popleft()))
+            yield from in_flight.popleft().result()
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+
+def open_pdf(file_path=None, stream=None):
+    """Open a PDF from a path, or from an in-memory buffer (bytes or a memoryview of an mmap)"""
+    if stream is not None:
+        return _fitz().open(stream=stream, filetype="pdf")
+    return _fitz().open(file_path)
+
+
+def iter_pdf_pages(file_path=None, max_pages=None, max_bytes=None, parallel=None, stream=None):
+    """
+    Yield the text of each page in order without holding the whole document's text.
+    Raises PdfTooLarge before extracting when the page count is over max_pages, or
+    part way through once the text yielded passes max_bytes. parallel=None uses the
+    process pool for documents of PDF_PARALLEL_MIN_PAGES pages or more; documents
+    given as an in-memory `stream` are always extracted in this process.
+    """
+    max_pages = PDF_MAX_PAGES if max_pages is None else max_pages
+    max_bytes = PDF_MAX_TEXT_BYTES if max_bytes is None else max_bytes
+
+    with open_pdf(file_path, stream) as doc:
+        page_count = doc.page_count
+        if max_pages and page_count > max_pages:
+            raise PdfTooLarge(f"PDF has {page_count} pages; the limit is {max_pages}")
+        if stream is not None:
+            parallel = False
+        elif parallel is None:
+            parallel = PDF_EXTRACT_WORKERS > 1 and page_count >= PDF_PARALLEL_MIN_PAGES
+        # Only the serving process owns a pool; a worker process extracts serially
+        if multiprocessing.parent_process() is not None:
+            parallel = False
+        pages = _parallel_pages(file_path, page_count) if parallel else (page.get_text() for page in doc)
+
+        total = 0
+        for text in pages:
+            total += len(text.encode("utf-8"))
+            if max_bytes and total > max_bytes:
+                raise PdfTooLarge(f"PDF text exceeds the {max_bytes}-byte limit")
+            yield text
@@ -0,0 +1,196 @@
+import os
+import time
+import uuid
+import tempfile
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from Utils.Pipeline import STAGES, run_pipeline
+from Utils.Tracing import tracer
+
+
+class JobQueueFull(Exception):
+    """Raised when every worker is busy and the pending queue is at capacity"""
+
+
+class Job:
+    def __init__(self, pdf_path, callback_url=None, agent_timeouts=None, force_all_specialists=False, release=None):
+        self.id = uuid.uuid4().hex
+        self.pdf_path = pdf_path
+        self.callback_url = callback_url
+        self.agent_timeouts = agent_timeouts or {}
+        self.force_all_specialists = force_all_specialists
+        # Called once the run is over, e.g. to unpin the input PDF
+        self.release = release
+        self.report_url = None
+        self.status = "queued"
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self.finished_monotonic = None
+        self.stages = {name: {"status": "pending", "seconds": None} for name in STAGES}
+        self.error = None
+        self.result = None
+        self.artifact_path = None
+        self.callback = None
+        # Trace of the request that queued the job; the run is recorded under it
+        current = tracer.current()
+        self.trace_id = current.trace_id if current else None
+
+    def to_dict(self):
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "stages": {name: dict(stage) for name, stage in self.stages.items()},
+            "error": self.error,
+            "callback": self.callback,
+            "trace_id": self.trace_id
+        }
+        if self.result is not None:
+            data["result"] = dict(self.result, report_url=self.report_url)
+        return data
+
+
+class JobManager:
+    """
+    Runs the end-to-end pipeline on a bounded background thread pool.
+    At most `workers` jobs run at once and at most `max_pending` more may wait;
+    finished jobs and their PDFs are kept for `retention` seconds.
+    """
+
+    def __init__(self, workers=2, max_pending=20, artifact_dir=None, retention=3600, callback_timeout=10):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.artifact_dir = artifact_dir or os.path.join(tempfile.gettempdir(), "medical_jobs")
+        self.retention = retention
+        self.callback_timeout = callback_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        # Webhooks retry with sleeps; they go out here so a slow receiver doesn't hold a job worker
+        self._callbacks = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job-callback")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.artifact_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            workers=int(os.getenv("JOB_WORKERS", "2")),
+            max_pending=int(os.getenv("JOB_MAX_PENDING", "20")),
+            artifact_dir=os.getenv("JOBS_DIR") or None,
+            retention=float(os.getenv("JOB_RETENTION_SECONDS", "3600")),
+            callback_timeout=float(os.getenv("JOB_CALLBACK_TIMEOUT_SECONDS", "10"))
+        )
+
+    def submit(self, pdf_path, callback_url=None, agent_timeouts=None, report_url=None, force_all_specialists=False,
+               release=None):
+        """
+        Queue a pipeline run; report_url may be a callable taking the new job id.
+        release() is called when the run finishes (not if the queue is full)
+        """
+        self._prune()
+        with self._lock:
+            active = sum(1 for job in self._jobs.values() if job.status in ("queued", "running"))
+            if active >= self.workers + self.max_pending:
+                raise JobQueueFull(f"{active} jobs already queued or running")
+            job = Job(pdf_path, callback_url, agent_timeouts, force_all_specialists, release)
+            job.report_url = report_url(job.id) if callable(report_url) else report_url
+            self._jobs[job.id] = job
+        self._executor.submit(contextvars.copy_context().run, self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def snapshot(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def _on_stage(self, job):
+        def update(name, status, seconds):
+            with self._lock:
+                job.stages[name] = {"status": status, "seconds": seconds}
+        return update
+
+    def _run(self, job):
+        with self._lock:
+            job.status = "running"
+            job.started_at = datetime.now().isoformat()
+        output_path = os.path.join(self.artifact_dir, f"{job.id}.pdf")
+        try:
+            with tracer.span("job", job_id=job.id):
+                result = run_pipeline(
+                    job.pdf_path, output_path, job.agent_timeouts,
+                    on_stage=self._on_stage(job),
+                    force_all_specialists=job.force_all_specialists
+                )
+            with self._lock:
+                job.artifact_path = output_path
+                job.result = {
+                    "structured_report": result["structured_report"],
+                    "structuring": result["structuring"],
+                    "assessments": result["agent_responses"],
+                    "final_summary": result["final_summary"],
+                    "agent_timings": result["agent_timings"],
+                    "routing": result["routing"],
+                    "stage_timings": result["stage_timings"]
+                }
+                job.status = "succeeded"
+        except Exception as e:
+            print(f"[ERROR] job {job.id} failed:", e)
+            with self._lock:
+                job.error = str(e)
+                job.status = "failed"
+        finally:
+            with self._lock:
+                job.finished_at = datetime.now().isoformat()
+                job.finished_monotonic = time.monotonic()
+            if job.release is not None:
+                try:
+                    job.release()
+                except Exception as e:
+                    print(f"[WARNING] job {job.id} release failed:", e)
+
+        if job.callback_url:
+            self._callbacks.submit(contextvars.copy_context().run, self._notify, job)
+
+    def _notify(self, job):
+        import requests  # loaded by the first webhook, not at worker boot
+        payload = self.snapshot(job.id)
+        for attempt in range(3):
+            try:
+                resp = requests.post(
+                    job.callback_url, json=payload, timeout=self.callback_timeout,
+                    headers={"X-Trace-Id": job.trace_id} if job.trace_id else None
+                )
+                outcome = {"status_code": resp.status_code, "attempts": attempt + 1}
+                if resp.status_code < 500:
+                    break
+            except requests.RequestException as e:
+                outcome = {"error": str(e), "attempts": attempt + 1}
+            if attempt < 2:
+                time.sleep(2 ** attempt)
+        with self._lock:
+            job.callback = outcome
+
+    def _prune(self):
+        """Forget finished jobs older than the retention window and delete their PDFs"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                job for job in self._jobs.values()
+                if job.finished_monotonic is not None and now - job.finished_monotonic > self.retention
+            ]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            if job.artifact_path and os.path.exists(job.artifact_path):
+                try:
+                    os.remove(job.artifact_path)
+                except OSError as e:
+                    print("[ERROR] could not remove job artifact:", e)
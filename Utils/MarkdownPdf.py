@@ -0,0 +1,439 @@
+"""
+Markdown -> ReportLab flowables in one pass, for the Markdown the agent prompts
+produce. compile_markdown() turns text into a small intermediate form (plain
+tuples, so it can be cached, shared and pickled) and ir_to_flowables() lays it
+out with the report styles. The block rules follow Python-Markdown with the
+`tables` and `nl2br` extensions, which the previous markdown -> HTML ->
+BeautifulSoup pipeline used, so reports look the same:
+
+    ("heading", level, markup)          # levels 1-6; only 1-3 are rendered
+    ("paragraph", markup)               # single newlines become <br/>
+    ("list", ordered, (markup, ...))    # nested items are folded into their parent item
+    ("quote", markup)
+    ("table", ((markup, ...), ...))
+    ("rule",)                           # horizontal rule
+    ("code", text)                      # indented code block
+
+Rules, code blocks and headings below level 3 are kept in the IR because they
+still end a list, but they render nothing, as before.
+"""
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+_HASH_HEADER = re.compile(r"(?:^|\n)(?P<level>#{1,6})(?P<header>(?:\\.|[^\\])*?)#*(?:\n|$)")
+_SETEXT_HEADER = re.compile(r"^.*?\n[=-]+[ ]*(\n|$)")
+_HR = re.compile(r"^[ ]{0,3}(?:(?:-+[ ]{0,2}){3,}|(?:_+[ ]{0,2}){3,}|(?:\*+[ ]{0,2}){3,})[ ]*$", re.MULTILINE)
+_OLIST = re.compile(r"^[ ]{0,3}\d+\.[ ]+(.*)")
+_ULIST = re.compile(r"^[ ]{0,3}[*+-][ ]+(.*)")
+_LIST_CHILD = re.compile(r"^[ ]{0,3}((\d+\.)|[*+-])[ ]+(.*)")
+_LIST_INDENT = re.compile(r"^[ ]{4,7}((\d+\.)|[*+-])[ ]+.*")
+_QUOTE = re.compile(r"(^|\n)[ ]{0,3}>[ ]?(.*)")
+_TABLE_END_BORDER = re.compile(r"(?<!\\)(?:\\\\)*\|$")
+_INDENT = " " * 4
+
+_CODE_SPAN = re.compile(r"(?<!\\)(`+)(.+?)(?<!`)\1(?!`)", re.DOTALL)
+_ESCAPE = re.compile(r"\\([\\`*_{}\[\]()#+\-.!])")
+_IMAGE = re.compile(r"!\[([^\]]*)\]\([^)]*\)")
+_LINK = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_AUTOLINK = re.compile(r"&lt;((?:[Ff]|[Hh][Tt])[Tt][Pp][Ss]?://[^&]*?)&gt;")
+_HTML_BREAK = re.compile(r"&lt;br\s*/?&gt;", re.IGNORECASE)
+_LINE_BREAK = re.compile(r"  \n")
+_NOT_STRONG = re.compile(r"(^|(?<=\s))(\*{1,3}|_{1,3})(?=\s|$)")
+# Delimiters open only before non-space and close only after non-space (flanking runs)
+_EM_STRONG = re.compile(r"(?<!\*)(\*{3})(?=[^\s*])(.+?)(?<=[^\s*])\1(?!\*)", re.DOTALL)
+_STRONG = re.compile(r"(?<!(?<!\*)\*)(\*{2})(?=[^\s*]|\*[^\s*])((?:(?!\*\*).)+?)(?<=[^\s*])\1(?!\*)", re.DOTALL)
+_EMPHASIS = re.compile(r"(?<!\*)(\*)(?=[^\s*])([^*]+?)(?<=[^\s*])\1(?!\*)")
+_SMART_STRONG = re.compile(r"(?<!\w)(_{2})(?=[^\s_])((?:(?!__).)+?)(?<=[^\s_])\1(?!\w)", re.DOTALL)
+_SMART_EMPHASIS = re.compile(r"(?<!\w)(_)(?=[^\s_])(.+?)(?<=[^\s_])\1(?!\w)", re.DOTALL)
+_PLACEHOLDER = re.compile("\x02(\\d+)\x03")
+_EMPHASIS_PASSES = (
+    (_EM_STRONG, "***", "<b><i>", "</i></b>"),
+    (_STRONG, "**", "<b>", "</b>"),
+    (_EMPHASIS, "*", "<i>", "</i>"),
+    (_SMART_STRONG, "__", "<b>", "</b>"),
+    (_SMART_EMPHASIS, "_", "<i>", "</i>"),
+)
+
+
+@lru_cache(maxsize=None)
+def table_style():
+    # ReportLab is only imported once something is laid out; compiling Markdown doesn't need it
+    from reportlab.platypus import TableStyle
+    from reportlab.lib import colors
+    return TableStyle([
+        ('BOX', (0, 0), (-1, -1), 1, colors.black),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ])
+
+
+HEADING_STYLES = {
+    1: ("MainHeader", 0.1, 0.1),
+    2: ("SubHeader", 0.08, 0.06),
+    3: ("SubSubHeader", 0.06, 0.04),
+}
+
+
+def _escape(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _emphasis(text, keep):
+    """Bold/italic passes; the text inside a match gets the same passes, so markers nest"""
+    if "*" not in text and "_" not in text:
+        return text
+    text = _NOT_STRONG.sub(lambda m: keep(m.group(2)), text)
+    for pattern, delimiter, open_tag, close_tag in _EMPHASIS_PASSES:
+        # Patterns can't span their own delimiter, so repeating resolves `**a **b** c**` inside out
+        count = 1 if delimiter in text else 0
+        while count:
+            text, count = pattern.subn(lambda m: keep(f"{open_tag}{_emphasis(m.group(2), keep)}{close_tag}"), text)
+    return text
+
+
+def inline_markup(text):
+    """Markdown inline syntax -> ReportLab paragraph markup (<b>, <i>, Courier, <br/>)"""
+    stash = []
+
+    def keep(markup):
+        stash.append(markup)
+        return f"\x02{len(stash) - 1}\x03"
+
+    # Each pass is skipped when its marker character can't be in the text; most lines are plain
+    if "`" in text:
+        text = _CODE_SPAN.sub(lambda m: keep(f"<font name='Courier'>{_escape(' '.join(m.group(2).split()))}</font>"), text)
+    if "\\" in text:
+        text = _ESCAPE.sub(lambda m: keep(_escape(m.group(1))), text)
+    text = _escape(text)
+    if "[" in text:
+        text = _IMAGE.sub("", text)
+        text = _LINK.sub(r"\1", text)
+    if "&lt;" in text:
+        text = _AUTOLINK.sub(r"\1", text)
+        text = _HTML_BREAK.sub(lambda m: keep("<br/>"), text)
+    if "  \n" in text:
+        text = _LINE_BREAK.sub(lambda m: keep("<br/>"), text)
+    text = _emphasis(text, keep)
+
+    # Stashed markup can itself contain placeholders (e.g. code inside bold)
+    while stash and _PLACEHOLDER.search(text):
+        text = _PLACEHOLDER.sub(lambda m: stash[int(m.group(1))], text)
+    return text.strip().replace("\n", "<br/>\n")
+
+
+def _split_row(row):
+    row = row.strip(" ")
+    if row.startswith("|"):
+        row = row[1:]
+    if _TABLE_END_BORDER.search(row):
+        row = row[:-1]
+    cells, current, code = [], "", False
+    for i, char in enumerate(row):
+        if char == "`":
+            code = not code
+        if char == "|" and not code and (i == 0 or row[i - 1] != "\\"):
+            cells.append(current)
+            current = ""
+        else:
+            current += char
+    cells.append(current)
+    return [cell.strip() for cell in cells]
+
+
+def _table_rows(block):
+    """Header + body rows if the block is a pipe table, else None"""
+    if "|" not in block:
+        return None
+    rows = [row.strip(" ") for row in block.split("\n")]
+    if len(rows) < 2:
+        return None
+    header = _split_row(rows[0])
+    bordered = rows[0].startswith("|") or _TABLE_END_BORDER.search(rows[0]) is not None
+    is_table = len(header) > 1
+    if not is_table and len(header) == 1 and bordered:
+        is_table = all(row.startswith("|") or _TABLE_END_BORDER.search(row) for row in rows[1:])
+    if not is_table:
+        return None
+    separator = _split_row(rows[1])
+    if len(separator) != len(header) or not set("".join(separator)) <= set("|:- "):
+        return None
+    table = [header]
+    for row in rows[2:]:
+        cells = _split_row(row)
+        table.append((cells + [""] * len(header))[:len(header)])
+    if len(table) == 1:
+        # A header-only table still gets one (empty) body row
+        table.append([""] * len(header))
+    return table
+
+
+def _list_items(block):
+    """Split a list block into item texts; indented runs stay attached for nesting"""
+    items = []
+    for line in block.split("\n"):
+        match = _LIST_CHILD.match(line)
+        if match:
+            items.append(match.group(3))
+        elif _LIST_INDENT.match(line):
+            if items[-1].startswith(_INDENT):
+                items[-1] = f"{items[-1]}\n{line}"
+            else:
+                items.append(line)
+        else:
+            items[-1] = f"{items[-1]}\n{line}"
+    return items
+
+
+def _dedent(block):
+    return "\n".join(line[4:] if line.startswith(_INDENT) else line.lstrip(" ") for line in block.split("\n"))
+
+
+class _Compiler:
+    def __init__(self):
+        self.ir = []
+
+    def last_list(self):
+        return self.ir[-1] if self.ir and self.ir[-1][0] == "list" else None
+
+    def add_to_last_item(self, text):
+        kind, ordered, items = self.ir[-1]
+        items[-1] = f"{items[-1]}\n{text}" if items[-1] else text
+
+    def item_text(self, item):
+        """An item's own text, with any nested list items folded in on new lines"""
+        nested = _Compiler()
+        nested.run(item)
+        parts = []
+        for node in nested.ir:
+            if node[0] == "list":
+                parts.extend(node[2])
+            elif node[0] in ("paragraph", "heading", "quote"):
+                parts.append(node[-1])
+            elif node[0] == "table":
+                parts.extend(" ".join(row) for row in node[1])
+        return "\n".join(part for part in parts if part)
+
+    def parse_blocks(self, blocks):
+        """Compile blocks in order; a block handler can push text back onto `blocks`"""
+        blocks.reverse()
+        while blocks:
+            self.block(blocks.pop(), blocks)
+
+    def run(self, text):
+        blocks = re.sub(r"(?<=\n) +\n", "\n", "\n" + text.replace("\r\n", "\n").replace("\r", "\n").expandtabs(4) + "\n")
+        self.parse_blocks(blocks.strip("\n").split("\n\n"))
+        return self.ir
+
+    def block(self, block, pending):
+        if not block.strip():
+            return
+        if block.startswith("\n"):
+            pending.append(block.lstrip("\n"))
+            return
+
+        # Indented: more of the previous list item, otherwise a code block
+        if block.startswith(_INDENT):
+            if self.last_list():
+                self.add_to_last_item(self.item_text(_dedent(block)))
+                return
+            lines = block.split("\n")
+            for number, line in enumerate(lines):
+                if line.strip() and not line.startswith(_INDENT):
+                    pending.append("\n".join(lines[number:]))
+                    lines = lines[:number]
+                    break
+            self.ir.append(("code", "\n".join(line[4:] for line in lines)))
+            return
+
+        table = _table_rows(block)
+        if table:
+            self.ir.append(("table", [[inline_markup(cell) for cell in row] for row in table]))
+            return
+
+        match = _HASH_HEADER.search(block)
+        if match:
+            before, after = block[:match.start()], block[match.end():]
+            if after:
+                pending.append(after)
+            if before:
+                self.parse_blocks([before])
+            self.ir.append(("heading", len(match.group("level")), inline_markup(match.group("header").strip())))
+            return
+
+        match = _SETEXT_HEADER.match(block)
+        if match:
+            lines = block.split("\n")
+            self.ir.append(("heading", 1 if lines[1].startswith("=") else 2, inline_markup(lines[0].strip())))
+            if len(lines) > 2:
+                pending.append("\n".join(lines[2:]))
+            return
+
+        match = _HR.search(block)
+        if match:
+            before, after = block[:match.start()].rstrip("\n"), block[match.end():].lstrip("\n")
+            if after:
+                pending.append(after)
+            if before:
+                self.parse_blocks([before])
+            self.ir.append(("rule",))
+            return
+
+        ordered = bool(_OLIST.match(block))
+        if ordered or _ULIST.match(block):
+            if self.last_list() is None:
+                self.ir.append(("list", ordered, []))
+            items = self.ir[-1][2]
+            for item in _list_items(block):
+                if item.startswith(_INDENT) and items:
+                    items[-1] = "\n".join(part for part in (items[-1], self.item_text(_dedent(item))) if part)
+                else:
+                    items.append(self.item_text(item) if _LIST_INDENT.search(item) or "\n" in item else inline_markup(item))
+            return
+
+        match = _QUOTE.search(block)
+        if match:
+            before = block[:match.start()]
+            if before:
+                self.parse_blocks([before])
+            lines = [_QUOTE.match(line) for line in block[match.start():].lstrip("\n").split("\n")]
+            quoted = "\n".join(m.group(2) if m else line for m, line in zip(lines, block[match.start():].lstrip("\n").split("\n")))
+            if not before and self.ir and self.ir[-1][0] == "quote":
+                # A quote right after another one continues it
+                self.ir[-1] = ("quote", f"{self.ir[-1][1]} {self.item_text(quoted)}")
+            else:
+                self.ir.append(("quote", self.item_text(quoted)))
+            return
+
+        self.ir.append(("paragraph", inline_markup(block.lstrip())))
+
+
+def _freeze(node):
+    if node[0] == "list":
+        return ("list", node[1], tuple(node[2]))
+    if node[0] == "table":
+        return ("table", tuple(tuple(row) for row in node[1]))
+    return node
+
+
+def compile_markdown(text):
+    """Markdown text -> tuple of IR nodes (see module docstring)"""
+    return tuple(_freeze(node) for node in _Compiler().run(text or ""))
+
+
+class IRCache:
+    """
+    In-memory LRU of compiled IR keyed on the SHA-256 of the Markdown, so
+    re-rendering a report only compiles the sections whose text changed.
+    Entries are immutable tuples and are shared between callers.
+    """
+
+    def __init__(self, max_entries=128, enabled=True):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_entries=int(os.getenv("MARKDOWN_IR_CACHE_ENTRIES", "128")),
+            enabled=os.getenv("MARKDOWN_IR_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+        )
+
+    def compile(self, text):
+        if not self.enabled:
+            return compile_markdown(text)
+        key = hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                self.seconds_saved += entry[1]
+                return entry[0]
+
+        started = time.perf_counter()
+        ir = compile_markdown(text)
+        with self._lock:
+            self.misses += 1
+            self._memory[key] = (ir, time.perf_counter() - started)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+        return ir
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._memory),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "compile_seconds_saved": round(self.seconds_saved, 4)
+            }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+
+
+# Shared by every render in this process
+ir_cache = IRCache.from_env()
+
+
+def compile_sections(structured, diag_map, final):
+    """
+    IR for each Markdown section of a report ("structured", each specialist role,
+    "final") through the shared IR cache, so unchanged sections aren't re-parsed
+    """
+    sections = {"structured": structured, "final": final}
+    sections.update(diag_map or {})
+    return {name: ir_cache.compile(text) for name, text in sections.items() if text}
+
+
+def ir_to_flowables(ir, styles):
+    from reportlab.platypus import Paragraph, Spacer, Table
+    from reportlab.lib.units import inch
+    elements = []
+    for node in ir:
+        kind = node[0]
+        if kind == "heading" and node[1] in HEADING_STYLES:
+            style, before, after = HEADING_STYLES[node[1]]
+            elements.append(Spacer(1, before * inch))
+            elements.append(Paragraph(node[2], styles[style]))
+            elements.append(Spacer(1, after * inch))
+        elif kind == "paragraph":
+            if node[1].strip():
+                elements.append(Paragraph(node[1], styles['Body']))
+                elements.append(Spacer(1, 0.06 * inch))
+        elif kind == "list":
+            elements.append(Spacer(1, 0.04 * inch))
+            for number, item in enumerate(node[2], start=1):
+                bullet = f"{number}." if node[1] else "•"
+                elements.append(Paragraph(f'{bullet} {item}', styles['BulletBody']))
+            elements.append(Spacer(1, 0.04 * inch))
+        elif kind == "quote":
+            elements.append(Paragraph(f"<i>{node[1]}</i>", styles['Body']))
+            elements.append(Spacer(1, 0.06 * inch))
+        elif kind == "table":
+            table = Table([[Paragraph(cell, styles['Body']) for cell in row] for row in node[1]])
+            table.setStyle(table_style())
+            elements.append(table)
+            elements.append(Spacer(1, 0.1 * inch))
+    return elements
+
+
+def parse_markdown_to_pdf(markdown_text, styles):
+    """Markdown as produced by the agents -> list of ReportLab flowables"""
+    return ir_to_flowables(compile_markdown(markdown_text), styles)
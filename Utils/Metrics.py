@@ -0,0 +1,229 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+# Upper bounds (seconds) of the latency histogram buckets; LLM calls sit in the upper half
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# name -> (type, help)
+METRICS = {
+    "medigen_stage_duration_seconds": ("histogram", "Time spent in each pipeline stage, including cache hits"),
+    "medigen_stage_in_flight": ("gauge", "Stage calls currently running"),
+    "medigen_stage_errors_total": ("counter", "Stage calls that raised"),
+    "medigen_llm_requests_total": ("counter", "Chat completion requests sent to the provider, by outcome"),
+    "medigen_llm_request_duration_seconds": ("histogram", "Time until a chat completion returned (or its stream ended)"),
+    "medigen_llm_tokens_total": ("counter", "Tokens reported in the provider's usage, by type"),
+    "medigen_prompt_budget_total": ("counter", "Prompt budget checks by stage and the action taken (none/compacted/trimmed/over)"),
+}
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    # %g would turn large token counters into 1.23e+06
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+class MetricsRegistry:
+    """
+    In-process counters, gauges and latency histograms, rendered in the
+    Prometheus text format. With `directory` set (one per deployment, shared by
+    every gunicorn worker) each process also writes its values to
+    <directory>/metrics-<pid>.json every `flush_interval` seconds and
+    render() adds up all of them; gauges of processes that have exited are dropped.
+    """
+
+    def __init__(self, directory=None, flush_interval=5.0, buckets=LATENCY_BUCKETS):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.buckets = tuple(buckets)
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._flusher = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            directory=os.getenv("METRICS_DIR") or None,
+            flush_interval=float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+        )
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def add(self, name, value, **labels):
+        """Move a gauge up or down"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[0][index] += 1
+                    break
+            histogram[1] += value
+            histogram[2] += 1
+
+    @contextmanager
+    def track(self, stage):
+        """Time the block as `stage`: in-flight while it runs, an error if it raises"""
+        self.add("medigen_stage_in_flight", 1, stage=stage)
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc("medigen_stage_errors_total", stage=stage)
+            raise
+        finally:
+            self.observe("medigen_stage_duration_seconds", time.perf_counter() - start, stage=stage)
+            self.add("medigen_stage_in_flight", -1, stage=stage)
+
+    def timed(self, stage):
+        """Decorator form of track()"""
+        def decorate(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.track(stage):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def record_llm_call(self, seconds, usage=None, outcome="ok"):
+        """One chat.completions.create call; usage is the response's (or final stream chunk's) `usage`"""
+        self.inc("medigen_llm_requests_total", outcome=outcome)
+        self.observe("medigen_llm_request_duration_seconds", seconds, outcome=outcome)
+        if usage is not None:
+            for kind in ("prompt", "completion"):
+                tokens = getattr(usage, f"{kind}_tokens", None)
+                if tokens:
+                    self.inc("medigen_llm_tokens_total", tokens, type=kind)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "counters": [[name, list(map(list, labels)), value] for (name, labels), value in self._counters.items()],
+                "gauges": [[name, list(map(list, labels)), value] for (name, labels), value in self._gauges.items()],
+                "histograms": [
+                    [name, list(map(list, labels)), list(counts), total, count]
+                    for (name, labels), (counts, total, count) in self._histograms.items()
+                ]
+            }
+
+    def flush(self):
+        if not self.directory:
+            return
+        path = os.path.join(self.directory, f"metrics-{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def start(self):
+        """Start flushing to the metrics directory in the background (no-op without one)"""
+        if self._flusher is not None or not self.directory:
+            return
+
+        def loop():
+            while True:
+                try:
+                    self.flush()
+                except Exception as e:
+                    print("[ERROR] metrics flush failed:", e)
+                time.sleep(self.flush_interval)
+
+        self._flusher = threading.Thread(target=loop, name="metrics-flusher", daemon=True)
+        self._flusher.start()
+
+    def _snapshots(self):
+        snapshots = [self.snapshot()]
+        if not self.directory:
+            return snapshots
+        own = f"metrics-{os.getpid()}.json"
+        for filename in os.listdir(self.directory):
+            if not filename.startswith("metrics-") or not filename.endswith(".json") or filename == own:
+                continue
+            try:
+                with open(os.path.join(self.directory, filename), "r", encoding="utf-8") as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError) as e:
+                print("[ERROR] unreadable metrics file:", filename, e)
+        return snapshots
+
+    def render(self):
+        """Every process's metrics, summed, in the Prometheus text exposition format"""
+        counters, gauges, histograms = {}, {}, {}
+        for snapshot in self._snapshots():
+            live = snapshot["pid"] == os.getpid() or _pid_alive(snapshot["pid"])
+            for name, labels, value in snapshot["counters"]:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, value in snapshot["gauges"] if live else ():
+                key = (name, tuple(map(tuple, labels)))
+                gauges[key] = gauges.get(key, 0) + value
+            for name, labels, counts, total, count in snapshot["histograms"]:
+                key = (name, tuple(map(tuple, labels)))
+                merged = histograms.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+                merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                merged[1] += total
+                merged[2] += count
+
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "histogram":
+                for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, bucket in zip(self.buckets, counts):
+                        cumulative += bucket
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', f'{bound:g}'),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {count}")
+            else:
+                values = counters if kind == "counter" else gauges
+                for (metric, labels), value in sorted(values.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Shared by every module in this process
+metrics = MetricsRegistry.from_env()
@@ -0,0 +1,432 @@
+import io
+import os
+import time
+import threading
+from datetime import datetime
+from reportlab.platypus import (
+    SimpleDocTemplate, Paragraph, Spacer, PageBreak,
+    Table, TableStyle, HRFlowable
+)
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.enums import TA_JUSTIFY, TA_CENTER, TA_LEFT
+from reportlab.lib.units import inch
+from reportlab.lib import colors
+from reportlab.lib.utils import ImageReader
+from Utils.MarkdownPdf import parse_markdown_to_pdf, ir_to_flowables, ir_cache, compile_sections
+from Utils.Metrics import metrics
+from Utils.Tracing import tracer
+
+LOGO_PATH = "logo.png"
+_logo = None
+
+def _cover_logo():
+    # Decoded once per process instead of on every cover page
+    global _logo
+    if _logo is None and os.path.exists(LOGO_PATH):
+        _logo = ImageReader(LOGO_PATH)
+    return _logo
+
+def cover_page(canvas, doc):
+    canvas.saveState()
+    width, height = A4
+    logo = _cover_logo()
+    if logo is not None:
+        canvas.drawImage(logo, width/2-80, height-250, width=160, height=160, preserveAspectRatio=True)
+    canvas.setFont("Helvetica-Bold", 24)
+    canvas.drawCentredString(width/2, height-280, "AI-Based Medical Diagnostic Report")
+    canvas.setFont("Helvetica", 15)
+    canvas.drawCentredString(width/2, height-320, "Generated by Medical Agent System")
+    canvas.setFont("Helvetica", 10)
+    canvas.drawCentredString(width/2, height-335, f"Report generated: {datetime.now().strftime('%d %b %Y, %I:%M %p')}")
+    canvas.setFont("Helvetica-Oblique", 10)
+    canvas.drawString(50, 40, "Confidential – For clinical use only")
+    canvas.drawRightString(width-50, 40, f"Page {doc.page}")
+    canvas.restoreState()
+
+def other_pages(canvas, doc):
+    canvas.saveState()
+    width, height = A4
+    canvas.setFont("Helvetica-Oblique", 9)
+    canvas.drawString(50, 40, "Medical Agent | Confidential")
+    canvas.drawRightString(width-50, 40, f"Page {doc.page}")
+    canvas.setStrokeColor(colors.grey)
+    canvas.setLineWidth(0.5)
+    canvas.line(50, 50, width-50, 50)
+    canvas.restoreState()
+
+def patient_summary_section(structured_text):
+    info, symptoms, diagnosis, urgency = "Not available", "Not listed", "–", "–"
+    
+    # Parse the markdown structured text
+    lines = structured_text.split("\n")
+    current_section = ""
+    
+    for line in lines:
+        line = line.strip()
+        
+        # Identify sections
+        if line.startswith("## PATIENT INFORMATION"):
+            current_section = "patient"
+            continue
+        elif line.startswith("## CHIEF COMPLAINT"):
+            current_section = "symptoms"
+            continue
+        elif line.startswith("## ASSESSMENT/IMPRESSION") or line.startswith("## DIAGNOSIS"):
+            current_section = "diagnosis"
+            continue
+        elif line.startswith("##"):
+            current_section = ""
+            continue
+            
+        # Extract content based on current section
+        if current_section == "patient" and line and not line.startswith("#"):
+            if info == "Not available":
+                info = line
+            else:
+                info += " " + line
+        elif current_section == "symptoms" and line and not line.startswith("#"):
+            if symptoms == "Not listed":
+                symptoms = line
+            else:
+                symptoms += " " + line
+        elif current_section == "diagnosis" and line and not line.startswith("#"):
+            if diagnosis == "–":
+                diagnosis = line
+            else:
+                diagnosis += " " + line
+    
+    # Limit text length for table display but keep it readable
+    info = info[:200] + "..." if len(info) > 200 else info
+    symptoms = symptoms[:150] + "..." if len(symptoms) > 150 else symptoms
+    diagnosis = diagnosis[:150] + "..." if len(diagnosis) > 150 else diagnosis
+    
+    return [
+        ["Patient Information", info],
+        ["Chief Complaint", symptoms],
+        ["Primary Assessment", diagnosis],
+        ["Report Status", "Complete"]
+    ]
+
+# def parse_markdown_to_pdf(text, styles):
+#     """Convert markdown-formatted text to PDF elements with proper styling"""
+#     elements = []
+#     lines = text.split('\n')
+    
+#     i = 0
+#     while i < len(lines):
+#         line = lines[i].strip()
+        
+#         if not line:
+#             elements.append(Spacer(1, 0.1*inch))
+#             i += 1
+#             continue
+            
+#         # Handle main headers (# )
+#         if line.startswith('# '):
+#             header_text = line[2:].strip()
+#             elements.append(Paragraph(header_text, styles["MainHeader"]))
+#             elements.append(Spacer(1, 0.2*inch))
+            
+#         # Handle sub headers (## )
+#         elif line.startswith('## '):
+#             header_text = line[3:].strip()
+#             elements.append(Paragraph(header_text, styles["SubHeader"]))
+#             elements.append(Spacer(1, 0.15*inch))
+            
+#         # Handle sub-sub headers (### )
+#         elif line.startswith('### '):
+#             header_text = line[4:].strip()
+#             elements.append(Paragraph(header_text, styles["SubSubHeader"]))
+#             elements.append(Spacer(1, 0.1*inch))
+            
+#         # Handle bullet points (• )
+#         elif line.startswith('• '):
+#             bullet_text = line[2:].strip()
+#             # Process bold text in bullets
+#             bullet_text = re.sub(r'\*\*(.*?)\*\*', r'<b>\1</b>', bullet_text)
+#             elements.append(Paragraph(f"• {bullet_text}", styles["BulletBody"]))
+            
+#         # Handle bold text lines (**text**)
+#         elif '**' in line:
+#             # Extract bold sections and convert to HTML
+#             formatted_line = re.sub(r'\*\*(.*?)\*\*', r'<b>\1</b>', line)
+#             elements.append(Paragraph(formatted_line, styles["Body"]))
+            
+#         # Handle horizontal rules (---)
+#         elif line.startswith('---'):
+#             elements.append(HRFlowable(width="80%", thickness=1, color=colors.grey))
+#             elements.append(Spacer(1, 0.1*inch))
+            
+#         # Regular text
+#         else:
+#             if line.strip():
+#                 elements.append(Paragraph(line, styles["Body"]))
+        
+#         i += 1
+    
+#     return elements
+
+
+
+SPECIALIST_COLORS = {
+    "Cardiologist": "#f5c444",
+    "Psychologist": "#89c3eb",
+    "Pulmonologist": "#d1e189"
+}
+
+def build_styles():
+    styles = getSampleStyleSheet()
+    
+    # Custom Styles - Adding all required styles
+    styles.add(ParagraphStyle(
+        "MainHeader", 
+        fontSize=18, 
+        leading=22, 
+        alignment=TA_CENTER, 
+        spaceAfter=16, 
+        spaceBefore=8,
+        textColor=colors.HexColor("#2e5a87"),
+        fontName='Helvetica-Bold'
+    ))
+    
+    styles.add(ParagraphStyle(
+        "SubHeader", 
+        fontSize=14, 
+        leading=18, 
+        alignment=TA_LEFT, 
+        spaceAfter=8, 
+        spaceBefore=12,
+        textColor=colors.HexColor("#286245"),
+        fontName='Helvetica-Bold'
+    ))
+    
+    styles.add(ParagraphStyle(
+        "SubSubHeader", 
+        fontSize=12, 
+        leading=16, 
+        alignment=TA_LEFT, 
+        spaceAfter=6, 
+        spaceBefore=8,
+        textColor=colors.HexColor("#444444"),
+        fontName='Helvetica-Bold'
+    ))
+    
+    styles.add(ParagraphStyle(
+        "Body", 
+        fontSize=11, 
+        leading=14, 
+        alignment=TA_JUSTIFY,
+        spaceAfter=4,
+        fontName='Helvetica'
+    ))
+    
+    styles.add(ParagraphStyle(
+        "BulletBody", 
+        fontSize=11, 
+        leading=14, 
+        alignment=TA_LEFT,
+        spaceAfter=3,
+        leftIndent=20,
+        fontName='Helvetica'
+    ))
+    
+    styles.add(ParagraphStyle(
+        "Header", 
+        fontSize=18, 
+        leading=22, 
+        alignment=TA_CENTER, 
+        spaceAfter=16, 
+        textColor=colors.HexColor("#2e5a87"),
+        fontName='Helvetica-Bold'
+    ))
+    
+    styles.add(ParagraphStyle(
+        "TOCEntry", 
+        fontSize=12, 
+        leading=16, 
+        alignment=TA_LEFT, 
+        spaceAfter=6, 
+        leftIndent=20, 
+        fontName='Helvetica'
+    ))
+
+    # One coloured header style per specialist, instead of a new style per page
+    for role, back_color in SPECIALIST_COLORS.items():
+        styles.add(ParagraphStyle(
+            f"SpecHeader{role}", parent=styles["Header"], backColor=colors.HexColor(back_color)
+        ))
+    return styles
+
+SUMMARY_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#eaeaea')),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 11),
+    ('LINEABOVE', (0, 0), (-1, 0), 1, colors.HexColor('#2e5a87')),
+    ('BOX', (0, 0), (-1, -1), 1, colors.grey),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('LEFTPADDING', (0, 0), (-1, -1), 8),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+    ('TOPPADDING', (0, 0), (-1, -1), 8),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+])
+
+TOC_ENTRIES = [
+    "1. Patient Summary",
+    "2. Structured Medical Report", 
+    "3. Cardiologist Assessment",
+    "4. Psychologist Assessment",
+    "5. Pulmonologist Assessment",
+    "6. Final Multidisciplinary Summary"
+]
+
+
+class ReportRenderer:
+    """
+    Renders the final report PDF. The stylesheet and table styles are built once
+    and reused for every report; output goes to an in-memory buffer (or any
+    file-like object) with page compression on, so nothing touches the disk.
+    """
+
+    def __init__(self, page_compression=True):
+        self.styles = build_styles()
+        self.page_compression = page_compression
+        self.renders = 0
+        self.failures = 0
+        self.total_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def _specialist_style(self, role):
+        name = f"SpecHeader{role}"
+        if name in self.styles:
+            return self.styles[name]
+        return ParagraphStyle(name, parent=self.styles["Header"], backColor=colors.HexColor("#ededed"))
+
+    def story(self, structured, diag_map, final, compiled=None):
+        """compiled: section IR from compile_sections(); sections missing from it are compiled here"""
+        styles = self.styles
+        Story = []
+
+        def section_ir(name, text):
+            if compiled and name in compiled:
+                return compiled[name]
+            return ir_cache.compile(text)
+
+        # --- Cover Page ---
+        Story.append(PageBreak())  # Placeholder cover, real design in cover_page()
+
+        # --- Table of Contents ---
+        Story.append(Paragraph("Table of Contents", styles["Header"]))
+        Story.append(Spacer(1, 0.2 * inch))
+        for entry in TOC_ENTRIES:
+            Story.append(Paragraph(entry, styles["TOCEntry"]))
+        Story.append(PageBreak())
+
+        # --- Patient Summary Table ---
+        Story.append(Paragraph("Patient Summary", styles["Header"]))
+        try:
+            summary_data = patient_summary_section(structured) if structured else [["Summary", "No structured data available"]]
+        except Exception as e:
+            print("[ERROR] patient_summary_section failed:", str(e))
+            summary_data = [["Summary", "Could not parse structured data."]]
+        
+        table_data = []
+        for row in summary_data:
+            table_data.append([
+                Paragraph(f"<b>{row[0]}</b>", styles["Body"]),
+                Paragraph(str(row[1]), styles["Body"])
+            ])
+        
+        summary_table = Table(table_data, colWidths=[140, 380])
+        summary_table.setStyle(SUMMARY_TABLE_STYLE)
+        Story.append(summary_table)
+        Story.append(PageBreak())
+
+        # --- Structured Medical Report ---
+        if structured:
+            Story.append(Paragraph("Structured Medical Report", styles["Header"]))
+            Story.append(HRFlowable(width="100%", thickness=2, color=colors.HexColor("#2e5a87")))
+            Story.append(Spacer(1, 0.2 * inch))
+            try:
+                structured_elements = ir_to_flowables(section_ir("structured", structured), styles)
+                Story.extend(structured_elements)
+            except Exception as e:
+                print("[ERROR] parse_markdown_to_pdf for structured failed:", str(e))
+                Story.append(Paragraph(str(structured), styles["Body"]))
+            Story.append(PageBreak())
+
+        # --- Specialist Diagnoses ---
+        if diag_map:
+            for role, txt in diag_map.items():
+                if txt:  # Only process if content exists
+                    back_color = SPECIALIST_COLORS.get(role, "#ededed")
+                    Story.append(Paragraph(role, self._specialist_style(role)))
+                    Story.append(HRFlowable(width="50%", thickness=1, color=colors.HexColor(back_color)))
+                    Story.append(Spacer(1, 0.15 * inch))
+                    try:
+                        specialist_elements = ir_to_flowables(section_ir(role, txt), styles)
+                        Story.extend(specialist_elements)
+                    except Exception as e:
+                        print(f"[ERROR] parse_markdown_to_pdf for {role} failed:", str(e))
+                        Story.append(Paragraph(str(txt), styles["Body"]))
+                    Story.append(PageBreak())
+
+        # --- Final Multidisciplinary Summary ---
+        if final:
+            Story.append(Paragraph("Final Multidisciplinary Summary", styles["Header"]))
+            Story.append(HRFlowable(width="40%", thickness=1, color=colors.HexColor("#286245")))
+            Story.append(Spacer(1, 0.2 * inch))
+            try:
+                final_elements = ir_to_flowables(section_ir("final", final), styles)
+                Story.extend(final_elements)
+            except Exception as e:
+                print("[ERROR] parse_markdown_to_pdf for final summary failed:", str(e))
+                Story.append(Paragraph(str(final), styles["Body"]))
+
+        return Story
+
+    def render_to(self, output, structured, diag_map, final, compiled=None):
+        """Build the PDF into `output`, a path or a binary file-like object"""
+        started = time.perf_counter()
+        doc = SimpleDocTemplate(
+            output, pagesize=A4, leftMargin=50, rightMargin=50, topMargin=72, bottomMargin=72,
+            pageCompression=1 if self.page_compression else 0
+        )
+        try:
+            doc.build(self.story(structured, diag_map, final, compiled), onFirstPage=cover_page, onLaterPages=other_pages)
+        except Exception:
+            with self._lock:
+                self.failures += 1
+            raise
+        with self._lock:
+            self.renders += 1
+            self.total_seconds += time.perf_counter() - started
+
+    def render(self, structured, diag_map, final, compiled=None):
+        """The finished PDF as a BytesIO positioned at the start, ready for send_file"""
+        buffer = io.BytesIO()
+        self.render_to(buffer, structured, diag_map, final, compiled)
+        buffer.seek(0)
+        return buffer
+
+    def stats(self):
+        with self._lock:
+            return {
+                "renders": self.renders,
+                "failures": self.failures,
+                "average_seconds": round(self.total_seconds / self.renders, 4) if self.renders else None
+            }
+
+
+# Shared by every request in this process
+renderer = ReportRenderer()
+
+def generate_report_pdf(output_path, structured, diag_map, final):
+    """Write the report PDF to output_path; returns True on success, False on failure"""
+    try:
+        with metrics.track("render"), tracer.span("render"):
+            renderer.render_to(output_path, structured, diag_map, final)
+        return True
+    except Exception as e:
+        print("[FATAL ERROR] Failed to build PDF:", str(e))
+        return False
@@ -0,0 +1,86 @@
+import time
+from contextlib import contextmanager
+from Utils.Agents import (
+    extract_pages_from_pdf, structure_medical_report,
+    MultidisciplinaryTeam, run_specialists
+)
+from Utils.Routing import SpecialistRouter
+from Utils.RenderService import render_service
+
+STAGES = ("extract", "structure", "route", "specialists", "summary", "render")
+
+router = SpecialistRouter.from_env()
+
+
+@contextmanager
+def _stage(name, timings, on_stage):
+    if on_stage:
+        on_stage(name, "running", None)
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        timings[name] = round(time.perf_counter() - start, 3)
+        if on_stage:
+            on_stage(name, "failed", timings[name])
+        raise
+    timings[name] = round(time.perf_counter() - start, 3)
+    if on_stage:
+        on_stage(name, "done", timings[name])
+
+
+def run_pipeline(pdf_path, output_pdf_path=None, agent_timeouts=None, on_stage=None, force_all_specialists=False):
+    """
+    Extract, structure, route to the relevant specialists, run them and the team
+    summary, then render the PDF. force_all_specialists bypasses the router.
+    on_stage(name, status, seconds) is called as each stage in STAGES starts and ends.
+    Returns a dict with every intermediate text plus per-stage and per-agent timings.
+    With output_pdf_path=None the PDF is returned as "pdf" (a BytesIO) instead of written.
+    Rendering runs on the render service's worker processes, so it can raise
+    RenderQueueFull / RenderTimeout.
+    """
+    stage_timings = {}
+
+    with _stage("extract", stage_timings, on_stage):
+        pages = extract_pages_from_pdf(pdf_path)
+        raw_text = "\n".join(pages).strip()
+        if not raw_text:
+            raise ValueError("No text could be extracted from PDF")
+
+    with _stage("structure", stage_timings, on_stage):
+        structured_report, structuring = structure_medical_report(raw_text, return_meta=True, pages=pages)
+
+    with _stage("route", stage_timings, on_stage):
+        routing = router.route(structured_report, force_all=force_all_specialists)
+        skipped = {role: decision["reason"] for role, decision in routing.items() if not decision["run"]}
+
+    with _stage("specialists", stage_timings, on_stage):
+        agent_responses, agent_timings = run_specialists(structured_report, agent_timeouts, skipped)
+
+    with _stage("summary", stage_timings, on_stage):
+        team = MultidisciplinaryTeam(
+            agent_responses['Cardiologist'],
+            agent_responses['Psychologist'],
+            agent_responses['Pulmonologist'],
+            skipped=skipped
+        )
+        final_summary = team.run()
+
+    with _stage("render", stage_timings, on_stage):
+        pdf = render_service.render(structured_report, agent_responses, final_summary)
+        if output_pdf_path is not None:
+            with open(output_pdf_path, "wb") as f:
+                f.write(pdf.getbuffer())
+            pdf = None
+
+    return {
+        "structured_report": structured_report,
+        "structuring": structuring,
+        "agent_responses": agent_responses,
+        "agent_timings": agent_timings,
+        "routing": routing,
+        "final_summary": final_summary,
+        "output_pdf_path": output_pdf_path,
+        "pdf": pdf,
+        "stage_timings": stage_timings
+    }
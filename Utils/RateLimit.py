@@ -0,0 +1,304 @@
+import os
+import sys
+import time
+import threading
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+
+class TokenBucket:
+    """Refills `rate_per_minute` units per minute up to `capacity`; may run into debt"""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until `amount` units are available (0 if they are now)"""
+        self._refill()
+        # A request bigger than the whole bucket only waits for a full bucket
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount):
+        self._refill()
+        self.tokens = min(float(self.capacity), self.tokens - amount)
+
+
+def retry_after_seconds(exc, default=None):
+    """Read Retry-After / retry-after-ms from an API error's response headers"""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        value = headers.get("retry-after")
+        if value:
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        pass
+    return default
+
+
+def _transient_errors():
+    # Looked up rather than imported: the SDK and its transport are only loaded with
+    # the first client, and an exception can't be one of their types before that
+    types = []
+    openai = sys.modules.get("openai")
+    if openai is not None:
+        types.append(openai.APIConnectionError)  # APITimeoutError is a subclass
+    for name in ("httpx2", "httpx"):
+        if name in sys.modules:
+            types.append(sys.modules[name].TransportError)
+    return tuple(types)
+
+
+def classify_error(exc):
+    """
+    'throttled' for 429s, 'client' for other 4xx, 'error' for 5xx, timeouts and
+    connection failures, and 'fatal' for anything else (a bug such as a KeyError),
+    which is neither retried nor held against the provider
+    """
+    status = getattr(exc, "status_code", None)
+    if status == 429:
+        return "throttled"
+    if status is not None and 400 <= status < 500:
+        return "client"
+    if status is not None and status >= 500:
+        return "error"
+    if isinstance(exc, _transient_errors()):
+        return "error"
+    return "fatal"
+
+
+class AttemptAbandoned(Exception):
+    """Raised instead of starting an attempt whose result is no longer wanted"""
+
+
+class Abandonment:
+    """
+    Set by whoever started an attempt once its result is no longer wanted, e.g.
+    the hedge that lost. Callbacks registered with on_set run once, on set().
+    """
+
+    def __init__(self):
+        self._set = False
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def is_set(self):
+        return self._set
+
+    def on_set(self, callback):
+        with self._lock:
+            if not self._set:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def set(self):
+        with self._lock:
+            if self._set:
+                return
+            self._set = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+
+class RateLimiter:
+    """
+    Process-wide gate in front of the LLM client.
+
+    Every call reserves one request from a requests-per-minute bucket and its
+    estimated tokens from a tokens-per-minute bucket (corrected with the real
+    usage afterwards), and waits for a free concurrency slot. The concurrency
+    limit adapts AIMD-style: +1 per window of successful calls, multiplicative
+    decrease on 429s, server errors or when latency climbs well above its
+    baseline. A 429 pauses every caller until its Retry-After has passed.
+    """
+
+    def __init__(self, rpm=120, tpm=200000, min_concurrency=1, max_concurrency=16,
+                 initial_concurrency=4, latency_tolerance=2.0, default_retry_after=5.0, enabled=True):
+        self.enabled = enabled
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.limit = float(initial_concurrency)
+        self.latency_tolerance = latency_tolerance
+        self.default_retry_after = default_retry_after
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.latency_baseline = None
+        self.latency_recent = None
+        self.samples = 0
+        self.completed = 0
+        self.throttled = 0
+        self.errors = 0
+        self.waited_seconds = 0.0
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            rpm=int(os.getenv("LLM_RPM", "120")),
+            tpm=int(os.getenv("LLM_TPM", "200000")),
+            min_concurrency=int(os.getenv("LLM_MIN_CONCURRENCY", "1")),
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "16")),
+            initial_concurrency=int(os.getenv("LLM_INITIAL_CONCURRENCY", "4")),
+            latency_tolerance=float(os.getenv("LLM_LATENCY_TOLERANCE", "2.0")),
+            enabled=os.getenv("LLM_RATE_LIMIT_ENABLED", "1").lower() not in ("0", "false", "no")
+        )
+
+    def acquire(self, estimated_tokens=1, abandoned=None):
+        """
+        Wait for a slot and reserve its request and tokens; returns the start time.
+        Raises AttemptAbandoned, reserving nothing, if `abandoned` is set first.
+        """
+        if abandoned is not None and abandoned.is_set():
+            raise AttemptAbandoned()
+        if not self.enabled:
+            return time.monotonic()
+        requested = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if abandoned is not None and abandoned.is_set():
+                    raise AttemptAbandoned()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.in_flight >= int(self.limit):
+                    wait = None
+                else:
+                    wait = max(self.requests.wait_time(1), self.tokens.wait_time(estimated_tokens))
+                    if wait == 0:
+                        self.requests.consume(1)
+                        self.tokens.consume(estimated_tokens)
+                        self.in_flight += 1
+                        self.waited_seconds += now - requested
+                        return now
+                if abandoned is not None:
+                    # Nothing notifies on abandonment, so look again now and then
+                    wait = 0.25 if wait is None else min(wait, 0.25)
+                self._cond.wait(timeout=wait)
+
+    def release(self, started, outcome="ok", estimated_tokens=None, tokens_used=None, retry_after=None):
+        """Free a slot. outcome is 'ok', 'throttled', 'error' or 'cancelled' (frees it without feedback)"""
+        if not self.enabled:
+            return
+        with self._cond:
+            now = time.monotonic()
+            self.in_flight = max(0, self.in_flight - 1)
+            if tokens_used is not None and estimated_tokens is not None:
+                self.tokens.consume(tokens_used - estimated_tokens)
+
+            if outcome == "throttled":
+                self.throttled += 1
+                self._decrease(0.5)
+                pause = retry_after if retry_after is not None else self.default_retry_after
+                self.paused_until = max(self.paused_until, now + pause)
+            elif outcome == "error":
+                self.errors += 1
+                self._decrease(0.7)
+            elif outcome == "ok":
+                self.completed += 1
+                self._observe_latency(now - started)
+            self._cond.notify_all()
+
+    def _decrease(self, factor):
+        self.limit = max(float(self.min_concurrency), self.limit * factor)
+
+    def _observe_latency(self, latency):
+        self.samples += 1
+        if self.latency_baseline is None:
+            self.latency_baseline = self.latency_recent = latency
+            return
+        self.latency_recent = 0.7 * self.latency_recent + 0.3 * latency
+        self.latency_baseline = 0.95 * self.latency_baseline + 0.05 * latency
+        if self.samples >= 5 and self.latency_recent > self.latency_baseline * self.latency_tolerance:
+            self._decrease(0.8)
+        else:
+            # Additive increase: roughly +1 once per window of `limit` successful calls
+            self.limit = min(float(self.max_concurrency), self.limit + 1.0 / max(self.limit, 1.0))
+
+    @contextmanager
+    def slot(self, estimated_tokens=1, abandoned=None):
+        """
+        Hold a rate-limited slot for the duration of the block. Set
+        usage["total_tokens"] inside the block to correct the token estimate.
+        If `abandoned` is set while the block runs, the slot is freed right away
+        and whatever the block ends with is ignored; the tokens stay reserved,
+        since the request was sent and the provider counts them anyway.
+        """
+        started = self.acquire(estimated_tokens, abandoned)
+        usage = {"total_tokens": None}
+        released = []
+        release_lock = threading.Lock()
+
+        def release_once(*args, **kwargs):
+            with release_lock:
+                if released:
+                    return
+                released.append(True)
+            self.release(*args, **kwargs)
+
+        if abandoned is not None:
+            abandoned.on_set(lambda: release_once(started, "cancelled"))
+        try:
+            yield usage
+        except BaseException as e:
+            # GeneratorExit (a streaming client going away) only frees the slot
+            outcome = classify_error(e) if isinstance(e, Exception) else "cancelled"
+            if outcome == "fatal":
+                # Our own failure, not the provider's: free the slot without feedback
+                outcome = "cancelled"
+            release_once(started, outcome, retry_after=retry_after_seconds(e) if outcome == "throttled" else None)
+            raise
+        release_once(started, "ok", estimated_tokens, usage["total_tokens"])
+
+    def call(self, fn, estimated_tokens=1, max_throttle_retries=3, abandoned=None):
+        """
+        Run fn() inside a slot, waiting out and retrying 429 responses. Pass
+        max_throttle_retries=0 when the caller does its own retrying.
+        """
+        for attempt in range(max_throttle_retries + 1):
+            try:
+                with self.slot(estimated_tokens, abandoned) as usage:
+                    result = fn()
+                    usage["total_tokens"] = getattr(getattr(result, "usage", None), "total_tokens", None)
+                    return result
+            except Exception as e:
+                if classify_error(e) != "throttled" or attempt == max_throttle_retries:
+                    raise
+                print(f"[RATE LIMIT] 429 from provider, retrying after {retry_after_seconds(e, self.default_retry_after)}s")
+
+    def stats(self):
+        with self._cond:
+            now = time.monotonic()
+            return {
+                "enabled": self.enabled,
+                "concurrency_limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "paused_for_seconds": round(max(0.0, self.paused_until - now), 2),
+                "requests_available": round(self.requests.tokens, 1),
+                "tokens_available": round(self.tokens.tokens, 1),
+                "latency_baseline_seconds": round(self.latency_baseline, 3) if self.latency_baseline else None,
+                "latency_recent_seconds": round(self.latency_recent, 3) if self.latency_recent else None,
+                "completed": self.completed,
+                "throttled": self.throttled,
+                "errors": self.errors,
+                "queue_wait_seconds": round(self.waited_seconds, 3)
+            }
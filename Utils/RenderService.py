@@ -0,0 +1,185 @@
+import io
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from Utils.MarkdownPdf import compile_sections
+from Utils.Metrics import metrics
+from Utils.Tracing import tracer
+
+
+class RenderQueueFull(Exception):
+    """Raised when every render worker is busy and the pending queue is at capacity"""
+
+
+class RenderTimeout(Exception):
+    """Raised when a render job doesn't finish within its timeout (queue wait included)"""
+
+
+def _warm_worker():
+    # Runs once in each worker: load ReportLab and lay out a throwaway report so
+    # fonts and parsers are warm before the first real job
+    from Utils.PdfHandler import renderer
+    renderer.render("# Warm-up", {"Cardiologist": "- ok"}, "Warm-up")
+
+
+def _worker_pid():
+    # Holds the worker briefly so one warm-up round reaches several workers
+    time.sleep(0.05)
+    return os.getpid()
+
+
+def _render_job(structured, diag_map, final, compiled):
+    from Utils.PdfHandler import renderer
+    return renderer.render(structured, diag_map, final, compiled).getvalue()
+
+
+class RenderService:
+    """
+    Renders report PDFs on a pool of worker processes so ReportLab layout (pure
+    Python, CPU-bound) doesn't hold the GIL of the process serving requests.
+    At most `workers` renders run at once and at most `max_pending` more may
+    wait; callers give up after `timeout` seconds. A render that times out can't
+    be interrupted, so it keeps its slot until it finishes. workers=0 renders on
+    the calling thread instead.
+    """
+
+    def __init__(self, workers=2, max_pending=8, timeout=60):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.submitted = 0
+        self.completed = 0
+        self.failures = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.total_seconds = 0.0
+        self._in_flight = 0
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            workers=int(os.getenv("RENDER_WORKERS", str(min(2, os.cpu_count() or 1)))),
+            max_pending=int(os.getenv("RENDER_MAX_PENDING", "8")),
+            timeout=float(os.getenv("RENDER_TIMEOUT_SECONDS", "60"))
+        )
+
+    def _get_pool(self):
+        # spawn rather than fork: the parent process is running HTTP and executor threads
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_worker
+            )
+        return self._pool
+
+    def _discard_pool(self, pool):
+        # Callers hold the lock. A broken pool still owns its manager thread and
+        # queues, so shut it down rather than just dropping the reference
+        if self._pool is pool:
+            self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def start(self, wait=False, timeout=60):
+        """
+        Spawn and warm every worker now instead of on the first requests. With
+        wait=True, block until each worker has finished warming up (or `timeout`
+        seconds pass), so nothing timed afterwards competes with their start-up.
+        """
+        # Spawned children re-import the entry module; only the serving process owns a pool
+        if self.workers <= 0 or multiprocessing.parent_process() is not None:
+            return
+        with self._lock:
+            pool = self._get_pool()
+            futures = [pool.submit(_worker_pid) for _ in range(self.workers)]
+        if not wait:
+            return
+        # A worker only takes tasks once its initializer has run, so keep asking
+        # until every worker has answered
+        ready = set()
+        deadline = time.monotonic() + timeout
+        while True:
+            ready.update(future.result(timeout=max(0.0, deadline - time.monotonic())) for future in futures)
+            if len(ready) >= self.workers or time.monotonic() >= deadline:
+                return
+            with self._lock:
+                futures = [self._get_pool().submit(_worker_pid) for _ in range(self.workers)]
+
+    def _release(self, pool, started):
+        def done(future):
+            with self._lock:
+                self._in_flight -= 1
+                if future.cancelled():
+                    return
+                if future.exception() is not None:
+                    self.failures += 1
+                    if isinstance(future.exception(), BrokenProcessPool):
+                        self._discard_pool(pool)
+                else:
+                    self.completed += 1
+                    self.total_seconds += time.perf_counter() - started
+        return done
+
+    def submit(self, structured, diag_map, final):
+        """Queue a render; returns a future for the PDF bytes or raises RenderQueueFull"""
+        # Markdown is compiled here against this process's IR cache; workers only lay out
+        compiled = compile_sections(structured, diag_map, final)
+        with self._lock:
+            if self._in_flight >= self.workers + self.max_pending:
+                self.rejected += 1
+                raise RenderQueueFull(f"{self._in_flight} renders already queued or running")
+            pool = self._get_pool()
+            try:
+                future = pool.submit(_render_job, structured, diag_map, final, compiled)
+            except BrokenProcessPool:
+                # A worker died; start over with a fresh pool
+                self._discard_pool(pool)
+                pool = self._get_pool()
+                future = pool.submit(_render_job, structured, diag_map, final, compiled)
+            self._in_flight += 1
+            self.submitted += 1
+        future.add_done_callback(self._release(pool, time.perf_counter()))
+        return future
+
+    @metrics.timed("render")
+    @tracer.traced("render")
+    def render(self, structured, diag_map, final, timeout=None):
+        """The finished PDF as a BytesIO positioned at the start, ready for send_file"""
+        if self.workers <= 0:
+            from Utils.PdfHandler import renderer
+            return renderer.render(structured, diag_map, final)
+
+        timeout = self.timeout if timeout is None else timeout
+        future = self.submit(structured, diag_map, final)
+        try:
+            pdf_bytes = future.result(timeout=timeout or None)
+        except FutureTimeout:
+            future.cancel()
+            with self._lock:
+                self.timeouts += 1
+            raise RenderTimeout(f"PDF rendering did not finish within {timeout:g}s")
+        return io.BytesIO(pdf_bytes)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "timeout_seconds": self.timeout,
+                "in_flight": self._in_flight,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "average_seconds": round(self.total_seconds / self.completed, 4) if self.completed else None
+            }
+
+
+# Shared by every request in this process
+render_service = RenderService.from_env()
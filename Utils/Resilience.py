@@ -0,0 +1,184 @@
+import os
+import time
+import random
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from Utils.RateLimit import Abandonment, classify_error, retry_after_seconds
+
+
+class LatencyTracker:
+    """Sliding window of successful call latencies"""
+
+    def __init__(self, window=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct):
+        """Latency at the given percentile, or None until min_samples calls have been seen"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class HedgeBudget:
+    """Earns `ratio` of a hedge per primary call, up to `burst` saved hedges"""
+
+    def __init__(self, ratio=0.1, burst=3):
+        self.ratio = ratio
+        self.burst = burst
+        self.credits = float(burst)
+        self._lock = threading.Lock()
+
+    def earn(self):
+        with self._lock:
+            self.credits = min(float(self.burst), self.credits + self.ratio)
+
+    def try_spend(self):
+        with self._lock:
+            if self.credits >= 1.0:
+                self.credits -= 1.0
+                return True
+            return False
+
+
+class ResilientCaller:
+    """
+    Retries transient failures (429s, 5xx, timeouts, connection errors) with
+    full-jitter exponential backoff, and optionally hedges slow calls: when an
+    attempt runs past the `hedge_percentile` latency a duplicate is fired and
+    whichever finishes first wins. Hedges are limited by a HedgeBudget and
+    skipped for prompts above `hedge_max_tokens` so they stay a small,
+    bounded share of token spend. Anything else (4xx, bugs in fn) is raised at once.
+
+    This is the only layer that retries: fn should make a single upstream
+    request (e.g. RateLimiter.call with max_throttle_retries=0), so a call makes
+    at most max_retries + 1 attempts, each with at most one hedge. fn receives
+    an Abandonment that is set when the other attempt of a hedged pair has won.
+    """
+
+    def __init__(self, max_retries=2, base_delay=1.0, max_delay=20.0, hedge_enabled=True,
+                 hedge_percentile=90.0, hedge_ratio=0.1, hedge_max_tokens=8000, max_workers=32):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_max_tokens = hedge_max_tokens
+        self.latency = LatencyTracker()
+        self.budget = HedgeBudget(ratio=hedge_ratio)
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-attempt")
+
+    @classmethod
+    def from_env(cls, max_workers=32):
+        return cls(
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+            base_delay=float(os.getenv("LLM_RETRY_BASE_SECONDS", "1.0")),
+            max_delay=float(os.getenv("LLM_RETRY_MAX_SECONDS", "20")),
+            hedge_enabled=os.getenv("LLM_HEDGE_ENABLED", "1").lower() not in ("0", "false", "no"),
+            hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "90")),
+            hedge_ratio=float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.1")),
+            hedge_max_tokens=int(os.getenv("LLM_HEDGE_MAX_PROMPT_TOKENS", "8000")),
+            max_workers=max_workers
+        )
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _submit(self, fn):
+        abandoned = Abandonment()
+        # Attempts run on the pool; copy_context keeps the caller's context (e.g. its trace span)
+        return self._pool.submit(contextvars.copy_context().run, fn, abandoned), abandoned
+
+    def _hedged(self, fn, estimated_tokens, info):
+        threshold = self.latency.percentile(self.hedge_percentile) if self.hedge_enabled else None
+        primary, primary_abandoned = self._submit(fn)
+        self.budget.earn()
+        if threshold is None or estimated_tokens > self.hedge_max_tokens:
+            return primary.result()
+
+        done, _ = wait([primary], timeout=threshold)
+        if done or not self.budget.try_spend():
+            return primary.result()
+
+        info["hedges"] += 1
+        with self._lock:
+            self.hedges += 1
+        hedge, hedge_abandoned = self._submit(fn)
+        losers = {primary: hedge_abandoned, hedge: primary_abandoned}
+        pending, error = {primary, hedge}, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # The other attempt's rate-limit slot is freed now, or it never starts
+                    losers[future].set()
+                    if future is hedge:
+                        info["hedge_won"] = True
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def call(self, fn, estimated_tokens=0, info=None):
+        """
+        Run fn(abandoned) with retries and hedging. `info`, if given, is filled
+        with attempts, retries, hedges, hedge_won and seconds for this call.
+        """
+        info = info if info is not None else {}
+        info.update({"attempts": 0, "retries": 0, "hedges": 0, "hedge_won": False})
+        started = time.monotonic()
+        with self._lock:
+            self.calls += 1
+
+        for attempt in range(self.max_retries + 1):
+            info["attempts"] += 1
+            attempt_started = time.monotonic()
+            try:
+                result = self._hedged(fn, estimated_tokens, info)
+                self.latency.observe(time.monotonic() - attempt_started)
+                info["seconds"] = round(time.monotonic() - started, 3)
+                return result
+            except Exception as e:
+                if classify_error(e) not in ("throttled", "error") or attempt == self.max_retries:
+                    with self._lock:
+                        self.failures += 1
+                    info["seconds"] = round(time.monotonic() - started, 3)
+                    raise
+                delay = self.backoff(attempt)
+                if classify_error(e) == "throttled":
+                    # The rate limiter also pauses every caller for this long
+                    delay = retry_after_seconds(e, delay)
+                print(f"[RETRY] attempt {attempt + 1} failed ({e}); retrying in {delay:.1f}s")
+                info["retries"] += 1
+                with self._lock:
+                    self.retries += 1
+                time.sleep(delay)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "retries": self.retries,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "failures": self.failures,
+                "hedge_threshold_seconds": self.latency.percentile(self.hedge_percentile),
+                "hedge_credits": round(self.budget.credits, 2)
+            }
@@ -0,0 +1,135 @@
+import os
+import re
+import json
+from Utils.Sections import section_index
+
+# Terms are matched as word prefixes, case-insensitively ("arrhythm" matches "arrhythmias")
+DEFAULT_VOCABULARIES = {
+    "Cardiologist": [
+        "chest pain", "chest discomfort", "chest pressure", "palpitation", "syncope", "arrhythm",
+        "tachycard", "bradycard", "murmur", "gallop", "hypertens", "blood pressure", "ecg", "ekg",
+        "electrocardiogram", "echocardiogram", "troponin", "myocard", "cardiac", "cardio", "heart",
+        "angina", "coronary", "st depression", "st elevation", "ejection fraction", "atrial",
+        "ventricular", "cholesterol", "ldl", "hyperlipid", "statin", "atorvastatin", "nitroglycerin",
+        "lisinopril", "beta blocker", "metoprolol", "anticoagul", "edema", "stress test"
+    ],
+    "Psychologist": [
+        "anxi", "panic", "depress", "stress", "mood", "insomnia", "sleep", "suicid", "self-harm",
+        "psychiatr", "psycholog", "mental", "ptsd", "trauma", "substance", "alcohol", "counsel",
+        "psychotherap", "ssri", "snri", "sertraline", "fluoxetine", "escitalopram", "benzodiazepine",
+        "lorazepam", "behavio", "cognitive", "irritab", "worry", "fear", "hallucinat", "bipolar",
+        "schizo", "adjustment disorder", "burnout"
+    ],
+    "Pulmonologist": [
+        "shortness of breath", "dyspnea", "dyspnoea", "breathless", "cough", "wheez", "asthma", "copd",
+        "respiratory", "pulmonary", "lung", "oxygen saturation", "spo2", "sputum", "bronch", "pneumon",
+        "inhaler", "albuterol", "salbutamol", "spirometr", "chest x-ray", "ct chest", "smok", "crackles",
+        "rales", "rhonchi", "hemoptysis", "pleural", "apnea", "hyperventilat"
+    ]
+}
+
+# Findings in the complaint and assessment matter more than a passing family history mention
+SECTION_WEIGHTS = {
+    "CHIEF COMPLAINT": 3.0,
+    "HISTORY OF PRESENT ILLNESS": 2.0,
+    "ASSESSMENT/IMPRESSION": 3.0,
+    "PHYSICAL EXAMINATION": 1.5,
+    "DIAGNOSTIC TESTS/RESULTS": 1.5,
+    "REVIEW OF SYSTEMS": 1.0,
+    "PAST MEDICAL HISTORY": 1.0,
+    "MEDICATIONS": 1.0,
+    "SOCIAL HISTORY": 1.0,
+    "PLAN": 1.0,
+    "FAMILY HISTORY": 0.5
+}
+
+# A negation covers the rest of its clause: it stops at sentence punctuation,
+# commas and contrasting conjunctions ("no chest pain but palpitations")
+_NEGATION = re.compile(
+    r"\b(no|denies|denied|negative for|without|absence of)\b"
+    r"(?:(?!\b(?:but|however|although|though|yet|except)\b)[^.;,\n]){0,30}$",
+    re.IGNORECASE
+)
+
+
+class SpecialistRouter:
+    """
+    Decides which specialists a structured report needs without an LLM call.
+    Each section's text is matched against per-specialty vocabularies (negated
+    mentions such as "denies palpitations" are ignored), every distinct term
+    hit adds the section's weight, and specialists scoring below `threshold`
+    are skipped with the reason recorded.
+    """
+
+    def __init__(self, vocabularies=None, threshold=2.0, section_weights=None, enabled=True):
+        self.vocabularies = vocabularies or DEFAULT_VOCABULARIES
+        self.threshold = threshold
+        self.section_weights = section_weights or SECTION_WEIGHTS
+        self.enabled = enabled
+        self._patterns = {
+            role: [(term, re.compile(r"\b" + re.escape(term), re.IGNORECASE)) for term in terms]
+            for role, terms in self.vocabularies.items()
+        }
+
+    @classmethod
+    def from_env(cls):
+        """ROUTER_VOCAB_FILE may point at JSON {role: [terms]} that extends the defaults"""
+        vocabularies = {role: list(terms) for role, terms in DEFAULT_VOCABULARIES.items()}
+        vocab_file = os.getenv("ROUTER_VOCAB_FILE")
+        if vocab_file:
+            with open(vocab_file, "r", encoding="utf-8") as f:
+                for role, terms in json.load(f).items():
+                    vocabularies.setdefault(role, []).extend(terms)
+        return cls(
+            vocabularies=vocabularies,
+            threshold=float(os.getenv("ROUTER_THRESHOLD", "2.0")),
+            enabled=os.getenv("ROUTER_ENABLED", "1").lower() not in ("0", "false", "no")
+        )
+
+    def _hits(self, pattern, text):
+        for match in pattern.finditer(text):
+            if not _NEGATION.search(text[max(0, match.start() - 40):match.start()]):
+                return True
+        return False
+
+    def score(self, structured_text):
+        """role -> (score, matched terms)"""
+        sections = section_index(structured_text)
+        results = {}
+        for role, patterns in self._patterns.items():
+            score, matched = 0.0, []
+            for heading, body in sections.items():
+                weight = self.section_weights.get(heading, 1.0)
+                for term, pattern in patterns:
+                    if self._hits(pattern, body):
+                        score += weight
+                        if term not in matched:
+                            matched.append(term)
+            results[role] = (round(score, 2), matched)
+        return results
+
+    def route(self, structured_text, force_all=False):
+        """
+        role -> {"run": bool, "score": float, "matched": [...], "reason": str}
+        """
+        if force_all or not self.enabled:
+            reason = "forced" if force_all else "routing disabled"
+            return {role: {"run": True, "score": None, "matched": [], "reason": reason} for role in self.vocabularies}
+
+        decisions = {}
+        for role, (score, matched) in self.score(structured_text).items():
+            run = score >= self.threshold
+            if run:
+                reason = f"relevance {score} >= {self.threshold} ({', '.join(matched[:5])})"
+            elif matched:
+                reason = f"relevance {score} below threshold {self.threshold} ({', '.join(matched[:5])})"
+            else:
+                reason = "no relevant findings in the report"
+            decisions[role] = {"run": run, "score": score, "matched": matched, "reason": reason}
+
+        # Nothing cleared the bar: the router can't tell, so nobody is skipped
+        if not any(decision["run"] for decision in decisions.values()):
+            for decision in decisions.values():
+                decision["run"] = True
+                decision["reason"] = "no specialty cleared the threshold; consulting all"
+        return decisions
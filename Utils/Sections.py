@@ -0,0 +1,268 @@
+import re
+from collections import OrderedDict
+from functools import lru_cache
+
+# The `## ` sections structure_medical_report asks the model to produce, in order
+CANONICAL_SECTIONS = (
+    "PATIENT INFORMATION",
+    "CHIEF COMPLAINT",
+    "HISTORY OF PRESENT ILLNESS",
+    "PAST MEDICAL HISTORY",
+    "MEDICATIONS",
+    "ALLERGIES",
+    "SOCIAL HISTORY",
+    "FAMILY HISTORY",
+    "REVIEW OF SYSTEMS",
+    "PHYSICAL EXAMINATION",
+    "DIAGNOSTIC TESTS/RESULTS",
+    "ASSESSMENT/IMPRESSION",
+    "PLAN",
+    "OTHER NOTES"
+)
+
+_HEADING = re.compile(r"^\s*##\s+(?!#)(.+?)\s*$")
+
+
+def normalise_heading(heading):
+    return re.sub(r"\s+", " ", heading.strip().strip("*#:").strip()).upper()
+
+
+def parse_sections(structured_text):
+    """
+    Split a structured report into an ordered mapping of `## ` heading -> body.
+    Text before the first heading is kept under the empty-string key.
+    """
+    sections = OrderedDict()
+
+    def close(heading, lines):
+        body = "\n".join(lines).strip()
+        if heading in sections:
+            # A repeated heading extends the earlier section
+            sections[heading] = "\n\n".join(part for part in (sections[heading], body) if part)
+        elif heading or body:
+            sections[heading] = body
+
+    current, lines = "", []
+    for line in (structured_text or "").split("\n"):
+        match = _HEADING.match(line)
+        if match:
+            close(current, lines)
+            current, lines = normalise_heading(match.group(1)), []
+        else:
+            lines.append(line)
+    close(current, lines)
+    return sections
+
+
+@lru_cache(maxsize=64)
+def _cached_sections(structured_text):
+    return tuple(parse_sections(structured_text).items())
+
+
+def section_index(structured_text):
+    """parse_sections, memoised so every agent reading the same report shares one parse"""
+    return OrderedDict(_cached_sections(structured_text or ""))
+
+
+_PLACEHOLDER = re.compile(
+    r"^\W*(none|n/?a|not (documented|available|provided|reported|mentioned|applicable|specified)"
+    r"|no (information|data|relevant information)( (available|provided|documented))?|unknown|-+)\W*$",
+    re.IGNORECASE
+)
+
+
+def is_placeholder(body):
+    """True for empty sections or ones that only say e.g. "Not documented" """
+    return not body.strip() or bool(_PLACEHOLDER.match(body.strip()))
+
+
+def select_sections(structured_text, wanted):
+    """
+    Rebuild the report from just the `wanted` sections (in document order), leaving
+    out placeholder-only ones. Returns None when none of them can be found, so the
+    caller can fall back to the full text.
+    """
+    kept = [
+        f"## {heading}\n{body}"
+        for heading, body in section_index(structured_text).items()
+        if heading in wanted and not is_placeholder(body)
+    ]
+    return "\n\n".join(kept) if kept else None
+
+
+# Headings seen in source documents, mapped onto CANONICAL_SECTIONS. Labels are
+# compared after lower-casing and stripping punctuation (see _label_key).
+HEADING_SYNONYMS = {
+    "PATIENT INFORMATION": [
+        "patient information", "patient info", "patient details", "patient demographics", "demographics",
+        "identification"
+    ],
+    "CHIEF COMPLAINT": [
+        "chief complaint", "chief complaints", "presenting complaint", "presenting complaints",
+        "reason for visit", "reason for referral", "reason for consultation", "cc"
+    ],
+    "HISTORY OF PRESENT ILLNESS": [
+        "history of present illness", "history of presenting illness", "present illness", "hpi",
+        "history of the present illness", "current illness"
+    ],
+    "PAST MEDICAL HISTORY": [
+        "past medical history", "medical history", "personal medical history", "pmh", "past history",
+        "past medical and surgical history", "surgical history", "past surgical history"
+    ],
+    "MEDICATIONS": [
+        "medications", "medication", "current medications", "current medication", "meds", "drug history",
+        "medication history", "home medications"
+    ],
+    "ALLERGIES": ["allergies", "allergy", "drug allergies", "known allergies"],
+    "SOCIAL HISTORY": [
+        "social history", "lifestyle factors", "lifestyle", "habits", "occupation", "psychosocial history",
+        "substance use"
+    ],
+    "FAMILY HISTORY": ["family history", "family medical history", "fh"],
+    "REVIEW OF SYSTEMS": ["review of systems", "ros", "systems review"],
+    "PHYSICAL EXAMINATION": [
+        "physical examination", "physical examination findings", "physical exam", "physical exam findings",
+        "examination", "examination findings", "exam findings", "vital signs", "vitals",
+        "general examination", "cardiovascular exam", "respiratory exam", "neurological exam"
+    ],
+    "DIAGNOSTIC TESTS/RESULTS": [
+        "diagnostic tests/results", "diagnostic tests", "diagnostic results", "test results", "results",
+        "recent lab and diagnostic results", "lab results", "laboratory results", "labs", "investigations",
+        "imaging", "lab and diagnostic results", "laboratory and imaging"
+    ],
+    "ASSESSMENT/IMPRESSION": [
+        "assessment/impression", "assessment", "impression", "diagnosis", "diagnoses", "clinical impression",
+        "working diagnosis", "differential diagnosis", "assessment and plan"
+    ],
+    "PLAN": ["plan", "treatment plan", "management", "management plan", "recommendations", "follow up", "follow-up"],
+    "OTHER NOTES": ["other notes", "notes", "additional notes", "comments", "other"]
+}
+
+# Identifier fields ("Name: ...", "Date: ...") that make up the header block of a
+# report. They are PATIENT INFORMATION only before any other section has started;
+# later on they are ordinary lines of whatever section they appear in.
+PATIENT_FIELDS = {
+    "patient id", "patient name", "name", "age", "gender", "sex", "dob", "date of birth", "mrn",
+    "medical record number", "date of report", "report date", "date of visit", "visit date", "date"
+}
+
+# Single-word labels specific enough to start a section from a "Label: value" line;
+# other one-word labels ("Results:", "Notes:", "Plan:") only do so as a heading line
+_INLINE_SINGLE_WORD_LABELS = {"medications", "medication", "meds", "allergies", "allergy", "hpi", "pmh", "ros", "cc", "fh"}
+
+_SYNONYM_LOOKUP = {
+    synonym: section for section, synonyms in HEADING_SYNONYMS.items() for synonym in synonyms
+}
+
+# "Label: value" or "Label:" on its own line, optionally as a markdown heading or in bold
+_LABELLED_LINE = re.compile(r"^\s*(?P<hashes>#{1,6}\s*)?(?P<bold>\*\*)?(?P<label>[A-Za-z][A-Za-z /&()-]{0,60}?)\**\s*:\s*(?P<value>.*)$")
+_BARE_HEADING = re.compile(r"^\s*(?:#{1,6}\s+(.+?)|([A-Z][A-Z /&()-]{2,60}))\s*$")
+
+
+def _label_key(label):
+    return re.sub(r"\s+", " ", re.sub(r"[^a-z/ -]", " ", label.lower())).strip()
+
+
+def _switches_inline(key):
+    """Whether "Label: value" with this label is specific enough to start a section mid-document"""
+    return len(re.split(r"[ /]", key)) > 1 or key in _INLINE_SINGLE_WORD_LABELS
+
+
+def detect_sections(raw_text):
+    """
+    Rule-based alternative to LLM structuring for documents that already have
+    recognisable headings. Returns {"sections": OrderedDict canonical -> body,
+    "coverage": share of content lines that landed in a recognised section}.
+
+    A section starts at a heading line: a known label on its own (bare, "Label:",
+    markdown or bold) or, for specific labels, "Label: value". Lines that look
+    like a heading but aren't treated as one (a generic "Results: ..." or a
+    "Date: ..." after the header block) stay in the current section and are not
+    counted as covered, so documents full of them go to the LLM instead.
+    """
+    found = OrderedDict()
+    current, covered, content = None, 0, 0
+    for line in (raw_text or "").split("\n"):
+        if not line.strip():
+            if current and found[current] and found[current][-1]:
+                found[current].append("")
+            continue
+        content += 1
+
+        section, remainder, ambiguous = None, line.strip(), False
+        labelled = _LABELLED_LINE.match(line)
+        bare = _BARE_HEADING.match(line)
+        if labelled:
+            key = _label_key(labelled.group("label"))
+            # "**Label:** value" closes the bold after the colon
+            value = labelled.group("value").lstrip("*").strip() if labelled.group("bold") else labelled.group("value").strip()
+            heading_line = (not value or labelled.group("hashes") or labelled.group("bold")
+                            or labelled.group("label").isupper())
+            if key in PATIENT_FIELDS:
+                if current in (None, "PATIENT INFORMATION"):
+                    section = "PATIENT INFORMATION"  # keeps "Age: 54" rather than a bare "54"
+                else:
+                    ambiguous = True
+            elif key in _SYNONYM_LOOKUP:
+                if _SYNONYM_LOOKUP[key] == current:
+                    pass  # a sub-heading such as "Vital Signs:" within the exam
+                elif heading_line or _switches_inline(key):
+                    section = _SYNONYM_LOOKUP[key]
+                    remainder = line.strip() if section == "PATIENT INFORMATION" and value else value
+                else:
+                    ambiguous = True
+        elif bare:
+            section = _SYNONYM_LOOKUP.get(_label_key(bare.group(1) or bare.group(2)))
+            if section:
+                remainder = ""
+
+        if section:
+            current = section
+            found.setdefault(current, [])
+        if current is None:
+            continue  # a title line before anything recognisable
+        if not ambiguous:
+            covered += 1
+        if remainder:
+            found[current].append(remainder)
+
+    sections = OrderedDict(
+        (name, "\n".join(found[name]).strip()) for name in CANONICAL_SECTIONS if name in found
+    )
+    return {"sections": sections, "coverage": round(covered / content, 3) if content else 0.0}
+
+
+def render_sections(sections, missing="Not documented."):
+    """Canonical `## ` report text, every section present and in order"""
+    return "\n\n".join(
+        f"## {name}\n{sections.get(name) or missing}" for name in CANONICAL_SECTIONS
+    ) + "\n"
+
+
+def merge_sections(structured_chunks):
+    """
+    Combine structured excerpts of one document into a single canonical mapping.
+    Bodies are concatenated in chunk order, placeholder-only sections are dropped
+    and lines already contributed by an earlier chunk (repeated page headers,
+    patient identifiers) are not repeated. Unknown headings go to OTHER NOTES.
+    """
+    merged = OrderedDict((name, []) for name in CANONICAL_SECTIONS)
+    seen = {name: set() for name in CANONICAL_SECTIONS}
+    for text in structured_chunks:
+        for heading, body in parse_sections(text).items():
+            if is_placeholder(body):
+                continue
+            name = heading if heading in merged else "OTHER NOTES"
+            if name != heading and heading:
+                body = f"{heading.title()}: {body}"
+            lines = []
+            for line in body.split("\n"):
+                key = re.sub(r"\s+", " ", line.strip().lower())
+                if key and key in seen[name]:
+                    continue
+                seen[name].add(key)
+                lines.append(line)
+            body = "\n".join(lines).strip()
+            if body:
+                merged[name].append(body)
+    return OrderedDict((name, "\n\n".join(parts)) for name, parts in merged.items() if parts)
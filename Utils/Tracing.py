@@ -0,0 +1,404 @@
+"""
+Request-scoped traces: every HTTP request gets a trace id (taken from the caller's
+`traceparent` or `X-Trace-Id` header, or generated) and the stages and LLM calls it
+runs are recorded as nested spans. n8n can send one `X-Trace-Id` - any string, such
+as its execution id - on every step of a case so the separate endpoint calls land
+in one trace.
+
+Spans are exported to a JSONL file (TRACE_EXPORT=jsonl) or an OpenTelemetry
+collector over OTLP/HTTP JSON (TRACE_EXPORT=otlp); with no exporter only the ids
+are kept, for the response headers.
+
+    python -m Utils.Tracing [.cache/traces.jsonl] [--trace TRACE_ID] [--last 5]
+prints a per-case waterfall from the JSONL file.
+"""
+import os
+import re
+import sys
+import json
+import time
+import queue
+import hashlib
+import argparse
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+_HEX_TRACE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+# The span the current request/thread is inside; worker pools copy it with contextvars.copy_context()
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def new_trace_id():
+    return os.urandom(16).hex()
+
+
+def new_span_id():
+    return os.urandom(8).hex()
+
+
+def trace_id_from_headers(headers):
+    """(trace id, parent span id or None) from W3C traceparent or X-Trace-Id; None if neither is usable"""
+    match = _TRACEPARENT.match((headers.get("traceparent") or "").strip().lower())
+    if match and match.group(1) != "0" * 32:
+        return match.group(1), match.group(2)
+    case_id = (headers.get("X-Trace-Id") or "").strip()
+    if not case_id:
+        return None, None
+    if _HEX_TRACE_ID.match(case_id.lower()):
+        return case_id.lower(), None
+    # Free-form ids (an n8n execution id, a case number) map to the same trace id every time
+    return hashlib.sha256(case_id.encode("utf-8")).hexdigest()[:32], None
+
+
+class Span:
+    def __init__(self, name, trace_id, parent_id=None, kind="internal", attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = new_span_id()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+        self.error = None
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def fail(self, error):
+        self.status = "error"
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self):
+        self.duration = time.perf_counter() - self._started
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": round(self.start, 6),
+            "duration_ms": round((self.duration or 0.0) * 1000, 3),
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes
+        }
+
+
+class JsonlExporter:
+    """Appends one JSON line per finished span; the file is rotated to <path>.1 past max_bytes"""
+
+    def __init__(self, path, max_bytes=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def export(self, span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            if self.max_bytes and os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                os.replace(self.path, f"{self.path}.1")
+            # Appends of one short line are not interleaved between gunicorn workers
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OtlpExporter:
+    """
+    Batches spans on a background thread and POSTs them to an OTLP/HTTP collector
+    (`<endpoint>/v1/traces`, JSON encoding). Spans are dropped, not queued without
+    bound, if the collector falls behind.
+    """
+
+    KINDS = {"internal": 1, "server": 2, "client": 3}
+
+    def __init__(self, endpoint, service_name="medical-diagnostics-api", batch_size=256,
+                 flush_interval=2.0, max_queue=10000, timeout=5):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_thread(self):
+        # Started by the first span of each process: a thread started before a
+        # (gunicorn --preload) fork doesn't exist in the forked worker
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._thread = threading.Thread(target=self._loop, name="trace-exporter", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def export(self, span):
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _encode(self, span):
+        start_ns = int(span.start * 1e9)
+        encoded = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": self.KINDS.get(span.kind, 1),
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(start_ns + int((span.duration or 0.0) * 1e9)),
+            "attributes": [{"key": key, "value": _otlp_value(value)}
+                           for key, value in span.attributes.items() if value is not None],
+            "status": {"code": 2, "message": span.error} if span.status == "error" else {"code": 1}
+        }
+        if span.parent_id:
+            encoded["parentSpanId"] = span.parent_id
+        return encoded
+
+    def _post(self, spans):
+        import requests  # only the OTLP exporter needs it
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": "Utils.Tracing"}, "spans": [self._encode(span) for span in spans]}]
+        }]}
+        try:
+            resp = requests.post(self.url, json=payload, timeout=self.timeout)
+            if resp.status_code >= 400:
+                print(f"[ERROR] trace export got HTTP {resp.status_code} from {self.url}")
+        except requests.RequestException as e:
+            print("[ERROR] trace export failed:", e)
+
+    def _loop(self):
+        while True:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            if batch:
+                self._post(batch)
+
+
+class Tracer:
+    def __init__(self, exporter=None):
+        self.exporter = exporter
+
+    @classmethod
+    def from_env(cls):
+        kind = os.getenv("TRACE_EXPORT", "").lower()
+        if kind == "jsonl":
+            exporter = JsonlExporter(
+                os.getenv("TRACE_FILE", os.path.join(".cache", "traces.jsonl")),
+                max_bytes=int(float(os.getenv("TRACE_FILE_MAX_MB", "100")) * 1024 * 1024) or None
+            )
+        elif kind == "otlp":
+            exporter = OtlpExporter(
+                os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318"),
+                service_name=os.getenv("TRACE_SERVICE_NAME", "medical-diagnostics-api")
+            )
+        else:
+            exporter = None
+        return cls(exporter)
+
+    @property
+    def enabled(self):
+        return self.exporter is not None
+
+    def current(self):
+        return _current_span.get()
+
+    def start_span(self, name, kind="internal", trace_id=None, parent_id=None, **attributes):
+        """Open a span under the current one (or a new trace) and make it current; pair with end_span"""
+        parent = _current_span.get()
+        if trace_id is None:
+            trace_id = parent.trace_id if parent else new_trace_id()
+            parent_id = parent.span_id if parent else None
+        span = Span(name, trace_id, parent_id, kind, attributes)
+        return span, _current_span.set(span)
+
+    def end_span(self, span, token):
+        span.end()
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # Ended from a different context than it was started in (e.g. a streamed response)
+            _current_span.set(None)
+        if self.exporter is not None:
+            try:
+                self.exporter.export(span)
+            except Exception as e:
+                print("[ERROR] trace export failed:", e)
+
+    @contextmanager
+    def span(self, name, kind="internal", **attributes):
+        span, token = self.start_span(name, kind, **attributes)
+        try:
+            yield span
+        except BaseException as e:
+            span.fail(e)
+            raise
+        finally:
+            self.end_span(span, token)
+
+    def traced(self, name):
+        """Decorator form of span()"""
+        def decorate(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def annotate(self, **attributes):
+        """Add attributes to the current span, if there is one"""
+        span = _current_span.get()
+        if span is not None:
+            span.set(**attributes)
+
+    def init_app(self, app):
+        """One server span per request, continuing the caller's trace; the ids are echoed in the response"""
+        from flask import request, g
+
+        @app.before_request
+        def start_request_span():
+            trace_id, parent_id = trace_id_from_headers(request.headers)
+            span, token = self.start_span(
+                f"{request.method} {request.url_rule.rule if request.url_rule else request.path}",
+                kind="server", trace_id=trace_id or new_trace_id(), parent_id=parent_id,
+                **{"http.method": request.method, "http.target": request.path}
+            )
+            case_id = request.headers.get("X-Trace-Id")
+            if case_id and case_id.strip().lower() != span.trace_id:
+                span.set(case_id=case_id.strip())
+            g.trace_span, g.trace_token = span, token
+
+        @app.after_request
+        def add_trace_headers(response):
+            span = g.get("trace_span")
+            if span is not None:
+                span.set(**{"http.status_code": response.status_code})
+                if response.status_code >= 500:
+                    span.status = "error"
+                response.headers["X-Trace-Id"] = span.trace_id
+                response.headers["traceparent"] = span.traceparent
+                # send_file responses are passed through as-is, without close callbacks
+                if response.is_streamed and not response.direct_passthrough:
+                    # Keep the span current while the server drains the stream (SSE token
+                    # events, the LLM call behind them) and end it once the response closes
+                    token = g.trace_token
+                    g.trace_streamed = True
+                    response.call_on_close(lambda: self.end_span(span, token))
+            return response
+
+        @app.teardown_request
+        def end_request_span(error):
+            span = g.get("trace_span")
+            if span is None:
+                return
+            if error is not None:
+                span.fail(error)
+            if not g.get("trace_streamed"):
+                self.end_span(span, g.trace_token)
+
+
+# Shared by every module in this process
+tracer = Tracer.from_env()
+
+
+def load_traces(path):
+    """trace id -> spans, from a JSONL export (and its rotated predecessor)"""
+    traces = {}
+    for name in (f"{path}.1", path):
+        if not os.path.exists(name):
+            continue
+        with open(name, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    span = json.loads(line)
+                except ValueError:
+                    continue
+                traces.setdefault(span["trace_id"], []).append(span)
+    return traces
+
+
+def waterfall(spans, width=50):
+    """Text waterfall of one trace: spans nested under their parents, with bars on a shared time axis"""
+    start = min(span["start"] for span in spans)
+    end = max(span["start"] + span["duration_ms"] / 1000 for span in spans)
+    total = max(end - start, 1e-6)
+    children, ids = {}, {span["span_id"] for span in spans}
+    for span in sorted(spans, key=lambda s: s["start"]):
+        # Parents from another service (or not exported) make a span a root here
+        parent = span["parent_id"] if span["parent_id"] in ids else None
+        children.setdefault(parent, []).append(span)
+
+    lines = [f"trace {spans[0]['trace_id']}  {total * 1000:.0f} ms  {len(spans)} spans"]
+
+    def walk(parent, depth):
+        for span in children.get(parent, []):
+            offset = int((span["start"] - start) / total * width)
+            length = max(1, int(span["duration_ms"] / 1000 / total * width))
+            bar = " " * offset + "#" * min(length, width - offset)
+            label = ("  " * depth + span["name"])[:40]
+            mark = " !" if span["status"] == "error" else ""
+            lines.append(f"{label:<40} {span['start'] - start:>8.3f}s {span['duration_ms']:>9.1f} ms |{bar:<{width}}|{mark}")
+            walk(span["span_id"], depth + 1)
+
+    walk(None, 0)
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-case waterfalls from a JSONL trace export")
+    parser.add_argument("path", nargs="?", default=os.getenv("TRACE_FILE", os.path.join(".cache", "traces.jsonl")))
+    parser.add_argument("--trace", help="trace id, or the X-Trace-Id value the caller sent")
+    parser.add_argument("--last", type=int, default=5, help="show the N most recent traces")
+    args = parser.parse_args()
+
+    traces = load_traces(args.path)
+    if args.trace:
+        trace_id, _ = trace_id_from_headers({"X-Trace-Id": args.trace})
+        selected = [traces[trace_id]] if trace_id in traces else []
+    else:
+        selected = sorted(traces.values(), key=lambda spans: min(s["start"] for s in spans))[-args.last:]
+    if not selected:
+        print("No matching traces in", args.path)
+        sys.exit(1)
+    for spans in selected:
+        print(waterfall(spans))
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import os
+import threading
+from functools import lru_cache
+
+
+def _httpx():
+    # Imported when the client is built, so loading this module (for ConnectionStats) stays cheap
+    try:
+        import httpx2 as httpx  # transport package used by current openai releases
+    except ImportError:
+        import httpx
+    return httpx
+
+
+class ConnectionStats:
+    """Counts requests and whether each one opened a new connection or reused a pooled one"""
+
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        self.connections_reused = 0
+        self.tls_handshakes = 0
+        self.http_versions = {}
+        self._lock = threading.Lock()
+
+    def record(self, opened, tls, http_version):
+        with self._lock:
+            self.requests += 1
+            if opened:
+                self.connections_opened += 1
+            else:
+                self.connections_reused += 1
+            if tls:
+                self.tls_handshakes += 1
+            if http_version:
+                self.http_versions[http_version] = self.http_versions.get(http_version, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "connections_opened": self.connections_opened,
+                "connections_reused": self.connections_reused,
+                "reuse_ratio": round(self.connections_reused / self.requests, 4) if self.requests else 0.0,
+                "tls_handshakes": self.tls_handshakes,
+                "http_versions": dict(self.http_versions)
+            }
+
+
+@lru_cache(maxsize=None)
+def instrumented_transport_class():
+    """HTTPTransport subclass for whichever httpx package is installed, defined on first use"""
+    httpx = _httpx()
+
+    class InstrumentedTransport(httpx.HTTPTransport):
+        """HTTPTransport that uses the connection pool's trace hooks to tell new connections from reused ones"""
+
+        def __init__(self, stats, **kwargs):
+            super().__init__(**kwargs)
+            self.connection_stats = stats
+
+        def handle_request(self, request):
+            seen = {"opened": False, "tls": False}
+            upstream = request.extensions.get("trace")
+
+            def trace(event, info):
+                if event.endswith(("connect_tcp.complete", "connect_unix_socket.complete")):
+                    seen["opened"] = True
+                elif event.endswith("start_tls.complete"):
+                    seen["tls"] = True
+                if upstream is not None:
+                    upstream(event, info)
+
+            request.extensions = dict(request.extensions, trace=trace)
+            response = super().handle_request(request)
+            http_version = response.extensions.get("http_version", b"")
+            if isinstance(http_version, bytes):
+                http_version = http_version.decode("ascii", "ignore")
+            self.connection_stats.record(seen["opened"], seen["tls"], http_version)
+            return response
+
+    return InstrumentedTransport
+
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def build_http_client(stats, default_connections=20):
+    """
+    HTTP client for the LLM API with an explicitly sized keep-alive pool, split
+    connect/read/write/pool timeouts and optional HTTP/2 (needs the `h2` package).
+    """
+    http2 = os.getenv("LLM_HTTP2", "0").lower() in ("1", "true", "yes")
+    if http2 and not _http2_available():
+        print("[WARNING] LLM_HTTP2 is set but the h2 package is not installed; using HTTP/1.1")
+        http2 = False
+
+    max_connections = int(os.getenv("LLM_MAX_CONNECTIONS", str(default_connections)))
+    httpx = _httpx()
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", str(max_connections))),
+        keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY_SECONDS", "90"))
+    )
+    timeout = httpx.Timeout(
+        connect=float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5")),
+        read=float(os.getenv("LLM_READ_TIMEOUT_SECONDS", "120")),
+        write=float(os.getenv("LLM_WRITE_TIMEOUT_SECONDS", "30")),
+        pool=float(os.getenv("LLM_POOL_TIMEOUT_SECONDS", "30"))
+    )
+    return httpx.Client(
+        transport=instrumented_transport_class()(stats, http2=http2, limits=limits),
+        timeout=timeout
+    )
@@ -0,0 +1,325 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from werkzeug.utils import secure_filename
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: index updates are only serialised between threads of one process
+    fcntl = None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+class UploadStore:
+    """
+    Content-addressed upload folder. Each distinct PDF is stored once as
+    objects/<sha256>.pdf and every upload gets a `<timestamp>_<filename>` alias
+    next to it (a symlink, or a hard link / copy where symlinks aren't allowed),
+    so existing paths keep working. A background thread removes objects not
+    accessed for `max_age` seconds and then least recently accessed ones until
+    the store is under `max_bytes`, taking their aliases with them; pinned
+    objects (inputs of queued or running jobs) are never removed.
+
+    The store may be shared by several gunicorn workers: every change to
+    index.json re-reads it under an exclusive lock on index.lock, so workers
+    don't overwrite each other's entries. Reads only record the access in
+    memory; those are merged into the index at most every `flush_interval`
+    seconds and before each eviction pass.
+    """
+
+    def __init__(self, root, max_bytes=None, max_age=None, evict_interval=300, chunk_size=1024 * 1024,
+                 flush_interval=30):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.index_path = os.path.join(self.objects_dir, "index.json")
+        self.lock_path = os.path.join(self.objects_dir, "index.lock")
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.evict_interval = evict_interval
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self.uploads = 0
+        self.deduplicated = 0
+        self.evictions = 0
+        self._lock = threading.RLock()
+        self._evictor = None
+        self._pending_access = {}
+        self._last_flush = time.monotonic()
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._index = self._load_index()
+
+    @classmethod
+    def from_env(cls, root):
+        return cls(
+            root,
+            max_bytes=int(float(os.getenv("UPLOAD_STORE_MAX_MB", "1024")) * 1024 * 1024) or None,
+            max_age=float(os.getenv("UPLOAD_MAX_AGE_SECONDS", str(7 * 24 * 3600))) or None,
+            evict_interval=float(os.getenv("UPLOAD_EVICT_INTERVAL_SECONDS", "300")),
+            flush_interval=float(os.getenv("UPLOAD_INDEX_FLUSH_SECONDS", "30"))
+        )
+
+    # index: {"objects": {digest: {size, created, last_access}}, "aliases": {name: digest},
+    #         "pins": {pin_id: {digest, pid, since}}}
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        index.setdefault("objects", {})
+        index.setdefault("aliases", {})
+        index.setdefault("pins", {})
+        return index
+
+    def _save_index(self, index):
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+    @contextmanager
+    def _transaction(self):
+        """
+        The index as currently on disk, with this process's pending accesses merged
+        in, locked against other threads and processes; written back on success
+        """
+        with self._lock, open(self.lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                index = self._load_index()
+                for digest, accessed in self._pending_access.items():
+                    entry = index["objects"].get(digest)
+                    if entry is not None:
+                        entry["last_access"] = max(entry.get("last_access", 0), accessed)
+                self._pending_access.clear()
+                yield index
+                self._save_index(index)
+                self._index = index
+                self._last_flush = time.monotonic()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def flush(self):
+        """Write the accesses recorded by touch() to the index"""
+        with self._lock:
+            if not self._pending_access:
+                return
+            with self._transaction():
+                pass
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest + ".pdf")
+
+    def _link(self, object_path, alias_path):
+        try:
+            os.symlink(os.path.relpath(object_path, self.root), alias_path)
+        except (OSError, NotImplementedError):
+            try:
+                os.link(object_path, alias_path)
+            except OSError:
+                shutil.copyfile(object_path, alias_path)
+
+    def save(self, stream, filename):
+        """
+        Store an upload from a file-like object, hashing it as it is written.
+        Returns {"path", "filename", "sha256", "size", "deduplicated"}.
+        """
+        digest, size = hashlib.sha256(), 0
+        tmp_path = os.path.join(self.objects_dir, f".upload.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in iter(lambda: stream.read(self.chunk_size), b""):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            digest = digest.hexdigest()
+            object_path = self.object_path(digest)
+
+            # Under the index lock, so another worker's eviction can't remove the object in between
+            with self._transaction() as index:
+                deduplicated = os.path.exists(object_path)
+                if deduplicated:
+                    os.remove(tmp_path)
+                else:
+                    os.replace(tmp_path, object_path)
+
+                name = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{secure_filename(filename)}"
+                if os.path.lexists(os.path.join(self.root, name)) and index["aliases"].get(name) != digest:
+                    name = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{digest[:8]}_{secure_filename(filename)}"
+                alias_path = os.path.join(self.root, name)
+                if not os.path.lexists(alias_path):
+                    self._link(object_path, alias_path)
+
+                now = time.time()
+                entry = index["objects"].setdefault(digest, {"size": size, "created": now})
+                entry["last_access"] = now
+                index["aliases"][name] = digest
+                self.uploads += 1
+                if deduplicated:
+                    self.deduplicated += 1
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        return {"path": alias_path, "filename": name, "sha256": digest, "size": size, "deduplicated": deduplicated}
+
+    def _lookup(self, index, path):
+        # Only files inside the store count: a PDF elsewhere that happens to share
+        # an alias's name is not that upload
+        name = os.path.basename(path)
+        directory = os.path.abspath(os.path.dirname(path))
+        if directory == os.path.abspath(self.objects_dir):
+            digest = name[:-len(".pdf")]
+            return digest if digest in index["objects"] else None
+        if directory == os.path.abspath(self.root):
+            return index["aliases"].get(name)
+        return None
+
+    def digest_for(self, path):
+        """The stored digest behind an alias or object path, or None for files the store doesn't own"""
+        digest = self._lookup(self._index, path)
+        if digest is None:
+            # Possibly stored by another worker since this one last read the index
+            index = self._load_index()
+            digest = self._lookup(index, path)
+            with self._lock:
+                self._index = index
+        return digest
+
+    def touch(self, path):
+        """
+        Record a read of an upload so eviction treats it as recently used. Kept in
+        memory and written with the next flush, not on every read.
+        """
+        digest = self.digest_for(path)
+        if digest is None:
+            return None
+        with self._lock:
+            self._pending_access[digest] = time.time()
+            due = time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+        return digest
+
+    def pin(self, path):
+        """
+        Protect an upload from eviction until unpin(pin_id), e.g. while a job that
+        will read it is queued or running. Returns the pin id, or None for files
+        the store doesn't own. Pins of processes that have exited are ignored.
+        """
+        digest = self.digest_for(path)
+        if digest is None:
+            return None
+        pin_id = f"{os.getpid()}-{threading.get_ident()}-{time.monotonic_ns()}"
+        with self._transaction() as index:
+            index["pins"][pin_id] = {"digest": digest, "pid": os.getpid(), "since": time.time()}
+            entry = index["objects"].get(digest)
+            if entry is not None:
+                entry["last_access"] = time.time()
+        return pin_id
+
+    def unpin(self, pin_id):
+        if pin_id is None:
+            return
+        with self._transaction() as index:
+            index["pins"].pop(pin_id, None)
+
+    @contextmanager
+    def pinned(self, path):
+        pin_id = self.pin(path)
+        try:
+            yield pin_id
+        finally:
+            self.unpin(pin_id)
+
+    def _remove_object(self, index, digest):
+        index["objects"].pop(digest, None)
+        for name in [name for name, target in index["aliases"].items() if target == digest]:
+            del index["aliases"][name]
+            try:
+                os.remove(os.path.join(self.root, name))
+            except FileNotFoundError:
+                pass
+        try:
+            os.remove(self.object_path(digest))
+        except FileNotFoundError:
+            pass
+        self.evictions += 1
+
+    def evict(self):
+        """
+        Apply the age limit, then the size cap (least recently accessed first),
+        skipping pinned objects. Returns the number removed.
+        """
+        with self._transaction() as index:
+            before = self.evictions
+            objects = index["objects"]
+            # Pins left behind by a worker that died are dropped
+            for pin_id in [p for p, pin in index["pins"].items() if not _pid_alive(pin["pid"])]:
+                del index["pins"][pin_id]
+            pinned = {pin["digest"] for pin in index["pins"].values()}
+            if self.max_age:
+                cutoff = time.time() - self.max_age
+                for digest in [d for d, entry in objects.items() if entry["last_access"] < cutoff and d not in pinned]:
+                    self._remove_object(index, digest)
+            if self.max_bytes:
+                total = sum(entry["size"] for entry in objects.values())
+                for digest in sorted(objects, key=lambda d: objects[d]["last_access"]):
+                    if total <= self.max_bytes:
+                        break
+                    if digest in pinned:
+                        continue
+                    total -= objects[digest]["size"]
+                    self._remove_object(index, digest)
+            removed = self.evictions - before
+        if removed:
+            print(f"[UPLOADS] evicted {removed} stored upload(s)")
+        return removed
+
+    def start_evictor(self):
+        if self._evictor is not None or not (self.max_bytes or self.max_age):
+            return
+
+        def loop():
+            while True:
+                try:
+                    self.evict()
+                except Exception as e:
+                    print("[ERROR] upload eviction failed:", e)
+                time.sleep(self.evict_interval)
+
+        self._evictor = threading.Thread(target=loop, name="upload-evictor", daemon=True)
+        self._evictor.start()
+
+    def stats(self):
+        # From disk: other workers add and evict objects too
+        index = self._load_index()
+        with self._lock:
+            objects = index["objects"]
+            return {
+                "objects": len(objects),
+                "aliases": len(index["aliases"]),
+                "pinned": len({pin["digest"] for pin in index["pins"].values()}),
+                "bytes": sum(entry["size"] for entry in objects.values()),
+                "max_bytes": self.max_bytes,
+                "uploads": self.uploads,
+                "deduplicated": self.deduplicated,
+                "evictions": self.evictions
+            }
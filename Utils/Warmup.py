@@ -0,0 +1,70 @@
+import os
+import time
+import threading
+
+# Keep-alive connections to OpenRouter opened by warm_connections()
+WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", "2"))
+WARMUP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("WARMUP_CONNECT_TIMEOUT_SECONDS", "5"))
+
+
+def warm_imports():
+    """Load the libraries the request paths import on first use: PyMuPDF, ReportLab, the OpenAI SDK"""
+    import fitz  # noqa: F401
+    import openai  # noqa: F401
+    from Utils import PdfHandler  # noqa: F401
+
+
+def warm_rendering():
+    """Lay out a throwaway report so fonts, styles and the paragraph parser are cached"""
+    from Utils.PdfHandler import renderer
+    from Utils.MarkdownPdf import compile_markdown
+    from Utils.Budget import budget
+    sections = {"structured": "# Warm-up", "Cardiologist": "- ok", "final": "Warm-up"}
+    # Compiled here rather than through ir_cache, so its hit/miss counters only reflect real reports
+    compiled = {name: compile_markdown(text) for name, text in sections.items()}
+    renderer.render(sections["structured"], {"Cardiologist": sections["Cardiologist"]}, sections["final"], compiled)
+    # Loads the tokenizer (and its encoding file) used to size every prompt
+    budget.count("warm-up")
+
+
+def warm_connections(count=WARMUP_CONNECTIONS):
+    """
+    Build the shared LLM client and open `count` keep-alive connections to the
+    API host (TCP + TLS), so the first completions reuse them. Each one is a HEAD
+    request and shows up in connection_stats. Connections must not cross a fork:
+    call this in the worker, never in a preloading master.
+    """
+    from Utils import Agents
+    Agents.get_client()
+    if count <= 0:
+        return
+
+    def connect():
+        try:
+            Agents.http_client.head(Agents.BASE_URL, timeout=WARMUP_CONNECT_TIMEOUT_SECONDS)
+        except Exception as e:
+            print("[WARNING] warm-up connection to the LLM API failed:", e)
+
+    # Concurrent, or the pool would hand the same connection back every time
+    threads = [threading.Thread(target=connect, name="warmup-connect", daemon=True) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(WARMUP_CONNECT_TIMEOUT_SECONDS * 2)
+
+
+def warm_up(connections=True):
+    """Run every warm-up step; returns step -> seconds. A failing step is logged and skipped."""
+    steps = [("imports", warm_imports), ("rendering", warm_rendering)]
+    if connections:
+        steps.append(("connections", warm_connections))
+    timings = {}
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            print(f"[WARNING] warm-up step {name!r} failed:", e)
+        timings[name] = round(time.perf_counter() - start, 4)
+    print(f"[WARMUP] pid {os.getpid()}: " + ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in timings.items()))
+    return timings
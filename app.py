@@ -1,20 +1,33 @@
-from flask import Flask, request, jsonify, send_file
-import tempfile
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
 import re
-from werkzeug.utils import secure_filename
 import os
+import io
 import json
-import tempfile
+import mmap
+import hashlib
+import multiprocessing
+from contextlib import contextmanager
 from datetime import datetime
 from Utils.Agents import (
-    extract_text_from_pdf, structure_medical_report,
+    extract_text_from_pdf, extract_text_from_buffer, stream_pdf_pages, PdfTooLarge, structure_medical_report,
     Cardiologist, Psychologist, Pulmonologist, MultidisciplinaryTeam,
-    generate_report_pdf
+    llm_cache, text_cache, rate_limiter, connection_stats, resilience, parse_agent_timeouts
 )
+from Utils.Pipeline import run_pipeline
+from Utils.RenderService import render_service, RenderQueueFull, RenderTimeout
+from Utils.MarkdownPdf import ir_cache
+from Utils.Jobs import JobManager, JobQueueFull
+from Utils.UploadStore import UploadStore
+from Utils.Metrics import metrics
+from Utils.Tracing import tracer
+from Utils.Budget import budget
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+# Trace id per request (from traceparent / X-Trace-Id if sent), echoed in the response headers
+tracer.init_app(app)
+
 # Use a more Railway-friendly upload path
 upload_folder = os.environ.get('UPLOAD_FOLDER', 'uploads')
 app.config['UPLOAD_FOLDER'] = upload_folder
@@ -22,6 +35,30 @@ app.config['UPLOAD_FOLDER'] = upload_folder
 # Ensure upload directory exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+# Uploads are stored once per SHA-256 with timestamped aliases, and evicted by size/age
+upload_store = UploadStore.from_env(app.config['UPLOAD_FOLDER'])
+
+# Background pipeline runs for POST /jobs
+job_manager = JobManager.from_env()
+
+def start_background_services():
+    """Threads owned by the process serving requests"""
+    # Render and extraction workers are spawned, so they re-import the main module
+    # (this file under `python app.py`); they must not start threads of their own
+    if multiprocessing.parent_process() is not None:
+        return
+    upload_store.start_evictor()
+    # With METRICS_DIR set, each gunicorn worker publishes its metrics there for /metrics to add up
+    metrics.start()
+
+# Threads don't survive a fork: when gunicorn preloads the app in its master
+# (GUNICORN_PRELOAD=1), gunicorn.conf.py starts these in each worker instead
+if os.getenv("DEFER_BACKGROUND_SERVICES", "0").lower() not in ("1", "true", "yes"):
+    start_background_services()
+
+# Uploads larger than this are parsed from an mmap of Werkzeug's spool file rather than read into memory
+UPLOAD_IN_MEMORY_MAX_BYTES = int(float(os.getenv("UPLOAD_IN_MEMORY_MAX_MB", "4")) * 1024 * 1024)
+
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'pdf'}
 
@@ -29,6 +66,49 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def ndjson_pages(pages):
+    """One JSON line per page; a failure part way through becomes a final error line"""
+    count, length = 0, 0
+    try:
+        for count, text in enumerate(pages, start=1):
+            length += len(text)
+            yield json.dumps({"page": count, "text": text}) + "\n"
+    except Exception as e:
+        yield json.dumps({"error": f"Text extraction failed: {str(e)}", "pages": count}) + "\n"
+        return
+    yield json.dumps({"done": True, "pages": count, "text_length": length}) + "\n"
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def sse_response(events, **start_data):
+    """
+    Relay stream_prompt() events as Server-Sent Events: one `start` event straight
+    away, `token` events as text arrives, then `done` (full text and usage) or `error`
+    """
+    def generate():
+        yield sse_event("start", dict(start_data, started_at=datetime.now().isoformat()))
+        try:
+            for event in events:
+                if event["type"] == "token":
+                    yield sse_event("token", {"text": event["text"]})
+                else:
+                    yield sse_event("done", {
+                        "text": event["text"],
+                        "usage": event["usage"],
+                        "cached": event["cached"],
+                        "prompt_tokens_estimated": event.get("prompt_tokens_estimated"),
+                        "processing_time": datetime.now().isoformat()
+                    })
+        except Exception as e:
+            yield sse_event("error", {"error": str(e)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -38,6 +118,49 @@ def health_check():
         "service": "Medical Diagnostics API"
     })
 
+@app.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters for the LLM response, PDF text and report Markdown caches, and upload store usage"""
+    return jsonify({
+        "llm": llm_cache.stats(),
+        "text_extraction": text_cache.stats(),
+        "markdown_ir": ir_cache.stats(),
+        "uploads": upload_store.stats(),
+        "timestamp": datetime.now().isoformat()
+    })
+
+@app.route('/llm-stats', methods=['GET'])
+def llm_stats():
+    """Live state of the shared OpenRouter rate limiter, retries/hedging, HTTP connection pool and prompt budget"""
+    return jsonify({
+        "rate_limiter": rate_limiter.stats(),
+        "resilience": resilience.stats(),
+        "transport": connection_stats.stats(),
+        "prompt_budget": budget.stats(),
+        "timestamp": datetime.now().isoformat()
+    })
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Stage latency histograms, in-flight and error counts and LLM token usage in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/render-stats', methods=['GET'])
+def render_stats():
+    """Queue depth, throughput and timeouts of the PDF render worker pool"""
+    return jsonify({
+        "render": render_service.stats(),
+        "timestamp": datetime.now().isoformat()
+    })
+
+def render_unavailable(e):
+    """503 (with Retry-After) when the render queue is full, 504 when a render timed out"""
+    if isinstance(e, RenderQueueFull):
+        response = jsonify({"error": f"PDF render queue is full: {str(e)}"})
+        response.headers['Retry-After'] = '10'
+        return response, 503
+    return jsonify({"error": str(e)}), 504
+
 @app.route('/upload-pdf', methods=['POST'])
 def upload_pdf():
     """
@@ -59,18 +182,15 @@ def upload_pdf():
         if not allowed_file(file.filename):
             return jsonify({"error": "Invalid file type. Only PDF files are allowed"}), 400
         
-        # Secure filename and save
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{timestamp}_{filename}"
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        
-        file.save(file_path)
+        # Hash while saving; a file already in the store only gets a new alias
+        stored = upload_store.save(file.stream, file.filename)
         
         return jsonify({
             "message": "File uploaded successfully",
-            "file_path": file_path,
-            "filename": filename,
+            "file_path": stored['path'],
+            "filename": stored['filename'],
+            "sha256": stored['sha256'],
+            "deduplicated": stored['deduplicated'],
             "upload_time": datetime.now().isoformat()
         }), 200
         
@@ -81,8 +201,9 @@ def upload_pdf():
 def extract_text():
     """
     Extract text from uploaded PDF
-    Expects: JSON { "path": "<uploaded_pdf_path>" }
-    Returns: JSON with extracted text
+    Expects: JSON { "path": "<uploaded_pdf_path>", "stream": true (optional) }
+    Returns: JSON with extracted text, or with "stream" an NDJSON body of
+             {"page": n, "text": ...} lines ending in {"done": true, ...}
     """
     try:
         data = request.get_json()
@@ -96,8 +217,14 @@ def extract_text():
         if not os.path.exists(pdf_path):
             return jsonify({"error": "PDF file not found"}), 404
         
+        digest = upload_store.touch(pdf_path)
+        
+        if data.get('stream'):
+            return Response(stream_with_context(ndjson_pages(stream_pdf_pages(pdf_path, digest=digest))),
+                            mimetype='application/x-ndjson')
+        
         # Extract text
-        extracted_text = extract_text_from_pdf(pdf_path)
+        extracted_text = extract_text_from_pdf(pdf_path, digest=digest)
         
         if not extracted_text:
             return jsonify({"error": "No text could be extracted from PDF"}), 400
@@ -109,6 +236,83 @@ def extract_text():
             "extraction_time": datetime.now().isoformat()
         }), 200
         
+    except PdfTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except Exception as e:
+        return jsonify({"error": f"Text extraction failed: {str(e)}"}), 500
+
+@contextmanager
+def upload_buffer(file):
+    """
+    The uploaded PDF's bytes without another copy on disk: small uploads are read from
+    Werkzeug's in-memory spool, larger ones (already spooled to a temp file) are mmap'd.
+    """
+    stream = file.stream
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    fileno = None
+    if size > UPLOAD_IN_MEMORY_MAX_BYTES:
+        try:
+            fileno = stream.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            fileno = None
+    if fileno is None:
+        yield stream.read()
+        return
+    mapped = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    try:
+        yield view
+    finally:
+        view.release()
+        mapped.close()
+
+@app.route('/upload-and-extract', methods=['POST'])
+def upload_and_extract():
+    """
+    Upload a PDF and extract its text in one request, parsing it straight from the
+    request body instead of saving it first
+    Expects: multipart form with "file" and optionally "persist=true" to also keep
+             the upload in the upload folder (for /process-complete or /jobs)
+    Returns: JSON with extracted text, the file's SHA-256 and, if persisted, its path
+    """
+    try:
+        if 'file' not in request.files:
+            return jsonify({"error": "No file provided"}), 400
+        
+        file = request.files['file']
+        
+        if file.filename == '':
+            return jsonify({"error": "No file selected"}), 400
+        
+        if not allowed_file(file.filename):
+            return jsonify({"error": "Invalid file type. Only PDF files are allowed"}), 400
+        
+        with upload_buffer(file) as buffer:
+            digest = hashlib.sha256(buffer).hexdigest()
+            extracted_text = extract_text_from_buffer(buffer, digest=digest)
+        
+        if not extracted_text:
+            return jsonify({"error": "No text could be extracted from PDF"}), 400
+        
+        result = {
+            "message": "Text extracted successfully",
+            "raw_text": extracted_text,
+            "text_length": len(extracted_text),
+            "sha256": digest,
+            "extraction_time": datetime.now().isoformat()
+        }
+        
+        if request.form.get('persist', '').lower() in ('1', 'true', 'yes'):
+            file.stream.seek(0)
+            stored = upload_store.save(file.stream, file.filename)
+            result.update(file_path=stored['path'], filename=stored['filename'])
+        
+        return jsonify(result), 200
+        
+    except PdfTooLarge as e:
+        return jsonify({"error": str(e)}), 413
     except Exception as e:
         return jsonify({"error": f"Text extraction failed: {str(e)}"}), 500
 
@@ -131,11 +335,18 @@ def structure_report():
             return jsonify({"error": "Text cannot be empty"}), 400
         
         # Structure the report
-        structured_report = structure_medical_report(raw_text)
+        structured_report, structuring = structure_medical_report(raw_text, return_meta=True)
         
         return jsonify({
             "message": "Report structured successfully",
             "structured_report": structured_report,
+            "structuring_path": structuring["path"],
+            "section_coverage": structuring["coverage"],
+            "prompt_tokens": {
+                "estimated": structuring.get("prompt_tokens_estimated"),
+                "actual": structuring.get("prompt_tokens_actual"),
+                "budget": structuring.get("budget", {}).get("action")
+            },
             "processing_time": datetime.now().isoformat()
         }), 200
         
@@ -183,12 +394,39 @@ def run_agent(agent_type):
             "message": f"{agent_type.title()} assessment completed",
             "agent_type": agent_type.lower(),
             "assessment": result,
+            "prompt_tokens": {
+                "estimated": agent.last_call.get("prompt_tokens_estimated"),
+                "actual": agent.last_call.get("prompt_tokens_actual"),
+                "budget": agent.last_call.get("prompt_budget")
+            },
             "processing_time": datetime.now().isoformat()
         }), 200
         
     except Exception as e:
         return jsonify({"error": f"{agent_type} agent failed: {str(e)}"}), 500
 
+@app.route('/run-agent/<agent_type>/stream', methods=['POST'])
+def run_agent_stream(agent_type):
+    """
+    Streaming variant of /run-agent/<agent_type>
+    Expects: JSON { "text": "<structured_text>" }
+    Returns: text/event-stream with start, token, done/error events
+    """
+    agent_class_map = {
+        'cardiologist': Cardiologist,
+        'psychologist': Psychologist,
+        'pulmonologist': Pulmonologist
+    }
+    if agent_type.lower() not in agent_class_map:
+        return jsonify({"error": f"Invalid agent type. Must be one of: {list(agent_class_map)}"}), 400
+    
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('text'), str) or not data['text'].strip():
+        return jsonify({"error": "Structured text is required"}), 400
+    
+    agent = agent_class_map[agent_type.lower()](data['text'])
+    return sse_response(agent.stream(), agent_type=agent_type.lower())
+
 from flask import make_response, jsonify
 
 from flask import Flask, request, make_response
@@ -235,6 +473,11 @@ def multidisciplinary_summary():
         response_data = {
             "message": "Multidisciplinary summary generated successfully",
             "summary": summary,
+            "prompt_tokens": {
+                "estimated": team.last_call.get("prompt_tokens_estimated"),
+                "actual": team.last_call.get("prompt_tokens_actual"),
+                "budget": team.last_call.get("prompt_budget")
+            },
             "processing_time": datetime.now().isoformat()
         }
         response = make_response(json.dumps(response_data), 200)
@@ -246,6 +489,33 @@ def multidisciplinary_summary():
         response.headers['Content-Type'] = 'application/json; charset=utf-8'
         return response
 
+@app.route('/multidisciplinary-summary/stream', methods=['POST'])
+def multidisciplinary_summary_stream():
+    """
+    Streaming variant of /multidisciplinary-summary
+    Expects: JSON { "cardiologist": "...", "psychologist": "...", "pulmonologist": "..." }
+    Returns: text/event-stream with start, token, done/error events
+    """
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "Request body is required"}), 400
+    
+    required_fields = ['cardiologist', 'psychologist', 'pulmonologist']
+    missing_fields = [field for field in required_fields if field not in data]
+    if missing_fields:
+        return jsonify({"error": f"Missing required fields: {missing_fields}"}), 400
+    
+    for field in required_fields:
+        if not data[field] or not data[field].strip():
+            return jsonify({"error": f"{field} assessment cannot be empty"}), 400
+    
+    team = MultidisciplinaryTeam(
+        data['cardiologist'],
+        data['psychologist'],
+        data['pulmonologist']
+    )
+    return sse_response(team.stream(), agent_type="multidisciplinary")
+
 
 @app.route('/generate-pdf', methods=['POST'])
 def generate_pdf():
@@ -284,10 +554,8 @@ def generate_pdf():
             if not data[field] or not data[field].strip():
                 return jsonify({"error": f"{field} cannot be empty"}), 400
 
-        # Create temporary PDF file
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         pdf_filename = f"medical_report_{timestamp}.pdf"
-        pdf_path = os.path.join(tempfile.gettempdir(), pdf_filename)
 
         # Prepare agent responses dictionary
         agent_responses = {
@@ -299,26 +567,23 @@ def generate_pdf():
         print("Structured Report Preview:", data['structured_report'][:100])
         print("Cardiologist Report Preview:", data['cardiologist'][:100])
 
-        # Generate PDF
-        generate_report_pdf(
-            pdf_path,
+        # Render in a worker process and stream it back; nothing is written to disk
+        pdf_buffer = render_service.render(
             data['structured_report'],
             agent_responses,
             data['final_summary']
         )
 
-        # Check if PDF was created successfully
-        if not os.path.exists(pdf_path):
-            return jsonify({"error": "PDF generation failed"}), 500
-
         # Return PDF file for download
         return send_file(
-            pdf_path,
+            pdf_buffer,
             as_attachment=True,
             download_name=pdf_filename,
             mimetype='application/pdf'
         )
 
+    except (RenderQueueFull, RenderTimeout) as e:
+        return render_unavailable(e)
     except Exception as e:
         return jsonify({"error": f"PDF generation failed: {str(e)}"}), 500
 
@@ -328,8 +593,12 @@ def generate_pdf():
 def process_complete():
     """
     Complete end-to-end processing (convenience endpoint)
-    Expects: JSON { "pdf_path": "<path_to_uploaded_pdf>" }
-    Returns: Downloadable PDF with complete analysis
+    Expects: JSON { "pdf_path": "<path_to_uploaded_pdf>",
+                    "agent_timeouts": {"cardiologist": 45, ...} (optional),
+                    "force_all_specialists": true (optional, skip relevance routing) }
+    Returns: Downloadable PDF with complete analysis.
+             Per-agent timings are reported in the X-Agent-Timings (JSON)
+             and Server-Timing headers.
     """
     try:
         data = request.get_json()
@@ -338,59 +607,129 @@ def process_complete():
             return jsonify({"error": "PDF path is required"}), 400
         
         pdf_path = data['pdf_path']
+        try:
+            agent_timeouts = parse_agent_timeouts(data.get('agent_timeouts'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
         # Check if file exists
         if not os.path.exists(pdf_path):
             return jsonify({"error": "PDF file not found"}), 404
-        
-        # Step 1: Extract text
-        raw_text = extract_text_from_pdf(pdf_path)
-        
-        # Step 2: Structure report
-        structured_report = structure_medical_report(raw_text)
-        
-        # Step 3: Run all agents
-        cardiologist = Cardiologist(structured_report)
-        psychologist = Psychologist(structured_report)
-        pulmonologist = Pulmonologist(structured_report)
-        
-        cardio_result = cardiologist.run()
-        psycho_result = psychologist.run()
-        pulmo_result = pulmonologist.run()
-        
-        # Step 4: Generate multidisciplinary summary
-        team = MultidisciplinaryTeam(cardio_result, psycho_result, pulmo_result)
-        final_summary = team.run()
-        
-        # Step 5: Generate PDF (without Hindi translation)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         pdf_filename = f"complete_medical_report_{timestamp}.pdf"
-        output_pdf_path = os.path.join(tempfile.gettempdir(), pdf_filename)
         
-        agent_responses = {
-            'Cardiologist': cardio_result,
-            'Psychologist': psycho_result,
-            'Pulmonologist': pulmo_result
-        }
-        
-        generate_report_pdf(
-            output_pdf_path,
-            structured_report,
-            agent_responses,
-            final_summary
-        )
+        # Extract, structure, run specialists concurrently (each bounded by its
+        # own deadline), summarise and render the PDF in memory. Pinned so no
+        # worker's evictor removes the upload while it is being read.
+        with upload_store.pinned(pdf_path):
+            result = run_pipeline(
+                pdf_path, None, agent_timeouts,
+                force_all_specialists=bool(data.get('force_all_specialists'))
+            )
+        agent_timings = result['agent_timings']
         
         # Return PDF file for download
-        return send_file(
-            output_pdf_path,
+        response = send_file(
+            result['pdf'],
             as_attachment=True,
             download_name=pdf_filename,
             mimetype='application/pdf'
         )
+        response.headers['X-Agent-Timings'] = json.dumps(agent_timings)
+        response.headers['X-Structuring-Path'] = result['structuring']['path']
+        response.headers['Server-Timing'] = ", ".join(
+            f'{role.lower()};dur={timing["seconds"] * 1000:.0f};desc="{timing["status"]}"'
+            for role, timing in agent_timings.items()
+        )
+        return response
         
+    except (RenderQueueFull, RenderTimeout) as e:
+        return render_unavailable(e)
     except Exception as e:
         return jsonify({"error": f"Complete processing failed: {str(e)}"}), 500
 
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Queue the end-to-end pipeline and return immediately
+    Expects: JSON { "pdf_path": "<path_to_uploaded_pdf>",
+                    "callback_url": "<webhook to POST the finished job to>" (optional),
+                    "agent_timeouts": {"cardiologist": 45, ...} (optional),
+                    "force_all_specialists": true (optional, skip relevance routing) }
+    Returns: 202 with the job id and its status URL
+    """
+    try:
+        data = request.get_json()
+        
+        if not data or 'pdf_path' not in data:
+            return jsonify({"error": "PDF path is required"}), 400
+        
+        pdf_path = data['pdf_path']
+        callback_url = data.get('callback_url')
+        try:
+            agent_timeouts = parse_agent_timeouts(data.get('agent_timeouts'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        if not os.path.exists(pdf_path):
+            return jsonify({"error": "PDF file not found"}), 404
+        
+        if callback_url and not re.match(r'^https?://', callback_url):
+            return jsonify({"error": "callback_url must be an http(s) URL"}), 400
+        
+        # Kept from eviction until the job has run, however long it waits in the queue
+        pin_id = upload_store.pin(pdf_path)
+        try:
+            job = job_manager.submit(
+                pdf_path,
+                callback_url=callback_url,
+                agent_timeouts=agent_timeouts,
+                force_all_specialists=bool(data.get('force_all_specialists')),
+                report_url=lambda job_id: f"{request.host_url.rstrip('/')}/jobs/{job_id}/report",
+                release=lambda: upload_store.unpin(pin_id)
+            )
+        except Exception:
+            upload_store.unpin(pin_id)
+            raise
+        
+        return jsonify({
+            "message": "Job queued",
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"{request.host_url.rstrip('/')}/jobs/{job.id}",
+            "submitted_at": job.created_at
+        }), 202
+        
+    except JobQueueFull as e:
+        response = jsonify({"error": f"Job queue is full: {str(e)}"})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+    except Exception as e:
+        return jsonify({"error": f"Job submission failed: {str(e)}"}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Stage-level progress of a queued job, plus its results once finished"""
+    job = job_manager.snapshot(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
+
+@app.route('/jobs/<job_id>/report', methods=['GET'])
+def job_report(job_id):
+    """Download the PDF produced by a finished job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job.status != 'succeeded' or not job.artifact_path or not os.path.exists(job.artifact_path):
+        return jsonify({"error": f"Report not available, job is {job.status}"}), 409
+    return send_file(
+        job.artifact_path,
+        as_attachment=True,
+        download_name=f"complete_medical_report_{job.id}.pdf",
+        mimetype='application/pdf'
+    )
+
 @app.errorhandler(413)
 def too_large(e):
     return jsonify({"error": "File too large. Maximum size is 16MB"}), 413
@@ -410,5 +749,11 @@ if __name__ == '__main__':
     # Use debug=False for production
     debug_mode = os.environ.get('FLASK_ENV') == 'development'
     
+    # PDF layout runs in warm worker processes so it doesn't stall other requests.
+    # Never started on import: spawned workers re-import the main module, which only
+    # works when it is guarded like this one; imported elsewhere, the pool starts
+    # on the first render (gunicorn workers start it in post_worker_init).
+    render_service.start()
+    
     app.run(debug=debug_mode, host='0.0.0.0', port=port)
 
@@ -0,0 +1,127 @@
+"""
+Markdown -> flowables: the single-pass compiler in Utils.MarkdownPdf against the
+old markdown -> HTML -> BeautifulSoup converter (benchmarks/legacy_markdown.py),
+on real agent output and on markdown_features.md (tables, nested lists, quotes,
+hard breaks). Checks the two produce the same flowables first. markdown_changes.md
+holds the deliberate differences (see KNOWN_CHANGES), which are reported, not failed.
+
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/bench_markdown.py [--repeat 200] [files...]
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import statistics
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+from reportlab.platypus import Paragraph, Spacer, Table
+from Utils.PdfHandler import build_styles
+from Utils.MarkdownPdf import parse_markdown_to_pdf, compile_markdown
+from Utils.Sections import detect_sections, render_sections
+import legacy_markdown
+
+DEFAULT_INPUTS = [
+    os.path.join(ROOT, "Results", "final_diagnosis.txt"),
+    os.path.join(ROOT, "Medical Reports", "Medical Rerort - Michael Johnson - Panic Attack Disorder.txt"),
+    os.path.join(HERE, "markdown_features.md"),
+    os.path.join(HERE, "markdown_changes.md"),
+]
+
+# Inputs whose output intentionally differs from the legacy converter
+KNOWN_CHANGES = {
+    "markdown_changes.md": "ordered lists are numbered 1, 2, ... (the old converter used the flowable count, "
+                           "e.g. 9., 10.); inline HTML such as <b>x</b> is shown as text instead of rendered"
+}
+
+
+def load_inputs(paths):
+    """(name, markdown) pairs; raw medical reports are also run through the rule-based structurer"""
+    inputs = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        name = os.path.basename(path)
+        inputs.append((name, text))
+        if os.path.dirname(path).endswith("Medical Reports"):
+            inputs.append((f"structured: {name}", render_sections(detect_sections(text)["sections"])))
+    return inputs
+
+
+def _paragraph_signature(paragraph):
+    # Parsed fragments (font + text) rather than the markup string, so "<br/>" vs "<br />" etc. don't count
+    words = []
+    for frag in paragraph.frags:
+        text = re.sub(r"\s+", " ", getattr(frag, "text", "") or "")
+        if getattr(frag, "lineBreak", False):
+            text = "\n"
+        if text:
+            words.append((frag.fontName, text))
+    merged = []
+    for font, text in words:
+        if merged and merged[-1][0] == font:
+            merged[-1] = (font, merged[-1][1] + text)
+        else:
+            merged.append((font, text))
+    return [(font, re.sub(r" ?\n ?", "\n", text).strip(" ")) for font, text in merged]
+
+
+def signature(flowables):
+    out = []
+    for flowable in flowables:
+        if isinstance(flowable, Paragraph):
+            out.append(("Paragraph", flowable.style.name, _paragraph_signature(flowable)))
+        elif isinstance(flowable, Spacer):
+            out.append(("Spacer", round(flowable.height, 2)))
+        elif isinstance(flowable, Table):
+            out.append(("Table", [[_paragraph_signature(cell) for cell in row] for row in flowable._cellvalues]))
+        else:
+            out.append((type(flowable).__name__,))
+    return out
+
+
+def timed(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("files", nargs="*", default=DEFAULT_INPUTS)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    styles = build_styles()
+    inputs = load_inputs(args.files)
+    failed = False
+
+    # "compile ms" is the Markdown -> IR step alone; the rest of "new ms" is building the Paragraphs
+    print(f"{'input':<50} {'chars':>6} {'legacy ms':>10} {'new ms':>7} {'compile ms':>11} {'speedup':>8}  same")
+    for name, text in inputs:
+        same = signature(legacy_markdown.parse_markdown_to_pdf(text, styles)) == signature(parse_markdown_to_pdf(text, styles))
+        known = KNOWN_CHANGES.get(name)
+        failed = failed or (not same and not known)
+        legacy_ms = timed(lambda: legacy_markdown.parse_markdown_to_pdf(text, styles), args.repeat)
+        new_ms = timed(lambda: parse_markdown_to_pdf(text, styles), args.repeat)
+        compile_ms = timed(lambda: compile_markdown(text), args.repeat)
+        print(f"{name[:50]:<50} {len(text):>6} {legacy_ms:>10.2f} {new_ms:>7.2f} {compile_ms:>11.2f} "
+              f"{legacy_ms / new_ms:>7.1f}x  {'yes' if same else 'changed' if known else 'NO'}")
+        if known and not same:
+            print(f"    known change: {known}")
+
+    if failed:
+        print("[ERROR] the compiler's output differs from the legacy converter")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
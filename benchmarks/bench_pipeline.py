@@ -0,0 +1,258 @@
+"""
+Per-stage and end-to-end pipeline benchmarks against the local OpenRouter mock
+(benchmarks/mock_openrouter.py), so no network access or tokens are needed.
+Compares each stage's median with a baseline recorded on this machine and exits 1
+on regressions. Timings don't carry across machines, so the baseline file is not
+committed: record one with --save-baseline before relying on the gate.
+
+    python benchmarks/bench_pipeline.py --save-baseline          # once, and after an intended change
+    python benchmarks/bench_pipeline.py [--repeat 5] [--stages structure_llm,team,...]
+    python benchmarks/bench_pipeline.py --latency lognormal:0.8,0.4 --tokens-per-second 80 --error-rate 0.05 --no-compare
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+DEFAULT_BASELINE = os.path.join(HERE, "baselines.json")
+SAMPLE_PDF = os.path.join(ROOT, "CaseReportExample.pdf")
+SAMPLE_REPORT = os.path.join(ROOT, "Medical Reports", "Medical Rerort - Michael Johnson - Panic Attack Disorder.txt")
+SAMPLE_FINAL = os.path.join(ROOT, "Results", "final_diagnosis.txt")
+
+STAGES = [
+    "extract_text", "structure_rules", "structure_llm", "cardiologist", "psychologist",
+    "pulmonologist", "team", "parse_markdown", "generate_pdf", "process_complete"
+]
+
+
+def configure_environment(base_url, scratch, args):
+    """Point the app at the mock and at throwaway storage; must run before Utils is imported"""
+    os.environ["OPENROUTER_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "mock"
+    # Every repetition has to reach the mock, not the response caches
+    os.environ["LLM_CACHE_ENABLED"] = "0"
+    os.environ["MARKDOWN_IR_CACHE_ENABLED"] = "0"
+    os.environ["UPLOAD_FOLDER"] = os.path.join(scratch, "uploads")
+    os.environ["JOBS_DIR"] = os.path.join(scratch, "jobs")
+    os.environ["LLM_CACHE_DIR"] = os.path.join(scratch, "llm-cache")
+    # Measure our own overhead, not OpenRouter's quota; keep the real limits with --keep-limits
+    if not args.keep_limits:
+        os.environ.setdefault("LLM_RPM", "100000")
+        os.environ.setdefault("LLM_TPM", "1000000000")
+        os.environ.setdefault("LLM_HEDGE_ENABLED", "0")
+    os.environ.setdefault("LLM_RETRY_BASE_SECONDS", "0.05")
+
+
+def timed(function, repeat, warmup=1):
+    for _ in range(warmup):
+        function()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "median_ms": round(statistics.median(samples), 2),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2),
+        "min_ms": round(samples[0], 2),
+        "samples": len(samples)
+    }
+
+
+def build_stages(scratch):
+    """name -> zero-argument callable running that stage once on the sample case"""
+    from Utils import Agents
+    from Utils.Agents import (
+        extract_text_from_pdf, structure_medical_report, Cardiologist, Psychologist,
+        Pulmonologist, MultidisciplinaryTeam, text_cache
+    )
+    from Utils.PdfHandler import build_styles, generate_report_pdf
+    from Utils.MarkdownPdf import parse_markdown_to_pdf
+    from Utils.RenderService import render_service
+    import app as app_module
+
+    with open(SAMPLE_REPORT, "r", encoding="utf-8") as f:
+        raw_report = f.read()
+    with open(SAMPLE_FINAL, "r", encoding="utf-8") as f:
+        final = f.read()
+    raw_pdf_text = extract_text_from_pdf(SAMPLE_PDF, use_cache=False)
+    structured = structure_medical_report(raw_report)
+    diag_map = {
+        "Cardiologist": Cardiologist(structured).run(),
+        "Psychologist": Psychologist(structured).run(),
+        "Pulmonologist": Pulmonologist(structured).run()
+    }
+    styles = build_styles()
+    output_path = os.path.join(scratch, "report.pdf")
+
+    def structure_llm():
+        # Force the LLM path even for reports the rule-based structurer would handle
+        enabled, Agents.STRUCTURE_RULES_ENABLED = Agents.STRUCTURE_RULES_ENABLED, False
+        try:
+            return structure_medical_report(raw_pdf_text)
+        finally:
+            Agents.STRUCTURE_RULES_ENABLED = enabled
+
+    def generate_pdf():
+        assert generate_report_pdf(output_path, structured, diag_map, final)
+
+    # Workers must be up and warm before anything is timed, or their start-up
+    # competes with the stages measured first
+    render_service.start(wait=True)
+    client = app_module.app.test_client()
+
+    def process_complete():
+        text_cache.clear()
+        response = client.post("/process-complete", json={"pdf_path": SAMPLE_PDF, "force_all_specialists": True})
+        assert response.status_code == 200, response.get_data(as_text=True)[:200]
+
+    return {
+        "extract_text": lambda: extract_text_from_pdf(SAMPLE_PDF, use_cache=False),
+        "structure_rules": lambda: structure_medical_report(raw_report),
+        "structure_llm": structure_llm,
+        "cardiologist": lambda: Cardiologist(structured).run(),
+        "psychologist": lambda: Psychologist(structured).run(),
+        "pulmonologist": lambda: Pulmonologist(structured).run(),
+        "team": lambda: MultidisciplinaryTeam(
+            diag_map["Cardiologist"], diag_map["Psychologist"], diag_map["Pulmonologist"]
+        ).run(),
+        "parse_markdown": lambda: parse_markdown_to_pdf(final, styles),
+        "generate_pdf": generate_pdf,
+        "process_complete": process_complete
+    }
+
+
+def machine():
+    """What a baseline's timings depend on; a baseline from another machine isn't compared"""
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()}
+
+
+def load_baseline(path):
+    """The stored baseline, or None (with a warning) when there is none for this machine"""
+    if not os.path.exists(path):
+        print(f"[WARNING] no baseline at {path}; record one on this machine with --save-baseline "
+              "before regressions are gated")
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        stored = json.load(f)
+    if stored.get("machine") != machine():
+        print(f"[WARNING] baseline at {path} was recorded on another machine "
+              f"({json.dumps(stored.get('machine'))}); not comparing. Re-record it here with --save-baseline")
+        return None
+    return stored
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Rows of (stage, baseline ms, current ms, delta %, status); status is ok/improved/REGRESSION/new"""
+    rows = []
+    for stage, current in results.items():
+        previous = baseline.get(stage)
+        if previous is None:
+            rows.append((stage, None, current["median_ms"], None, "new"))
+            continue
+        before, after = previous["median_ms"], current["median_ms"]
+        delta = after - before
+        ratio = delta / before if before else 0.0
+        if delta > min_delta_ms and ratio > tolerance:
+            status = "REGRESSION"
+        elif -delta > min_delta_ms and -ratio > tolerance:
+            status = "improved"
+        else:
+            status = "ok"
+        rows.append((stage, before, after, ratio * 100, status))
+    return rows
+
+
+def print_report(rows):
+    print(f"\n{'stage':<18} {'baseline ms':>12} {'current ms':>11} {'delta':>8}  status")
+    for stage, before, after, delta, status in rows:
+        before_text = f"{before:.2f}" if before is not None else "-"
+        delta_text = f"{delta:+.1f}%" if delta is not None else "-"
+        print(f"{stage:<18} {before_text:>12} {after:>11.2f} {delta_text:>8}  {status}")
+
+
+def main():
+    import mock_openrouter
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma-separated subset of: " + ", ".join(STAGES))
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--no-compare", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="relative slowdown flagged as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="ignore slowdowns smaller than this")
+    parser.add_argument("--keep-limits", action="store_true", help="keep the configured LLM rate limits and hedging")
+    mock_openrouter.add_arguments(parser)
+    args = parser.parse_args()
+
+    selected = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in selected if s not in STAGES]
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(unknown)}")
+
+    mock = mock_openrouter.MockOpenRouter(mock_openrouter.config_from_args(args)).start()
+    scratch = tempfile.mkdtemp(prefix="bench-pipeline-")
+    configure_environment(mock.base_url, scratch, args)
+    try:
+        stages = build_stages(scratch)
+        results = {}
+        for name in selected:
+            results[name] = timed(stages[name], args.repeat)
+            print(f"{name:<18} median {results[name]['median_ms']:>9.2f} ms  "
+                  f"p95 {results[name]['p95_ms']:>9.2f} ms  min {results[name]['min_ms']:>9.2f} ms")
+        served = mock.stats()
+    finally:
+        mock.stop()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    print(f"mock: {served['requests']} requests, {served['errors_injected']} injected errors, "
+          f"{served['completion_tokens']} completion tokens")
+
+    regressions = []
+    stored = None if args.no_compare else load_baseline(args.baseline)
+    if stored is not None:
+        if stored.get("mock") != served["config"]:
+            print("[WARNING] baseline was recorded with different mock settings:", json.dumps(stored.get("mock")))
+        rows = compare(results, stored.get("stages", {}), args.tolerance, args.min_delta_ms)
+        print_report(rows)
+        regressions = [row[0] for row in rows if row[4] == "REGRESSION"]
+
+    if args.save_baseline:
+        stored = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        if stored.get("machine") != machine():
+            # Another machine's startup timings can't be compared with this one's
+            stored = {}
+        stored.setdefault("stages", {}).update(results)
+        stored.update(
+            recorded=time.strftime("%Y-%m-%dT%H:%M:%S"),
+            machine=machine(),
+            mock=served["config"],
+            repeat=args.repeat
+        )
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline saved to {args.baseline}")
+
+    if regressions:
+        print(f"[ERROR] regressions in: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Worker start-up benchmarks: each measurement runs in fresh interpreters (or a fresh
+gunicorn), since only the first import / first request of a process shows the cost.
+LLM traffic goes to the local OpenRouter mock. Compares medians with the "startup"
+entries of the baseline recorded on this machine (see bench_pipeline.py) and exits 1
+on regressions.
+
+    python benchmarks/bench_startup.py --save-baseline          # once, and after an intended change
+    python benchmarks/bench_startup.py [--repeat 5] [--measurements import_app,gunicorn_boot,...]
+
+`import_app_eager` loads everything `import app` used to load up front (PyMuPDF,
+ReportLab, the OpenAI SDK and client) before importing the app, as the reference
+for what lazy imports save.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import statistics
+import subprocess
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+from bench_pipeline import DEFAULT_BASELINE, SAMPLE_PDF, compare, load_baseline, machine, print_report  # noqa: E402
+
+# Snippets run with `python -c` from the repository root; each prints its result in ms as JSON
+_CLOCK = "import time, json\nstart = time.perf_counter()\n"
+_REPORT = "\nprint(json.dumps({'ms': (time.perf_counter() - start) * 1000}))\n"
+_EAGER = "import fitz, openai, reportlab.platypus, Utils.PdfHandler\nfrom Utils.Agents import get_client\nget_client()\n"
+
+SNIPPETS = {
+    "import_app": "import app",
+    "import_app_eager": _EAGER + "import app",
+    "first_health": "import app\nassert app.app.test_client().get('/health').status_code == 200",
+    # First-use costs that lazy imports moved out of boot and into the first real request
+    "first_extract": "import app\nfrom Utils.Agents import extract_text_from_pdf\n"
+                     f"extract_text_from_pdf({SAMPLE_PDF!r}, use_cache=False)",
+    "first_llm_call": "import app\nfrom Utils.Agents import complete_prompt\ncomplete_prompt('# Ping', 0.2)",
+    "warm_up": "import app\nfrom Utils.Warmup import warm_up\nwarm_up()",
+}
+# name -> extra environment for a gunicorn boot timed until /health answers
+GUNICORN_MODES = {
+    "gunicorn_boot": {},
+    "gunicorn_boot_warm": {"WORKER_WARMUP": "1"},
+    "gunicorn_boot_preload": {"WORKER_WARMUP": "1", "GUNICORN_PRELOAD": "1"},
+}
+MEASUREMENTS = list(SNIPPETS) + list(GUNICORN_MODES)
+
+
+def environment(base_url, scratch):
+    env = dict(os.environ)
+    env.update(
+        OPENROUTER_BASE_URL=base_url,
+        OPENAI_API_KEY="mock",
+        LLM_CACHE_ENABLED="0",
+        UPLOAD_FOLDER=os.path.join(scratch, "uploads"),
+        JOBS_DIR=os.path.join(scratch, "jobs"),
+        LLM_CACHE_DIR=os.path.join(scratch, "llm-cache")
+    )
+    return env
+
+
+def run_snippet(code, env, timeout=120):
+    out = subprocess.run(
+        [sys.executable, "-c", _CLOCK + code + _REPORT], cwd=ROOT, env=env,
+        capture_output=True, text=True, timeout=timeout
+    )
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else f"exit {out.returncode}")
+    return json.loads(out.stdout.strip().splitlines()[-1])["ms"]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def boot_gunicorn(extra_env, env, timeout=60):
+    """ms from launching gunicorn (as the Procfile does) until /health answers 200"""
+    port = _free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app:app", "--bind", f"127.0.0.1:{port}", "--workers", "1", "--timeout", "120"],
+        cwd=ROOT, env=dict(env, **extra_env), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as resp:
+                    if resp.status == 200:
+                        return (time.perf_counter() - start) * 1000
+            except OSError:
+                if process.poll() is not None:
+                    raise RuntimeError(f"gunicorn exited with {process.returncode}")
+                time.sleep(0.01)
+        raise RuntimeError(f"/health did not answer within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait(10)
+
+
+def summarise(samples):
+    samples.sort()
+    return {
+        "median_ms": round(statistics.median(samples), 2),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2),
+        "min_ms": round(samples[0], 2),
+        "samples": len(samples)
+    }
+
+
+def main():
+    import mock_openrouter
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--measurements", default=",".join(MEASUREMENTS),
+                        help="comma-separated subset of: " + ", ".join(MEASUREMENTS))
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--no-compare", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="relative slowdown flagged as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=25.0, help="ignore slowdowns smaller than this")
+    mock_openrouter.add_arguments(parser)
+    args = parser.parse_args()
+
+    selected = [m.strip() for m in args.measurements.split(",") if m.strip()]
+    unknown = [m for m in selected if m not in MEASUREMENTS]
+    if unknown:
+        parser.error(f"unknown measurements: {', '.join(unknown)}")
+    if any(name in GUNICORN_MODES for name in selected):
+        try:
+            import gunicorn  # noqa: F401
+        except ImportError:
+            print("[WARNING] gunicorn is not installed; skipping the gunicorn boot measurements")
+            selected = [name for name in selected if name not in GUNICORN_MODES]
+
+    mock = mock_openrouter.MockOpenRouter(mock_openrouter.config_from_args(args)).start()
+    scratch = tempfile.mkdtemp(prefix="bench-startup-")
+    env = environment(mock.base_url, scratch)
+    results = {}
+    try:
+        # One untimed run so every measurement sees compiled bytecode and a warm page cache
+        run_snippet(SNIPPETS["import_app_eager"], env)
+        for name in selected:
+            if name in SNIPPETS:
+                samples = [run_snippet(SNIPPETS[name], env) for _ in range(args.repeat)]
+            else:
+                samples = [boot_gunicorn(GUNICORN_MODES[name], env) for _ in range(args.repeat)]
+            results[name] = summarise(samples)
+            print(f"{name:<22} median {results[name]['median_ms']:>9.2f} ms  "
+                  f"p95 {results[name]['p95_ms']:>9.2f} ms  min {results[name]['min_ms']:>9.2f} ms")
+    finally:
+        mock.stop()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    if "import_app" in results and "import_app_eager" in results:
+        lazy, eager = results["import_app"]["median_ms"], results["import_app_eager"]["median_ms"]
+        print(f"\nlazy imports: `import app` {lazy:.0f} ms vs {eager:.0f} ms eager ({eager / lazy:.1f}x faster)")
+
+    regressions = []
+    stored = None if args.no_compare else load_baseline(args.baseline)
+    if stored is not None:
+        rows = compare(results, stored.get("startup", {}), args.tolerance, args.min_delta_ms)
+        print_report(rows)
+        regressions = [row[0] for row in rows if row[4] == "REGRESSION"]
+
+    if args.save_baseline:
+        stored = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        if stored.get("machine") != machine():
+            # Another machine's pipeline timings can't be compared with this one's
+            stored = {"machine": machine()}
+        stored.setdefault("startup", {}).update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline saved to {args.baseline}")
+
+    if regressions:
+        print(f"[ERROR] regressions in: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+The markdown -> HTML -> BeautifulSoup converter that Utils.PdfHandler used before
+Utils.MarkdownPdf, kept as the reference for bench_markdown.py.
+Needs the packages in benchmarks/requirements.txt.
+"""
+from markdown import markdown
+from bs4 import BeautifulSoup
+from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
+from reportlab.lib.units import inch
+from reportlab.lib import colors
+
+
+def parse_markdown_to_pdf(markdown_text, styles):
+    """
+    Enhanced markdown to PDF converter that preserves formatting
+    """
+    # Convert Markdown to HTML
+    html_content = markdown(markdown_text, extensions=['tables', 'nl2br'])
+    
+    # Parse HTML using BeautifulSoup
+    soup = BeautifulSoup(html_content, 'html.parser')
+    
+    elements = []
+
+    def process_element(elem):
+        """Recursively process HTML elements"""
+        if isinstance(elem, str):
+            # Text node
+            text = elem.strip()
+            if text:
+                return text
+            return ""
+        
+        if elem.name == 'h1':
+            elements.append(Spacer(1, 0.1 * inch))
+            elements.append(Paragraph(clean_text_for_pdf(elem), styles['MainHeader']))
+            elements.append(Spacer(1, 0.1 * inch))
+        
+        elif elem.name == 'h2':
+            elements.append(Spacer(1, 0.08 * inch))
+            elements.append(Paragraph(clean_text_for_pdf(elem), styles['SubHeader']))
+            elements.append(Spacer(1, 0.06 * inch))
+        
+        elif elem.name == 'h3':
+            elements.append(Spacer(1, 0.06 * inch))
+            elements.append(Paragraph(clean_text_for_pdf(elem), styles['SubSubHeader']))
+            elements.append(Spacer(1, 0.04 * inch))
+        
+        elif elem.name == 'p':
+            text_content = clean_text_for_pdf(elem)
+            if text_content.strip():
+                elements.append(Paragraph(text_content, styles['Body']))
+                elements.append(Spacer(1, 0.06 * inch))
+        
+        elif elem.name in ['ul', 'ol']:
+            elements.append(Spacer(1, 0.04 * inch))
+            for li in elem.find_all('li', recursive=False):
+                bullet = "•" if elem.name == 'ul' else f"{len(elements)}."
+                list_text = clean_text_for_pdf(li)
+                elements.append(Paragraph(f'{bullet} {list_text}', styles['BulletBody']))
+            elements.append(Spacer(1, 0.04 * inch))
+        
+        elif elem.name == 'blockquote':
+            text_content = clean_text_for_pdf(elem)
+            elements.append(Paragraph(f"<i>{text_content}</i>", styles['Body']))
+            elements.append(Spacer(1, 0.06 * inch))
+        
+        elif elem.name == 'table':
+            # Handle tables (basic implementation)
+            table_data = []
+            for row in elem.find_all('tr'):
+                row_data = []
+                for cell in row.find_all(['td', 'th']):
+                    cell_text = clean_text_for_pdf(cell)
+                    row_data.append(Paragraph(cell_text, styles['Body']))
+                table_data.append(row_data)
+            
+            if table_data:
+                table = Table(table_data)
+                table.setStyle(TableStyle([
+                    ('BOX', (0, 0), (-1, -1), 1, colors.black),
+                    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+                    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+                    ('FONTSIZE', (0, 0), (-1, -1), 10),
+                ]))
+                elements.append(table)
+                elements.append(Spacer(1, 0.1 * inch))
+        
+        elif elem.name in ['br']:
+            elements.append(Spacer(1, 0.02 * inch))
+    
+    # Process all top-level elements
+    for elem in soup.contents:
+        if hasattr(elem, 'name'):
+            process_element(elem)
+    
+    return elements
+
+def clean_text_for_pdf(element):
+    """
+    Extract text from HTML element while preserving ReportLab formatting
+    """
+    if isinstance(element, str):
+        return element.strip()
+    
+    text = ""
+    for child in element.children:
+        if isinstance(child, str):
+            text += child
+        elif child.name == 'strong' or child.name == 'b':
+            text += f"<b>{clean_text_for_pdf(child)}</b>"
+        elif child.name == 'em' or child.name == 'i':
+            text += f"<i>{clean_text_for_pdf(child)}</i>"
+        elif child.name == 'u':
+            text += f"<u>{clean_text_for_pdf(child)}</u>"
+        elif child.name == 'code':
+            text += f"<font name='Courier'>{clean_text_for_pdf(child)}</font>"
+        elif child.name == 'br':
+            text += "<br/>"
+        else:
+            # For other tags, just extract text
+            text += clean_text_for_pdf(child)
+    
+    return text.strip()
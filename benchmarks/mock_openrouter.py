@@ -0,0 +1,258 @@
+"""
+Local OpenAI-compatible stand-in for OpenRouter, so the pipeline can be run and
+benchmarked without network access or token spend. Serves POST /v1/chat/completions
+(plain and `stream: true`) with configurable time-to-first-token, token rate,
+completion length and injected errors, and GET /stats with what it served.
+
+Replies follow the section template in the prompt (its `#` headings) filled with
+filler clinical text, so downstream parsing and PDF rendering see realistic Markdown.
+
+    python benchmarks/mock_openrouter.py --port 8765 --latency lognormal:0.8,0.4 --tokens-per-second 80
+    OPENROUTER_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=mock python app.py
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FILLER = (
+    "Patient is hemodynamically stable with no acute distress. Findings are consistent with the "
+    "documented history and current medications. Recommend follow-up in two weeks with repeat "
+    "labs, continued monitoring of symptoms and review of the treatment plan at the next visit."
+).split()
+
+_HEADING = re.compile(r"^(#{1,3} [A-Z][^\n]*)$", re.MULTILINE)
+
+
+def parse_latency(spec):
+    """
+    "fixed:S", "uniform:LOW,HIGH", "normal:MEAN,SD" or "lognormal:MEDIAN,SIGMA" (seconds)
+    -> a function of a random.Random returning one time-to-first-token sample
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        import math
+        mu = math.log(values[0])
+        return lambda rng: rng.lognormvariate(mu, values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class MockConfig:
+    def __init__(self, latency="fixed:0.05", tokens_per_second=2000.0, completion_tokens=400,
+                 error_rate=0.0, error_statuses=(429, 500, 503), retry_after=1, seed=0):
+        self.latency_spec = latency
+        self.latency = parse_latency(latency)
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.retry_after = retry_after
+        self.seed = seed
+
+    def to_dict(self):
+        return {
+            "latency": self.latency_spec,
+            "tokens_per_second": self.tokens_per_second,
+            "completion_tokens": self.completion_tokens,
+            "error_rate": self.error_rate,
+            "error_statuses": list(self.error_statuses),
+            "seed": self.seed
+        }
+
+
+def compose_reply(prompt, tokens, rng):
+    """About `tokens` tokens of Markdown following the prompt's heading template"""
+    headings = list(dict.fromkeys(_HEADING.findall(prompt))) or ["## ASSESSMENT"]
+    words_per_section = max(8, int(tokens * 0.75) // len(headings))
+    parts = []
+    for heading in headings:
+        offset = rng.randrange(len(FILLER))
+        words = [FILLER[(offset + i) % len(FILLER)] for i in range(words_per_section)]
+        half = len(words) // 2
+        parts.append(
+            f"{heading}\n{' '.join(words[:half]).capitalize()}.\n"
+            f"- **Finding:** {' '.join(words[half:half + 8])}\n"
+            f"- {' '.join(words[half + 8:])}"
+        )
+    return "\n\n".join(parts)
+
+
+class MockOpenRouter:
+    """The HTTP server plus its counters; start() serves from a daemon thread"""
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or MockConfig()
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "streamed": 0, "errors_injected": 0,
+                         "prompt_tokens": 0, "completion_tokens": 0}
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="mock-openrouter", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, config=self.config.to_dict())
+
+    def _draw(self):
+        # One lock-protected draw per request keeps runs reproducible for a given seed
+        with self._lock:
+            rng = random.Random(self._rng.random())
+            fail = self._rng.random() < self.config.error_rate
+            status = self._rng.choice(self.config.error_statuses) if fail else None
+        return rng, status
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _json(self, status, payload, headers=None):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/stats"):
+                    return self._json(200, mock.stats())
+                self._json(404, {"error": {"message": "not found"}})
+
+            def do_HEAD(self):
+                # Answered on a kept-alive connection, like the real API (Utils.Warmup opens connections this way)
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    return self._json(404, {"error": {"message": "not found"}})
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                prompt = "\n".join(str(m.get("content", "")) for m in request.get("messages", []))
+                config, (rng, status) = mock.config, mock._draw()
+                with mock._lock:
+                    mock.counters["requests"] += 1
+
+                time.sleep(config.latency(rng))
+                if status is not None:
+                    with mock._lock:
+                        mock.counters["errors_injected"] += 1
+                    headers = {"Retry-After": str(config.retry_after)} if status == 429 else None
+                    return self._json(status, {"error": {"message": f"injected {status}", "code": status}}, headers)
+
+                text = compose_reply(prompt, config.completion_tokens, rng)
+                usage = {
+                    "prompt_tokens": len(prompt) // 4 + 1,
+                    "completion_tokens": config.completion_tokens,
+                    "total_tokens": len(prompt) // 4 + 1 + config.completion_tokens
+                }
+                with mock._lock:
+                    mock.counters["prompt_tokens"] += usage["prompt_tokens"]
+                    mock.counters["completion_tokens"] += usage["completion_tokens"]
+                base = {"id": f"mock-{rng.getrandbits(32):08x}", "created": int(time.time()),
+                        "model": request.get("model", "mock")}
+
+                if not request.get("stream"):
+                    time.sleep(config.completion_tokens / config.tokens_per_second)
+                    return self._json(200, dict(base, object="chat.completion", usage=usage, choices=[{
+                        "index": 0, "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": text}
+                    }]))
+
+                with mock._lock:
+                    mock.counters["streamed"] += 1
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                words = text.split(" ")
+                # ~0.75 words per token
+                delay = 1 / (config.tokens_per_second * 0.75)
+                for index, word in enumerate(words):
+                    piece = word if index == 0 else " " + word
+                    self._event(dict(base, object="chat.completion.chunk", choices=[
+                        {"index": 0, "delta": {"content": piece}, "finish_reason": None}
+                    ]))
+                    time.sleep(delay)
+                if (request.get("stream_options") or {}).get("include_usage"):
+                    self._event(dict(base, object="chat.completion.chunk", choices=[], usage=usage))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+            def _event(self, payload):
+                self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+        return Handler
+
+
+def add_arguments(parser):
+    parser.add_argument("--latency", default="fixed:0.05",
+                        help="time to first token: fixed:S, uniform:LOW,HIGH, normal:MEAN,SD or lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--tokens-per-second", type=float, default=2000.0)
+    parser.add_argument("--completion-tokens", type=int, default=400)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with an error")
+    parser.add_argument("--error-statuses", default="429,500,503")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def config_from_args(args):
+    return MockConfig(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate,
+        error_statuses=[int(s) for s in args.error_statuses.split(",") if s],
+        seed=args.seed
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible mock of OpenRouter")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+    mock = MockOpenRouter(config_from_args(args), host=args.host, port=args.port)
+    print(f"Mock OpenRouter listening on {mock.base_url} ({json.dumps(mock.config.to_dict())})")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Test settings, applied before anything under Utils is imported: LLM calls go to the
+local OpenRouter mock from benchmarks/, storage goes to a throwaway directory, and
+PDFs are rendered in-process.
+"""
+import os
+import sys
+import shutil
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from mock_openrouter import MockConfig, MockOpenRouter  # noqa: E402
+
+SCRATCH = tempfile.mkdtemp(prefix="medical-tests-")
+MOCK = MockOpenRouter(MockConfig(latency="fixed:0.01", tokens_per_second=100000.0, completion_tokens=200)).start()
+
+os.environ.update(
+    OPENROUTER_BASE_URL=MOCK.base_url,
+    OPENAI_API_KEY="mock",
+    UPLOAD_FOLDER=os.path.join(SCRATCH, "uploads"),
+    JOBS_DIR=os.path.join(SCRATCH, "jobs"),
+    RENDER_WORKERS="0",
+    LLM_CACHE_ENABLED="0",
+    LLM_HEDGE_ENABLED="0",
+    LLM_RETRY_BASE_SECONDS="0.01",
+    LLM_RPM="100000",
+    LLM_TPM="1000000000"
+)
+
+SAMPLE_PDF = os.path.join(ROOT, "CaseReportExample.pdf")
+
+
+def pytest_unconfigure(config):
+    MOCK.stop()
+    shutil.rmtree(SCRATCH, ignore_errors=True)
@@ -0,0 +1,36 @@
+# Read by gunicorn from the working directory; the Procfile's command-line flags
+# (bind, workers, timeout) still take precedence over anything set here.
+import os
+
+# GUNICORN_PRELOAD=1: import the app once in the master and fork workers from it,
+# so a new worker starts with everything the master loaded already in memory
+preload_app = os.getenv("GUNICORN_PRELOAD", "0").lower() in ("1", "true", "yes")
+if preload_app:
+    # app.py leaves its threads to post_worker_init below
+    os.environ["DEFER_BACKGROUND_SERVICES"] = "1"
+
+
+def warmup_enabled():
+    return os.getenv("WORKER_WARMUP", "0").lower() in ("1", "true", "yes")
+
+
+def when_ready(server):
+    # Master, after the preloaded app is imported and before the first fork: load and
+    # prime the fork-safe parts once (no sockets, no threads) for every worker to inherit
+    if preload_app and warmup_enabled():
+        from Utils.Warmup import warm_up
+        warm_up(connections=False)
+
+
+def post_worker_init(worker):
+    import app as app_module
+    if preload_app:
+        app_module.start_background_services()
+    # Spawn and warm the PDF render workers now rather than on the first report;
+    # app.py never does this on import
+    app_module.render_service.start()
+    # WORKER_WARMUP=1: pay for imports, fonts and the first TLS handshakes before
+    # the worker takes requests rather than on its first /process-complete
+    if warmup_enabled():
+        from Utils.Warmup import warm_up
+        warm_up()
@@ -0,0 +1,64 @@
+import pytest
+
+from Utils.Agents import BaseAgent, Cardiologist, parse_agent_timeouts, agent_deadline
+
+
+def test_split_batch_response_maps_each_assessment_to_its_case():
+    reply = """Some preamble the model was told not to write.
+=== ASSESSMENT 1 ===
+First case findings.
+
+=== ASSESSMENT 2 ===
+Second case findings.
+"""
+    assert BaseAgent.split_batch_response(reply, 2) == {1: "First case findings.", 2: "Second case findings."}
+
+
+def test_split_batch_response_ignores_malformed_sections():
+    reply = """=== ASSESSMENT 1 ===
+Kept.
+=== ASSESSMENT 1 ===
+A repeated number keeps the first one.
+=== ASSESSMENT 2 ===
+
+=== ASSESSMENT 7 ===
+Out of range.
+"""
+    # Case 2 is empty and case 7 doesn't exist: both are left for a retry on their own
+    assert BaseAgent.split_batch_response(reply, 3) == {1: "Kept."}
+    assert BaseAgent.split_batch_response("", 2) == {}
+    assert BaseAgent.split_batch_response(None, 2) == {}
+
+
+def test_split_batch_response_reads_its_own_prompt_format():
+    prompt = Cardiologist.build_batch_prompt(["report one", "report two"])
+    assert "=== CASE 1 START ===\nreport one\n=== CASE 1 END ===" in prompt
+    assert "=== ASSESSMENT <n> ===" in prompt
+
+
+def test_pack_batches_respects_token_budget_and_case_limit():
+    reports = ["x" * 4000] * 10
+    batches = Cardiologist.pack_batches(reports, token_budget=5000, max_cases=8)
+    assert [index for batch in batches for index in batch] == list(range(10))
+    assert all(1 <= len(batch) <= 4 for batch in batches)
+    assert Cardiologist.pack_batches(["short"] * 5, token_budget=100000, max_cases=2) == [[0, 1], [2, 3], [4]]
+
+
+def test_parse_agent_timeouts_accepts_known_roles_in_any_case():
+    assert parse_agent_timeouts(None) == {}
+    assert parse_agent_timeouts({"Cardiologist": 45, "psychologist": 2.5}) == {"cardiologist": 45.0, "psychologist": 2.5}
+    assert agent_deadline("Cardiologist", parse_agent_timeouts({"CARDIOLOGIST": 12})) == 12.0
+
+
+@pytest.mark.parametrize("timeouts", [
+    [30],
+    {"dentist": 30},
+    {"cardiologist": "abc"},
+    {"cardiologist": 0},
+    {"cardiologist": -5},
+    {"cardiologist": True},
+    {"cardiologist": float("inf")},
+])
+def test_parse_agent_timeouts_rejects_bad_entries(timeouts):
+    with pytest.raises(ValueError):
+        parse_agent_timeouts(timeouts)
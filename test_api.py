@@ -0,0 +1,77 @@
+import io
+
+import pytest
+
+from conftest import MOCK, SAMPLE_PDF
+
+
+@pytest.fixture(scope="module")
+def client():
+    import app
+    return app.app.test_client()
+
+
+def upload(client, name="report.pdf"):
+    with open(SAMPLE_PDF, "rb") as f:
+        data = {"file": (io.BytesIO(f.read()), name)}
+    return client.post("/upload-pdf", data=data, content_type="multipart/form-data")
+
+
+def test_health(client):
+    response = client.get("/health")
+    assert response.status_code == 200
+    assert response.get_json()["status"] == "healthy"
+
+
+def test_upload_rejects_missing_and_non_pdf_files(client):
+    assert client.post("/upload-pdf", data={}, content_type="multipart/form-data").status_code == 400
+    response = client.post(
+        "/upload-pdf", data={"file": (io.BytesIO(b"hello"), "notes.txt")}, content_type="multipart/form-data"
+    )
+    assert response.status_code == 400
+
+
+def test_upload_deduplicates_identical_files(client):
+    first = upload(client, "first.pdf").get_json()
+    second = upload(client, "second.pdf").get_json()
+    assert first["sha256"] == second["sha256"]
+    assert second["deduplicated"] is True
+    assert first["file_path"] != second["file_path"]
+
+
+def test_extract_text(client):
+    path = upload(client).get_json()["file_path"]
+    response = client.post("/extract-text", json={"path": path})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["raw_text"].strip()
+    assert body["text_length"] == len(body["raw_text"])
+    assert client.post("/extract-text", json={"path": "/nonexistent.pdf"}).status_code == 404
+    assert client.post("/extract-text", json={}).status_code == 400
+
+
+@pytest.mark.parametrize("endpoint", ["/process-complete", "/jobs"])
+@pytest.mark.parametrize("timeouts", [{"cardiologist": "abc"}, {"cardiologist": 0}, {"dentist": 30}, [30]])
+def test_bad_agent_timeouts_are_rejected_before_any_work(client, endpoint, timeouts):
+    requests_before = MOCK.stats()["requests"]
+    response = client.post(endpoint, json={"pdf_path": SAMPLE_PDF, "agent_timeouts": timeouts})
+    assert response.status_code == 400
+    assert "agent_timeouts" in response.get_json()["error"]
+    assert MOCK.stats()["requests"] == requests_before
+
+
+def test_process_complete_returns_a_pdf(client):
+    path = upload(client).get_json()["file_path"]
+    response = client.post("/process-complete", json={"pdf_path": path, "agent_timeouts": {"cardiologist": 30}})
+    assert response.status_code == 200, response.get_data(as_text=True)[:200]
+    assert response.mimetype == "application/pdf"
+    assert response.data.startswith(b"%PDF")
+    assert "X-Agent-Timings" in response.headers
+
+
+def test_stats_endpoints(client):
+    for endpoint in ("/cache-stats", "/llm-stats", "/render-stats"):
+        assert client.get(endpoint).status_code == 200
+    assert client.get("/cache-stats").get_json()["llm"]["disk_enabled"] is False
+    assert client.get("/metrics").status_code == 200
+    assert client.get("/no-such-endpoint").status_code == 404
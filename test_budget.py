@@ -0,0 +1,56 @@
+from Utils.Budget import PromptBudget, compact, running_lines
+
+
+def heuristic_budget(**limits):
+    return PromptBudget(limits, tokenizer="heuristic")
+
+
+VITALS = "Blood pressure:\n150/95\nPain score\n8/10\nHeart rate:\n  72  bpm"
+
+
+def test_prompts_within_budget_are_untouched():
+    budget = heuristic_budget(specialist=1000, summary=1000)
+    text, report = budget.fit("specialist", "## VITALS\n" + VITALS + "\n\n\n## PLAN\nReview.")
+    assert text == "## VITALS\n" + VITALS + "\n\n\n## PLAN\nReview."
+    assert report["action"] == "none"
+    parts, report = budget.fit_parts("summary", {"a": VITALS})
+    assert parts == {"a": VITALS} and report["action"] == "none"
+
+
+def test_compaction_keeps_clinical_values():
+    compacted = compact(VITALS + "\n\n\n\nPage 2 of 3", raw=True)
+    assert "150/95" in compacted and "8/10" in compacted
+    assert "Page 2 of 3" not in compacted
+    assert "Heart rate:\n72 bpm" in compacted
+    # Only raw PDF text loses page markers
+    assert "Page 2" in compact("Page 2")
+
+
+def test_running_lines_are_those_on_every_page():
+    pages = [
+        "St Mary's Hospital - Cardiology\nHPI: chest pain\nNo fever.\nConfidential",
+        "St Mary's Hospital - Cardiology\nNo fever.\nExam: normal\nConfidential",
+        "St Mary's Hospital - Cardiology\nPlan: review\nConfidential",
+    ]
+    running = running_lines(pages)
+    # "No fever." repeats, but not on every page
+    assert running == {"St Mary's Hospital - Cardiology", "Confidential"}
+    text = compact("\n".join(pages), raw=True, running=running)
+    assert text.count("St Mary's Hospital - Cardiology") == 1
+    assert text.count("No fever.") == 2
+    assert running_lines(pages[:1]) == set()
+
+
+def test_over_budget_raw_text_is_compacted_then_reported_over():
+    budget = heuristic_budget(structure=20)
+    text = ("Findings 150/95\n\n\n\nPage 1 of 2\n" * 10).strip()
+    parts, report = budget.fit_parts("structure", {"text": text}, trim=False, raw=True)
+    assert "Page 1" not in parts["text"] and parts["text"].count("150/95") == 10
+    assert report["action"] == "over"
+
+
+def test_stats_say_whether_counts_are_estimates():
+    budget = heuristic_budget(summary=10)
+    assert budget.count("abcdefgh") == 3
+    assert budget.stats()["exact_counts"] is False
+    assert budget.stats()["tokenizer"] == "heuristic"
@@ -0,0 +1,19 @@
+from Utils.Cache import DiskCache
+
+
+def test_disabled_cache_always_misses(tmp_path):
+    cache = DiskCache(None)
+    cache.set("key", "value")
+    assert not cache.enabled and cache.get("key") is None
+
+
+def test_overwriting_a_key_counts_only_the_size_difference(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1000)
+    cache.set("other", "x" * 100)
+    for _ in range(20):
+        cache.set("key", "y" * 300)
+    cache.set("key", "z" * 200)
+    assert cache._size == cache._scan_size() == 300
+    # Rewriting the same key never pushed the cache over its budget
+    assert cache.evictions == 0
+    assert cache.get("other") == "x" * 100
@@ -0,0 +1,41 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from Utils import Extraction
+from Utils.Extraction import iter_pdf_pages, PdfTooLarge
+
+# Not imported from conftest: spawned workers import this module too
+SAMPLE_PDF = os.path.join(os.path.dirname(os.path.abspath(__file__)), "CaseReportExample.pdf")
+
+
+def _state_in_a_worker(pdf_path):
+    # Runs in a spawned worker, which imports app the way `python app.py`'s workers do
+    import app
+    pages = list(iter_pdf_pages(pdf_path, parallel=True))
+    return {
+        "evictor": app.upload_store._evictor is not None,
+        "metrics_flusher": app.metrics._flusher is not None,
+        "extraction_pool": Extraction._pool is not None,
+        "pages": len(pages)
+    }
+
+
+def test_parallel_and_serial_extraction_agree():
+    serial = list(iter_pdf_pages(SAMPLE_PDF, parallel=False))
+    assert serial and list(iter_pdf_pages(SAMPLE_PDF, parallel=True)) == serial
+
+
+def test_text_limit_is_enforced():
+    with pytest.raises(PdfTooLarge):
+        list(iter_pdf_pages(SAMPLE_PDF, max_bytes=10))
+
+
+def test_spawned_workers_start_no_threads_or_pools(tmp_path, monkeypatch):
+    monkeypatch.setenv("METRICS_DIR", str(tmp_path / "metrics"))
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        state = pool.submit(_state_in_a_worker, SAMPLE_PDF).result(timeout=120)
+    assert state["pages"] > 0
+    assert not state["evictor"] and not state["metrics_flusher"] and not state["extraction_pool"]
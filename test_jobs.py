@@ -0,0 +1,60 @@
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from Utils import Jobs
+from Utils.Jobs import JobManager
+
+
+@pytest.fixture
+def webhook():
+    """A receiver that holds every request until `release` is set"""
+    release, received = threading.Event(), []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            received.append(self.path)
+            release.wait(10)
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}", release, received
+    release.set()
+    server.shutdown()
+
+
+def wait_until(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_a_slow_webhook_does_not_hold_the_job_worker(tmp_path, monkeypatch, webhook):
+    url, release, received = webhook
+    monkeypatch.setattr(Jobs, "run_pipeline", lambda *args, **kwargs: {
+        "structured_report": "", "structuring": {}, "agent_responses": {}, "final_summary": "",
+        "agent_timings": {}, "routing": {}, "stage_timings": {}
+    })
+    manager = JobManager(workers=1, artifact_dir=str(tmp_path))
+    first = manager.submit("a.pdf", callback_url=f"{url}/first")
+    assert wait_until(lambda: received == ["/first"])
+
+    # The only job worker is free again while the first webhook is still waiting
+    second = manager.submit("b.pdf")
+    assert wait_until(lambda: manager.snapshot(second.id)["status"] == "succeeded")
+    assert manager.snapshot(first.id)["callback"] is None
+
+    release.set()
+    assert wait_until(lambda: manager.snapshot(first.id)["callback"] is not None)
+    assert manager.snapshot(first.id)["callback"] == {"status_code": 204, "attempts": 1}
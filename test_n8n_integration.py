@@ -0,0 +1,108 @@
+"""
+The calls an n8n workflow makes (see N8N_INTEGRATION_GUIDE.md), against the app
+in-process with the local OpenRouter mock standing in for the LLM:
+
+    python -m pytest test_n8n_integration.py      (or: python test_n8n_integration.py)
+"""
+import io
+import sys
+import time
+
+import pytest
+
+from conftest import SAMPLE_PDF
+
+N8N_ITEM = {
+    "structured_report": "# Patient Medical Report\n\n## Patient Information\n- **Name**: John Doe\n- **Age**: 54",
+    "cardiologist": "# Cardiologist Assessment\n\n## Clinical Findings\n- Blood pressure 150/95\n- **ECG**: sinus rhythm",
+    "psychologist": "# Psychological Assessment\n\n## Mental Status\nAlert, mildly anxious.",
+    "pulmonologist": "# Pulmonology Assessment\n\n## Respiratory Examination\n| Test | Result |\n|---|---|\n| SpO2 | 97% |",
+    "final_summary": "# Multidisciplinary Team Summary\n\n## Consensus Diagnosis\n1. Hypertension\n2. Anxiety"
+}
+
+
+@pytest.fixture(scope="module")
+def client():
+    import app
+    return app.app.test_client()
+
+
+def test_generate_pdf_from_an_n8n_item_list(client):
+    # n8n sends its items as a one-element array
+    response = client.post("/generate-pdf", json=[N8N_ITEM])
+    assert response.status_code == 200, response.get_data(as_text=True)[:200]
+    assert response.mimetype == "application/pdf"
+    assert response.data.startswith(b"%PDF")
+
+
+def test_generate_pdf_reports_missing_fields(client):
+    item = dict(N8N_ITEM)
+    del item["psychologist"]
+    response = client.post("/generate-pdf", json=item)
+    assert response.status_code == 400
+    assert "psychologist" in response.get_json()["error"]
+    assert client.post("/generate-pdf", json="not an object").status_code == 400
+
+
+def test_step_by_step_workflow(client):
+    with open(SAMPLE_PDF, "rb") as f:
+        uploaded = client.post(
+            "/upload-and-extract", data={"file": (io.BytesIO(f.read()), "case.pdf")},
+            content_type="multipart/form-data"
+        )
+    assert uploaded.status_code == 200, uploaded.get_data(as_text=True)[:200]
+    raw_text = uploaded.get_json()["raw_text"]
+
+    structured = client.post("/structure-report", json={"text": raw_text})
+    assert structured.status_code == 200, structured.get_data(as_text=True)[:200]
+    report = structured.get_json()["structured_report"]
+
+    assessments = {}
+    for role in ("cardiologist", "psychologist", "pulmonologist"):
+        response = client.post(f"/run-agent/{role}", json={"text": report})
+        assert response.status_code == 200, response.get_data(as_text=True)[:200]
+        assessments[role] = response.get_json()["assessment"]
+        assert assessments[role]
+
+    summary = client.post("/multidisciplinary-summary", json=dict(assessments))
+    assert summary.status_code == 200, summary.get_data(as_text=True)[:200]
+
+    pdf = client.post("/generate-pdf", json=[dict(
+        assessments, structured_report=report, final_summary=summary.get_json()["summary"]
+    )])
+    assert pdf.status_code == 200
+    assert pdf.data.startswith(b"%PDF")
+
+
+def wait_for(client, job_id, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}").get_json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish within {timeout}s")
+
+
+def test_queued_job_runs_to_a_downloadable_report(client):
+    submitted = client.post("/jobs", json={"pdf_path": SAMPLE_PDF, "force_all_specialists": True})
+    assert submitted.status_code == 202, submitted.get_data(as_text=True)[:200]
+    job_id = submitted.get_json()["job_id"]
+
+    job = wait_for(client, job_id)
+    assert job["status"] == "succeeded", job["error"]
+    assert all(stage["status"] in ("done", "skipped") for stage in job["stages"].values()), job["stages"]
+    assert set(job["result"]["assessments"]) == {"Cardiologist", "Psychologist", "Pulmonologist"}
+
+    report = client.get(f"/jobs/{job_id}/report")
+    assert report.status_code == 200
+    assert report.data.startswith(b"%PDF")
+
+
+def test_unknown_job(client):
+    assert client.get("/jobs/does-not-exist").status_code == 404
+    assert client.get("/jobs/does-not-exist/report").status_code == 404
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
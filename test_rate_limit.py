@@ -0,0 +1,173 @@
+import time
+import threading
+
+import openai
+import pytest
+
+from Utils.RateLimit import (
+    TokenBucket, RateLimiter, Abandonment, AttemptAbandoned, classify_error, retry_after_seconds
+)
+from Utils.Resilience import ResilientCaller
+from Utils.Transport import _httpx
+
+httpx = _httpx()
+
+
+class ApiError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": headers or {}})()
+
+
+class Result:
+    def __init__(self, total_tokens):
+        self.usage = type("Usage", (), {"total_tokens": total_tokens})()
+
+
+def test_token_bucket_waits_for_refill_and_runs_into_debt():
+    bucket = TokenBucket(rate_per_minute=60)
+    assert bucket.wait_time(60) == 0.0
+    bucket.consume(60)
+    # One unit per second
+    assert bucket.wait_time(1) == pytest.approx(1.0, abs=0.05)
+    bucket.consume(30)
+    assert bucket.tokens < 0
+    assert bucket.wait_time(1) == pytest.approx(31.0, abs=0.1)
+    # A request bigger than the bucket only waits for a full bucket
+    assert TokenBucket(rate_per_minute=60).wait_time(1000) == 0.0
+
+
+def test_classify_error_and_retry_after():
+    assert classify_error(ApiError(429)) == "throttled"
+    assert classify_error(ApiError(400)) == "client"
+    assert classify_error(ApiError(503)) == "error"
+    assert classify_error(httpx.ConnectTimeout("timed out")) == "error"
+    assert classify_error(openai.APITimeoutError(request=httpx.Request("POST", "http://llm"))) == "error"
+    assert classify_error(KeyError("choices")) == "fatal"
+    assert classify_error(TimeoutError()) == "fatal"
+    assert retry_after_seconds(ApiError(429, {"retry-after": "3"})) == 3.0
+    assert retry_after_seconds(ApiError(429, {"retry-after-ms": "250"})) == 0.25
+    assert retry_after_seconds(ApiError(429), default=5) == 5
+
+
+def test_throttle_pauses_every_caller_until_retry_after():
+    limiter = RateLimiter(rpm=100000, tpm=10 ** 9, initial_concurrency=4)
+
+    def throttled():
+        raise ApiError(429, {"retry-after": "0.3"})
+
+    with pytest.raises(ApiError):
+        limiter.call(throttled, max_throttle_retries=0)
+    assert limiter.stats()["throttled"] == 1
+    assert limiter.stats()["paused_for_seconds"] > 0
+    started = time.monotonic()
+    limiter.call(lambda: Result(10))
+    assert time.monotonic() - started >= 0.25
+
+
+def test_throttle_retries_are_bounded():
+    limiter = RateLimiter(rpm=100000, tpm=10 ** 9, default_retry_after=0.01)
+    calls = []
+
+    def throttled():
+        calls.append(1)
+        raise ApiError(429)
+
+    with pytest.raises(ApiError):
+        limiter.call(throttled, max_throttle_retries=2)
+    assert len(calls) == 3
+    calls.clear()
+    with pytest.raises(ApiError):
+        limiter.call(throttled, max_throttle_retries=0)
+    assert len(calls) == 1
+
+
+def complete(limiter, latency):
+    limiter.acquire()
+    limiter.release(time.monotonic() - latency, "ok")
+
+
+def test_aimd_adds_one_per_window_and_cuts_on_failures():
+    limiter = RateLimiter(rpm=100000, tpm=10 ** 9, initial_concurrency=4, max_concurrency=16)
+    # The first call only sets the latency baseline; then +1/limit per success,
+    # about +1 after a window of `limit` calls
+    for _ in range(5):
+        complete(limiter, 0.1)
+    assert 4.8 <= limiter.limit <= 5.0
+    limit = limiter.limit
+    limiter.release(limiter.acquire(), "error")
+    assert limiter.limit == pytest.approx(limit * 0.7)
+    limit = limiter.limit
+    limiter.release(limiter.acquire(), "throttled", retry_after=0)
+    assert limiter.limit == pytest.approx(limit * 0.5)
+    for _ in range(10):
+        limiter.release(limiter.acquire(), "throttled", retry_after=0)
+    assert limiter.limit == limiter.min_concurrency
+
+
+def test_aimd_backs_off_when_latency_climbs():
+    limiter = RateLimiter(rpm=100000, tpm=10 ** 9, initial_concurrency=8, latency_tolerance=2.0)
+    for _ in range(5):
+        complete(limiter, 0.1)
+    limit = limiter.limit
+    for _ in range(3):
+        complete(limiter, 1.0)
+    assert limiter.limit < limit
+
+
+def test_concurrency_limit_holds_callers_back():
+    limiter = RateLimiter(rpm=100000, tpm=10 ** 9, initial_concurrency=1, max_concurrency=1)
+    started = limiter.acquire()
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+    thread.start()
+    assert not acquired.wait(0.2)
+    limiter.release(started, "cancelled")
+    assert acquired.wait(1)
+    thread.join()
+
+
+def test_token_usage_corrects_the_estimate():
+    limiter = RateLimiter(rpm=100000, tpm=10000)
+    limiter.call(lambda: Result(3000), estimated_tokens=1000)
+    assert limiter.tokens.tokens == pytest.approx(7000, abs=5)
+
+
+def test_abandoned_attempt_frees_its_slot_or_never_starts():
+    limiter = RateLimiter(rpm=100000, tpm=10 ** 9, initial_concurrency=4)
+    abandoned = Abandonment()
+    with limiter.slot(10, abandoned):
+        assert limiter.in_flight == 1
+        abandoned.set()
+        assert limiter.in_flight == 0
+    # Leaving the block doesn't release it a second time or count the result
+    assert limiter.in_flight == 0
+    assert limiter.completed == 0
+
+    with pytest.raises(AttemptAbandoned):
+        limiter.call(lambda: Result(10), abandoned=abandoned)
+    assert limiter.requests.tokens == pytest.approx(limiter.requests.capacity - 1, abs=1)
+
+
+def test_bugs_are_not_retried_or_held_against_the_provider():
+    limiter = RateLimiter(rpm=100000, tpm=10 ** 9, initial_concurrency=4)
+    caller = ResilientCaller(max_retries=2, base_delay=0.01, hedge_enabled=False)
+    calls = []
+
+    def attempt(fails_with):
+        def request():
+            calls.append(1)
+            raise fails_with
+        return lambda abandoned: limiter.call(request, max_throttle_retries=0, abandoned=abandoned)
+
+    with pytest.raises(KeyError):
+        caller.call(attempt(KeyError("choices")))
+    assert len(calls) == 1
+    assert limiter.limit == 4 and limiter.errors == 0 and limiter.in_flight == 0
+
+    calls.clear()
+    with pytest.raises(ApiError):
+        caller.call(attempt(ApiError(503)))
+    assert len(calls) == 3
+    assert limiter.errors == 3 and limiter.limit < 4
@@ -0,0 +1,35 @@
+import os
+import signal
+
+import pytest
+from concurrent.futures.process import BrokenProcessPool
+
+from Utils.RenderService import RenderService
+
+REPORT = ("# Patient Medical Report\n- ok", {"Cardiologist": "- ok"}, "# Summary\n- ok")
+
+
+@pytest.fixture
+def service():
+    service = RenderService(workers=1, max_pending=2, timeout=60)
+    yield service
+    if service._pool is not None:
+        service._pool.shutdown(cancel_futures=True)
+
+
+def test_start_can_wait_for_warm_workers(service):
+    service.start(wait=True)
+    assert len(service._pool._processes) == 1
+    assert service.render(*REPORT).getvalue().startswith(b"%PDF")
+
+
+def test_a_broken_pool_is_shut_down_and_replaced(service):
+    service.start(wait=True)
+    broken = service._pool
+    future = broken.submit(os.getpid)
+    os.kill(future.result(timeout=30), signal.SIGKILL)
+    with pytest.raises(BrokenProcessPool):
+        broken.submit(os.getpid).result(timeout=30)
+    # The next render gets a fresh pool
+    assert service.render(*REPORT).getvalue().startswith(b"%PDF")
+    assert service._pool is not broken
@@ -0,0 +1,69 @@
+from Utils.Routing import SpecialistRouter
+
+
+def report(**sections):
+    return "\n\n".join(f"## {heading.replace('_', ' ')}\n{body}" for heading, body in sections.items())
+
+
+def test_negated_findings_do_not_count():
+    router = SpecialistRouter()
+    scores = router.score(report(
+        CHIEF_COMPLAINT="Patient denies chest pain and palpitations.",
+        REVIEW_OF_SYSTEMS="Negative for cough or wheezing."
+    ))
+    assert scores["Cardiologist"] == (0.0, [])
+    assert scores["Pulmonologist"] == (0.0, [])
+
+
+def test_a_later_unnegated_mention_still_counts():
+    router = SpecialistRouter()
+    score, matched = router.score(report(
+        CHIEF_COMPLAINT="No fever. Crushing chest pain since this morning."
+    ))["Cardiologist"]
+    assert matched == ["chest pain"]
+    assert score == 3.0
+
+
+def test_specialists_below_threshold_are_skipped_with_a_reason():
+    router = SpecialistRouter(threshold=2.0)
+    decisions = router.route(report(
+        CHIEF_COMPLAINT="Chest pain on exertion.",
+        FAMILY_HISTORY="Mother had asthma."
+    ))
+    assert decisions["Cardiologist"]["run"] is True
+    # A family history mention only weighs 0.5
+    assert decisions["Pulmonologist"]["run"] is False
+    assert decisions["Pulmonologist"]["score"] == 0.5
+    assert "below threshold" in decisions["Pulmonologist"]["reason"]
+    assert decisions["Psychologist"] == {
+        "run": False, "score": 0.0, "matched": [], "reason": "no relevant findings in the report"
+    }
+
+
+def test_section_weights_decide_the_threshold():
+    text = report(PAST_MEDICAL_HISTORY="Hypertension.")
+    assert SpecialistRouter(threshold=1.0).route(text)["Cardiologist"]["run"] is True
+    decisions = SpecialistRouter(threshold=1.5).route(text)
+    # Nobody clears the bar, so nobody is skipped
+    assert all(decision["run"] for decision in decisions.values())
+    assert decisions["Cardiologist"]["reason"] == "no specialty cleared the threshold; consulting all"
+
+
+def test_forced_or_disabled_routing_runs_everyone():
+    text = report(CHIEF_COMPLAINT="Chest pain.")
+    forced = SpecialistRouter().route(text, force_all=True)
+    assert all(decision["run"] and decision["reason"] == "forced" for decision in forced.values())
+    disabled = SpecialistRouter(enabled=False).route(text)
+    assert all(decision["reason"] == "routing disabled" for decision in disabled.values())
+
+
+def test_negation_stops_at_a_clause_break():
+    router = SpecialistRouter()
+    scores = router.score(report(
+        CHIEF_COMPLAINT="No chest pain but palpitations since yesterday.",
+        REVIEW_OF_SYSTEMS="Denies fever, reports wheezing at night."
+    ))
+    assert scores["Cardiologist"][1] == ["palpitation"]
+    assert scores["Pulmonologist"][1] == ["wheez"]
+    # "and"/"or" lists stay negated
+    assert router.score(report(REVIEW_OF_SYSTEMS="Denies cough or wheezing."))["Pulmonologist"] == (0.0, [])
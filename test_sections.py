@@ -0,0 +1,93 @@
+from Utils.Sections import detect_sections, merge_sections, render_sections, CANONICAL_SECTIONS
+
+
+SAMPLE = """Clinic Letter
+
+Patient Name: Jane Roe
+Age: 54
+Date: 2024-03-01
+
+CHIEF COMPLAINT
+Chest pain on exertion for two weeks.
+
+## History of Present Illness
+Pain radiates to the left arm. No fever.
+
+**Medications:** atorvastatin 20 mg
+Allergies: penicillin
+
+Clinical Impression: stable angina
+Plan:
+Stress test and review in two weeks.
+"""
+
+
+def test_detect_sections_recognises_heading_styles():
+    result = detect_sections(SAMPLE)
+    sections = result["sections"]
+    assert list(sections) == [
+        "PATIENT INFORMATION", "CHIEF COMPLAINT", "HISTORY OF PRESENT ILLNESS",
+        "MEDICATIONS", "ALLERGIES", "ASSESSMENT/IMPRESSION", "PLAN"
+    ]
+    assert "Patient Name: Jane Roe" in sections["PATIENT INFORMATION"]
+    assert sections["CHIEF COMPLAINT"] == "Chest pain on exertion for two weeks."
+    assert sections["MEDICATIONS"] == "atorvastatin 20 mg"
+    assert sections["ALLERGIES"] == "penicillin"
+    assert sections["ASSESSMENT/IMPRESSION"] == "stable angina"
+    assert sections["PLAN"] == "Stress test and review in two weeks."
+    # Only the title line before the first section is left out
+    assert result["coverage"] > 0.9
+
+
+def test_detect_sections_keeps_labelled_lines_inside_the_current_section():
+    text = """HPI: Shortness of breath since Monday.
+Date: 2024-02-12
+Results: troponin pending
+Notes: patient anxious
+"""
+    result = detect_sections(text)
+    assert list(result["sections"]) == ["HISTORY OF PRESENT ILLNESS"]
+    body = result["sections"]["HISTORY OF PRESENT ILLNESS"]
+    assert "Date: 2024-02-12" in body
+    assert "Results: troponin pending" in body
+    assert "Notes: patient anxious" in body
+    # Ambiguous lines are not counted as covered, so such documents fall back to the LLM
+    assert result["coverage"] == 0.25
+
+
+def test_detect_sections_generic_label_starts_a_section_as_a_heading():
+    text = "HPI: cough\nResults:\nCXR clear\n**Notes:** none further"
+    sections = detect_sections(text)["sections"]
+    assert sections["DIAGNOSTIC TESTS/RESULTS"] == "CXR clear"
+    assert sections["OTHER NOTES"] == "none further"
+
+
+def test_detect_sections_without_headings():
+    result = detect_sections("Just a free-text note.\nNothing structured here.")
+    assert result["sections"] == {}
+    assert result["coverage"] == 0.0
+    assert detect_sections("")["coverage"] == 0.0
+
+
+def test_merge_sections_concatenates_in_order_and_drops_repeats():
+    first = "## PATIENT INFORMATION\nName: Jane Roe\n\n## HISTORY OF PRESENT ILLNESS\nPain for two weeks.\n\n## PLAN\nNot documented."
+    second = "## PATIENT INFORMATION\nName: Jane Roe\n\n## HISTORY OF PRESENT ILLNESS\nWorse on stairs.\n\n## PLAN\nStress test."
+    merged = merge_sections([first, second])
+    assert merged["PATIENT INFORMATION"] == "Name: Jane Roe"
+    assert merged["HISTORY OF PRESENT ILLNESS"] == "Pain for two weeks.\n\nWorse on stairs."
+    # The placeholder from the first chunk is dropped rather than merged in
+    assert merged["PLAN"] == "Stress test."
+    assert list(merged) == [name for name in CANONICAL_SECTIONS if name in merged]
+
+
+def test_merge_sections_moves_unknown_headings_to_other_notes():
+    merged = merge_sections(["## SOCIAL HISTORY\nNon-smoker.\n\n## Dietary Advice\nLow salt."])
+    assert merged["SOCIAL HISTORY"] == "Non-smoker."
+    assert merged["OTHER NOTES"] == "Dietary Advice: Low salt."
+
+
+def test_render_sections_lists_every_canonical_section():
+    text = render_sections({"PLAN": "Review."})
+    assert text.count("## ") == len(CANONICAL_SECTIONS)
+    assert "## PLAN\nReview." in text
+    assert "## ALLERGIES\nNot documented." in text
@@ -0,0 +1,51 @@
+import io
+import os
+
+from Utils.UploadStore import UploadStore
+
+
+def store(tmp_path, **kwargs):
+    return UploadStore(str(tmp_path / "uploads"), **kwargs)
+
+
+def test_identical_uploads_share_one_object(tmp_path):
+    uploads = store(tmp_path)
+    first = uploads.save(io.BytesIO(b"%PDF same"), "a.pdf")
+    second = uploads.save(io.BytesIO(b"%PDF same"), "b.pdf")
+    assert second["deduplicated"] and first["sha256"] == second["sha256"]
+    assert uploads.digest_for(first["path"]) == uploads.digest_for(second["path"]) == first["sha256"]
+    assert uploads.stats()["objects"] == 1
+
+
+def test_files_outside_the_store_are_not_aliases(tmp_path):
+    uploads = store(tmp_path)
+    stored = uploads.save(io.BytesIO(b"%PDF patient one"), "report.pdf")
+    elsewhere = tmp_path / "elsewhere"
+    elsewhere.mkdir()
+    impostor = elsewhere / os.path.basename(stored["path"])
+    impostor.write_bytes(b"%PDF patient two")
+    assert uploads.digest_for(str(impostor)) is None
+    assert uploads.touch(str(impostor)) is None
+    assert uploads.pin(str(impostor)) is None
+
+
+def test_pinned_uploads_survive_eviction(tmp_path):
+    uploads = store(tmp_path, max_bytes=1, flush_interval=0)
+    kept = uploads.save(io.BytesIO(b"%PDF keep"), "keep.pdf")
+    uploads.save(io.BytesIO(b"%PDF drop"), "drop.pdf")
+    pin = uploads.pin(kept["path"])
+    assert uploads.evict() == 1
+    assert os.path.exists(kept["path"])
+    uploads.unpin(pin)
+    assert uploads.evict() == 1
+    assert not os.path.exists(kept["path"])
+
+
+def test_workers_sharing_a_store_keep_each_others_entries(tmp_path):
+    first, second = store(tmp_path), store(tmp_path)
+    a = first.save(io.BytesIO(b"%PDF a"), "a.pdf")
+    b = second.save(io.BytesIO(b"%PDF b"), "b.pdf")
+    # first's in-memory index predates b; the lookup falls back to disk
+    assert first.digest_for(b["path"]) == b["sha256"]
+    assert second.digest_for(a["path"]) == a["sha256"]
+    assert store(tmp_path).stats()["objects"] == 2
@@ -0,0 +1,103 @@
+"""
+Smoke-check a running deployment: health, upload, text extraction and PDF
+generation (no LLM calls), plus optionally a full queued job.
+
+    python validate_api.py --url https://your-app.up.railway.app [--pdf CaseReportExample.pdf] [--job]
+
+Exits 1 if any check fails.
+"""
+import os
+import sys
+import time
+import argparse
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+REPORT_FIELDS = {
+    "structured_report": "# Patient Medical Report\n\n## Patient Information\n- **Name**: Validation",
+    "cardiologist": "# Cardiologist Assessment\n- ok",
+    "psychologist": "# Psychological Assessment\n- ok",
+    "pulmonologist": "# Pulmonology Assessment\n- ok",
+    "final_summary": "# Multidisciplinary Team Summary\n- ok"
+}
+
+
+def check_health(base, timeout):
+    resp = requests.get(f"{base}/health", timeout=timeout)
+    resp.raise_for_status()
+    return resp.json()["status"]
+
+
+def check_upload(base, pdf, timeout):
+    with open(pdf, "rb") as f:
+        resp = requests.post(f"{base}/upload-pdf", files={"file": (os.path.basename(pdf), f, "application/pdf")}, timeout=timeout)
+    resp.raise_for_status()
+    return resp.json()["file_path"]
+
+
+def check_extract(base, path, timeout):
+    resp = requests.post(f"{base}/extract-text", json={"path": path}, timeout=timeout)
+    resp.raise_for_status()
+    return f"{resp.json()['text_length']} characters"
+
+
+def check_generate_pdf(base, timeout):
+    resp = requests.post(f"{base}/generate-pdf", json=[REPORT_FIELDS], timeout=timeout)
+    resp.raise_for_status()
+    if not resp.content.startswith(b"%PDF"):
+        raise ValueError("response is not a PDF")
+    return f"{len(resp.content)} bytes"
+
+
+def check_job(base, path, timeout, wait=600):
+    resp = requests.post(f"{base}/jobs", json={"pdf_path": path}, timeout=timeout)
+    resp.raise_for_status()
+    status_url = resp.json()["status_url"]
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        job = requests.get(status_url, timeout=timeout).json()
+        if job["status"] == "succeeded":
+            return f"job {job['job_id']} succeeded"
+        if job["status"] == "failed":
+            raise RuntimeError(f"job {job['job_id']} failed: {job['error']}")
+        time.sleep(2)
+    raise TimeoutError(f"job did not finish within {wait}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default=os.getenv("API_URL", "http://127.0.0.1:5000"))
+    parser.add_argument("--pdf", default=os.path.join(HERE, "CaseReportExample.pdf"))
+    parser.add_argument("--job", action="store_true", help="also run the full pipeline as a job (spends LLM tokens)")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+    base = args.url.rstrip("/")
+
+    failures = 0
+
+    def run(name, check, *check_args):
+        nonlocal failures
+        try:
+            result = check(*check_args)
+            print(f"[OK] {name}: {result}")
+            return result
+        except Exception as e:
+            failures += 1
+            print(f"[ERROR] {name}: {e}")
+            return None
+
+    run("health", check_health, base, args.timeout)
+    path = run("upload", check_upload, base, args.pdf, args.timeout)
+    if path:
+        run("extract-text", check_extract, base, path, args.timeout)
+    run("generate-pdf", check_generate_pdf, base, args.timeout)
+    if args.job and path:
+        run("jobs", check_job, base, path, args.timeout)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()